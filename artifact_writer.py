@@ -0,0 +1,96 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from metrics import stage_timer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+ARTIFACT_WORKERS = int(os.getenv("PHARMAPEDIA_ARTIFACT_WORKERS", 2))
+# Windows refuses to replace a file another process has open, e.g. while it is being served
+REPLACE_ATTEMPTS = 5
+REPLACE_RETRY_SECONDS = 0.05
+
+
+def dumps_json(data):
+    """Compact UTF-8 JSON bytes, through orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(data, default=str)
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+
+def unique_filename(stem, suffix):
+    """<stem>_<id><suffix>, new for every generation so a file being served is never rewritten"""
+    return f"{stem}_{uuid.uuid4().hex[:12]}{suffix}"
+
+
+def atomic_write(path, write):
+    """Call write(f) on a temporary file next to path, then rename it over path
+
+    Readers see either the previous file or the complete new one, never a
+    partial write. Each call has its own temporary file, so concurrent
+    writers of one path don't interleave; the last rename wins.
+    """
+    path = Path(path)
+    temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        with open(temp_path, "xb") as f:
+            write(f)
+        for attempt in range(REPLACE_ATTEMPTS):
+            try:
+                os.replace(temp_path, path)
+                break
+            except PermissionError:
+                if attempt == REPLACE_ATTEMPTS - 1:
+                    raise
+                time.sleep(REPLACE_RETRY_SECONDS)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return path
+
+
+def write_json(path, data):
+    return atomic_write(path, lambda f: f.write(dumps_json(data)))
+
+
+def copy_file(source, path):
+    def copy(f):
+        with open(source, "rb") as src:
+            shutil.copyfileobj(src, f)
+
+    return atomic_write(path, copy)
+
+
+class ArtifactWriter:
+    """Saves generated images on a background pool, so PNG encoding stays off the request path
+
+    save_image() returns a Future for the written path; whatever reads the
+    file (asset encoding, the result cache) waits on it first.
+    """
+
+    def __init__(self, max_workers=ARTIFACT_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="artifacts")
+
+    def save_image(self, image, path):
+        return self.executor.submit(self._save_image, image, Path(path))
+
+    def submit(self, func, *args):
+        """Run other output housekeeping (see output_retention.py) on the same pool"""
+        return self.executor.submit(func, *args)
+
+    @staticmethod
+    def _save_image(image, path):
+        with stage_timer("png_save", path=path.name):
+            return atomic_write(path, lambda f: image.save(f, format="PNG"))
+
+    def close(self):
+        self.executor.shutdown(wait=True)
\ No newline at end of file
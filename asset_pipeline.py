@@ -0,0 +1,161 @@
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+from artifact_writer import atomic_write
+from config import HOME_DIR
+from metrics import stage_timer
+
+try:
+    # Registers AVIF with Pillow versions that don't support it natively
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+
+ASSET_DIR = os.path.join(HOME_DIR, "output", "assets")
+ASSET_WORKERS = int(os.getenv("PHARMAPEDIA_ASSET_WORKERS", 2))
+# Widths served besides the full image, for srcset on small screens
+THUMBNAIL_WIDTHS = (160, 320)
+DIGEST_CHARS = 16
+# How long a request for a variant still being encoded waits for it
+PENDING_WAIT_SECONDS = 30
+
+# Negotiation order, best compression first; jpeg is the fallback every client accepts
+FORMATS = {
+    "avif": {"media_type": "image/avif", "pillow": "AVIF", "options": {"quality": 60, "speed": 6}},
+    "webp": {"media_type": "image/webp", "pillow": "WEBP", "options": {"quality": 80, "method": 4}},
+    "jpg": {"media_type": "image/jpeg", "pillow": "JPEG", "options": {"quality": 85, "optimize": True, "progressive": True}},
+}
+Image.init()
+AVAILABLE_FORMATS = [ext for ext, spec in FORMATS.items() if spec["pillow"] in Image.SAVE]
+
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+logger = logging.getLogger(__name__)
+
+
+def accepted_types(accept):
+    """Media types with a non-zero q value in an Accept header"""
+    types = set()
+    for part in (accept or "").split(","):
+        media_type, *params = [p.strip() for p in part.split(";")]
+        q = next((p[2:] for p in params if p.startswith("q=")), "1")
+        try:
+            if float(q) > 0:
+                types.add(media_type.lower())
+        except ValueError:
+            continue
+    return types
+
+
+def negotiate(accept, formats=None):
+    """Best available format extension for an Accept header
+
+    Wildcards don't count: browsers list AVIF and WebP explicitly when they
+    decode them, and "*/*" alone is what clients that can't usually send.
+    """
+    types = accepted_types(accept)
+    for ext in formats or AVAILABLE_FORMATS:
+        if ext == "jpg" or FORMATS[ext]["media_type"] in types:
+            return ext
+    return "jpg"
+
+
+def variant_widths(width):
+    return sorted({w for w in THUMBNAIL_WIDTHS if w < width} | {width})
+
+
+class AssetPipeline:
+    """Compact, content-addressed web variants of generated images
+
+    Every image is re-encoded as AVIF (when Pillow supports it), WebP and
+    JPEG at its full width and at THUMBNAIL_WIDTHS, on a background pool so
+    saving a blog does not wait on the encoders. Files are named
+    <digest>-<width>.<ext> after a hash of the source PNG, so a name never
+    changes content and can be cached by browsers forever.
+    """
+
+    def __init__(self, asset_dir=ASSET_DIR, max_workers=ASSET_WORKERS):
+        self.asset_dir = Path(asset_dir)
+        self.asset_dir.mkdir(parents=True, exist_ok=True)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="assets")
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def path(self, digest, width, ext):
+        return self.asset_dir / f"{digest}-{width}.{ext}"
+
+    def submit(self, image_path):
+        """Queue encoding of a saved PNG; returns its asset description right away"""
+        data = Path(image_path).read_bytes()
+        digest = hashlib.sha256(data).hexdigest()[:DIGEST_CHARS]
+
+        with Image.open(image_path) as image:
+            width = image.width
+        widths = variant_widths(width)
+
+        with self._lock:
+            done = all(self.path(digest, w, ext).exists() for w in widths for ext in AVAILABLE_FORMATS)
+            if not done and digest not in self._pending:
+                future = self.executor.submit(self._encode_timed, image_path, digest, widths)
+                self._pending[digest] = future
+                future.add_done_callback(lambda _: self._finish(digest))
+
+        return {
+            "digest": digest,
+            "widths": widths,
+            "src": f"/assets/{digest}-{width}",
+            "srcset": ", ".join(f"/assets/{digest}-{w} {w}w" for w in widths)
+        }
+
+    def _finish(self, digest):
+        with self._lock:
+            self._pending.pop(digest, None)
+
+    def _encode_timed(self, image_path, digest, widths):
+        with stage_timer("asset_encode", digest=digest):
+            self._encode(image_path, digest, widths)
+
+    def _encode(self, image_path, digest, widths):
+        with Image.open(image_path) as source:
+            source = source.convert("RGB")
+
+        for width in widths:
+            height = round(source.height * width / source.width)
+            image = source if width == source.width else source.resize((width, height), Image.LANCZOS)
+            for ext in AVAILABLE_FORMATS:
+                target = self.path(digest, width, ext)
+                if target.exists():
+                    continue
+                spec = FORMATS[ext]
+                atomic_write(target, lambda f: image.save(f, format=spec["pillow"], **spec["options"]))
+
+    def wait(self, digest, timeout=PENDING_WAIT_SECONDS):
+        """Block until a pending encode finishes; False if it is still running"""
+        with self._lock:
+            future = self._pending.get(digest)
+        if future is None:
+            return True
+        try:
+            future.result(timeout=timeout)
+        except Exception as e:
+            logger.warning("Asset encoding failed", extra={"digest": digest, "error": str(e)})
+        return future.done()
+
+    def resolve(self, digest, width, accept=None, ext=None):
+        """(path, media type) of the variant to serve, or None if there is no such asset"""
+        if ext is None:
+            ext = negotiate(accept)
+        if ext not in AVAILABLE_FORMATS:
+            return None
+
+        target = self.path(digest, width, ext)
+        if not target.exists() and not (self.wait(digest) and target.exists()):
+            return None
+        return target, FORMATS[ext]["media_type"]
\ No newline at end of file
@@ -0,0 +1,43 @@
+"""Size and encode time of the compact image variants against the saved PNG
+
+    python benchmarks/bench_assets.py output/aspirin_blog.png
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from asset_pipeline import AVAILABLE_FORMATS, AssetPipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("images", nargs="+", type=Path, help="PNG files written by the generator")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pipeline = AssetPipeline(tmp)
+        rows = []
+        for image_path in args.images:
+            start = time.perf_counter()
+            asset = pipeline.submit(image_path)
+            pipeline.wait(asset["digest"], timeout=None)
+            seconds = time.perf_counter() - start
+
+            png_bytes = image_path.stat().st_size
+            for width in asset["widths"]:
+                for ext in AVAILABLE_FORMATS:
+                    size = pipeline.path(asset["digest"], width, ext).stat().st_size
+                    rows.append((image_path.name, width, ext, size, png_bytes))
+            print(f"{image_path.name}: encoded {len(asset['widths']) * len(AVAILABLE_FORMATS)} variants in {seconds:.2f}s")
+
+    print(f"\n{'image':<24}{'width':>7}{'format':>8}{'KB':>9}{'vs PNG':>9}")
+    for name, width, ext, size, png_bytes in rows:
+        print(f"{name:<24}{width:>7}{ext:>8}{size / 1024:>9.1f}{png_bytes / size:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,48 @@
+"""Compare blogs/hour for one-at-a-time generation against batched generation
+
+    python benchmarks/bench_batch_generation.py --drugs aspirin ibuprofen lisinopril metformin
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from rag_agent import BlogGenerator, TEXT_BATCH_SIZE
+from image_profiles import DEFAULT_IMAGE_PROFILE
+
+
+def run_sequential(generator, drugs):
+    start = time.perf_counter()
+    ok = sum(generator.generate(drug, force_refresh=True)["status"] == "success" for drug in drugs)
+    return ok, time.perf_counter() - start
+
+
+def run_batched(generator, drugs, batch_size):
+    start = time.perf_counter()
+    items = [(drug, None, True, DEFAULT_IMAGE_PROFILE, None) for drug in drugs]
+    ok = sum(result["status"] == "success" for _, result in generator.generate_batch(items, batch_size=batch_size))
+    return ok, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--drugs", nargs="+", default=["aspirin", "ibuprofen", "lisinopril", "metformin"])
+    parser.add_argument("--batch-size", type=int, default=TEXT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    generator = BlogGenerator()
+
+    results = {
+        "sequential": run_sequential(generator, args.drugs),
+        f"batched (batch_size={args.batch_size})": run_batched(generator, args.drugs, args.batch_size),
+    }
+
+    print(f"\n{'mode':<28}{'blogs':>8}{'seconds':>12}{'blogs/hour':>14}")
+    for mode, (ok, elapsed) in results.items():
+        print(f"{mode:<28}{ok:>8}{elapsed:>12.1f}{ok * 3600 / elapsed:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
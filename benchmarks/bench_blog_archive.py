@@ -0,0 +1,116 @@
+"""Time blog archive listing and full-text search with a large synthetic archive
+
+Posts are built from the words of the data/*.json label fixtures, spread
+over a few thousand drugs with several versions each, and written through
+the same batched path as ingest_dir. Each query is then repeated and its
+p50/p95 latency printed.
+
+    python benchmarks/bench_blog_archive.py --posts 100000
+    python benchmarks/bench_blog_archive.py --archive C:\\BlogAgent-bench\\blog_archive.sqlite --posts 100000
+"""
+import argparse
+import json
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from blog_archive import BlogArchive
+
+FIXTURE_DIR = Path(__file__).resolve().parent.parent / "data"
+WORDS_PER_POST = 300
+VERSIONS_PER_DRUG = 5
+REPEATS = 50
+
+
+def fixture_words():
+    words = []
+    for path in sorted(FIXTURE_DIR.glob("*.json")):
+        with open(path) as f:
+            for value in json.load(f).values():
+                words.extend(re.findall(r"[A-Za-z]+", str(value)))
+    return words
+
+
+def synthetic_posts(count, seed=0):
+    """(blog_data, created_at) pairs shaped like rag_agent's saved blogs"""
+    rng = random.Random(seed)
+    words = fixture_words()
+    drugs = max(1, count // VERSIONS_PER_DRUG)
+    started = time.time() - count
+
+    for i in range(count):
+        drug = f"drug{rng.randrange(drugs)}"
+        content = " ".join(rng.choice(words) for _ in range(WORDS_PER_POST))
+        blog_data = {
+            "drug_name": drug,
+            "brand_names": f"Brand{drug[4:]}",
+            "manufacturer": "N/A",
+            "title": f"Complete Medical Guide to {drug}",
+            "blog_content": f"Introduction\n{content}",
+            "image_filename": f"{drug}_blog.png",
+            "section_images": [],
+            "status": "success",
+        }
+        yield blog_data, started + i
+
+
+def time_query(func, repeats=REPEATS):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=100000)
+    parser.add_argument("--archive", help="archive file to use; reused as is if it already has posts")
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    args = parser.parse_args()
+
+    path = args.archive or str(Path(tempfile.mkdtemp(prefix="pharmapedia-archive-")) / "blog_archive.sqlite")
+    archive = BlogArchive(path)
+
+    if archive.count() == 0:
+        started = time.perf_counter()
+        archive.record_many(synthetic_posts(args.posts))
+        seconds = time.perf_counter() - started
+        print(f"Archived {archive.count()} posts in {seconds:.1f}s ({archive.count() / seconds:.0f} posts/s) at {path}")
+
+    posts, cursor = archive.page()
+    for _ in range(archive.count() // 2 // 100):
+        _, cursor = archive.page(100, cursor)
+    drug = posts[0]["drug_name"]
+
+    queries = [
+        ("list, first page", lambda: archive.page()),
+        ("list, middle page", lambda: archive.page(cursor=cursor)),
+        ("list, one drug's versions", lambda: archive.page(drug_name=drug)),
+        ("get latest version", lambda: archive.get(drug)),
+        ("search, common word", lambda: archive.search("patients")),
+        ("search, two words", lambda: archive.search("blood pressure")),
+        ("search, prefix", lambda: archive.search("hypert")),
+        ("search, page 50", lambda: archive.search("patients", offset=49 * 20)),
+        ("search, drug name", lambda: archive.search(drug)),
+        ("search, no match", lambda: archive.search("zzzzzz")),
+    ]
+
+    print(f"\n{'query':<28}{'p50 ms':>10}{'p95 ms':>10}{'matches':>10}")
+    for name, func in queries:
+        p50, p95 = time_query(func, args.repeats)
+        result = func()
+        matches = result[1] if name.startswith("search") else ""
+        print(f"{name:<28}{p50 * 1000:>10.2f}{p95 * 1000:>10.2f}{matches:>10}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,78 @@
+"""Benchmark bulk openFDA label ingestion: records/sec and peak RSS
+
+Builds a synthetic drug-label zip from the data/*.json seeds (or uses
+--sample) and ingests it into a throwaway label store.
+
+    python benchmarks/bench_bulk_ingest.py --records 20000
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from fda_store import seed_to_label
+from fda_bulk_ingest import BulkIngestor
+from run_suite import MemorySampler
+
+
+def write_sample_zip(path, records, section_bytes):
+    """Stream synthetic label records into a zip shaped like the openFDA download files"""
+    seeds = [json.loads(p.read_text()) for p in sorted((ROOT / "data").glob("*.json"))]
+
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open("drug-label-0001-of-0001.json", "w") as raw:
+            meta = {"meta": {"last_updated": "2024-01-01", "results": {"skip": 0, "limit": records, "total": records}}}
+            raw.write(json.dumps(meta)[:-1].encode() + b', "results": [\n')
+
+            for i in range(records):
+                seed = seeds[i % len(seeds)]
+                label = seed_to_label(seed)
+                label["set_id"] = f"bench-{i:08d}"
+                label["id"] = f"bench-id-{i:08d}"
+                label["effective_time"] = "20240101"
+                label["openfda"]["generic_name"] = [f"{seed['name']} {i}"]
+                label["openfda"]["substance_name"] = [seed["name"].upper()]
+                label["description"] = ["x" * section_bytes]
+                raw.write((b",\n" if i else b"") + json.dumps(label).encode())
+
+            raw.write(b"\n]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--section-bytes", type=int, default=8000, help="padding per record to mimic real label size")
+    parser.add_argument("--sample", help="existing drug-label zip to ingest instead of a synthetic one")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sample = Path(args.sample) if args.sample else Path(tmp) / "drug-label-sample.json.zip"
+        if not args.sample:
+            write_sample_zip(sample, args.records, args.section_bytes)
+
+        ingestor = BulkIngestor(Path(tmp) / "labels.sqlite", progress_every=10**9)
+        sampler = MemorySampler().start()
+
+        started_at = time.time()
+        start = time.perf_counter()
+        count = ingestor.ingest_zip(sample)
+        elapsed = time.perf_counter() - start
+        sampler.stop()
+        rss_before = sampler.rss[0] / 1024**2
+        peak_rss = sampler.peak(started_at, time.time()) / 1024**2
+
+        print(f"Sample file: {sample.name} ({sample.stat().st_size / 1024**2:.1f} MB zipped)")
+        print(f"Records: {count}")
+        print(f"Elapsed: {elapsed:.2f}s")
+        print(f"Throughput: {count / elapsed:.0f} records/sec")
+        print(f"Peak RSS: {peak_rss:.1f} MB (before ingest: {rss_before:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,126 @@
+"""Drug name resolver lookup latency, and look-alike names resolving to the wrong label
+
+Builds a DrugResolver over synthetic generic/brand/substance names, times
+exact, prefix and fuzzy lookups, then checks through a throwaway LabelStore
+that look-alike drugs (prednisone/prednisolone, hydroxyzine/hydralazine)
+never get each other's label. Exits 1 if one does.
+
+    python benchmarks/bench_drug_resolver.py --names 40000
+"""
+import argparse
+import io
+import json
+import random
+import statistics
+import string
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from drug_resolver import DrugResolver
+from fda_bulk_ingest import BulkIngestor
+from fda_store import LabelStore
+
+# (drug asked for, look-alike that is bulk-ingested); the asked-for drug's own label comes from the per-drug cache
+LOOK_ALIKES = [("prednisone", "prednisolone"), ("hydroxyzine", "hydralazine")]
+NAME_TYPES = ["generic", "brand", "substance"]
+
+
+def synthetic_rows(count, seed):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        name = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(6, 14)))
+        if rng.random() < 0.3:
+            name += rng.choice([" hydrochloride", " sodium", " extended release"])
+        rows.append((name, rng.choice(NAME_TYPES), f"set-{i}", f"20{rng.randint(10, 24)}0101"))
+    return rows
+
+
+def time_lookups(resolver, queries, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            resolver.resolve(query)
+            timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), max(timings)
+
+
+def typo(rng, name):
+    i = rng.randrange(len(name))
+    return name[:i] + rng.choice(string.ascii_lowercase) + name[i + 1:]
+
+
+def label(name, set_id):
+    return {"set_id": set_id, "effective_time": "20240101", "openfda": {"generic_name": [name.upper()]},
+            "indications_and_usage": [f"{name.capitalize()} is indicated for testing."]}
+
+
+def check_look_alikes():
+    """Names of the drugs whose lookup came back with a look-alike's label"""
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "labels.sqlite"
+        document = {"results": [label(other, f"bulk-{other}") for _, other in LOOK_ALIKES]}
+        BulkIngestor(path).ingest_stream(io.StringIO(json.dumps(document)), "look-alikes")
+
+        store = LabelStore(path, offline=True)
+        for drug, other in LOOK_ALIKES:
+            store._save(drug, label(drug, f"cached-{drug}"), "api")
+
+            resolved = store.get(drug)["set_id"]
+            suggested = [candidate.name for candidate in store.resolve(drug)]
+            print(f"{drug:>12}: label {resolved}, match {store.match(drug)}, suggestions {suggested}")
+            if resolved != f"cached-{drug}":
+                failures.append(drug)
+
+        for drug, other in LOOK_ALIKES:
+            # Dropping the per-drug row leaves only the look-alike, which must not be used for generation
+            with store._lock:
+                store._db.execute("DELETE FROM labels WHERE drug_key = ?", (drug,))
+                store._db.commit()
+            if store.get(drug) is not None:
+                failures.append(f"{drug} (uncached)")
+            if store.get(other)["set_id"] != f"bulk-{other}":
+                failures.append(other)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--names", type=int, default=40000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.names, args.seed)
+    start = time.perf_counter()
+    resolver = DrugResolver(rows)
+    print(f"Built resolver over {len(resolver)} names in {time.perf_counter() - start:.2f}s")
+
+    rng = random.Random(args.seed)
+    names = [rng.choice(rows)[0] for _ in range(args.queries)]
+    lookups = {
+        "exact": names,
+        "prefix": [name[:max(3, len(name) - 3)] for name in names],
+        "fuzzy": [typo(rng, name) for name in names],
+    }
+    print(f"\n{'lookup':<10}{'p50 ms':>10}{'max ms':>10}")
+    for kind, queries in lookups.items():
+        p50, worst = time_lookups(resolver, queries)
+        print(f"{kind:<10}{p50:>10.3f}{worst:>10.3f}")
+
+    print()
+    failures = check_look_alikes()
+    if failures:
+        print(f"\nLook-alike labels returned for: {', '.join(failures)}")
+        sys.exit(1)
+    print("\nLook-alike names keep their own labels")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
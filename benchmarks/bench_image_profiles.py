@@ -0,0 +1,65 @@
+"""Seconds per image for each Stable Diffusion image profile
+
+Every profile renders the same prompts with the same seed, and the images are
+written to --out so the quality trade-off can be compared side by side.
+
+    python benchmarks/bench_image_profiles.py --profiles draft standard high --images 3
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import torch
+
+from rag_agent import ModelManager, IMAGE_THREADS
+from image_profiles import IMAGE_PROFILES, profile_settings
+
+PROMPTS = [
+    "professional pharmaceutical medical illustration lisinopril therapeutic treatment healthcare clinical professional",
+    "professional pharmaceutical medical illustration metformin tablets capsules medication administration clinical",
+    "professional pharmaceutical medical illustration ibuprofen molecular scientific illustration clinical",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", nargs="+", choices=IMAGE_PROFILES, default=list(IMAGE_PROFILES))
+    parser.add_argument("--images", type=int, default=len(PROMPTS), help="images per profile")
+    parser.add_argument("--threads", type=int, default=IMAGE_THREADS)
+    parser.add_argument("--out", default="bench_image_profiles", help="directory for the rendered images")
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+
+    models = ModelManager()
+    models.load()
+    prompts = [PROMPTS[i % len(PROMPTS)] for i in range(args.images)]
+
+    results = []
+    for profile in args.profiles:
+        # One untimed image so each profile's scheduler setup is not counted
+        models.generate_image(prompts[0], image_profile=profile)
+
+        timings = []
+        for i, prompt in enumerate(prompts):
+            start = time.perf_counter()
+            image = models.generate_image(prompt, image_profile=profile)
+            timings.append(time.perf_counter() - start)
+            image.save(out / f"{profile}_{i}.png")
+
+        scheduler, params = profile_settings(profile, models.lcm_available)
+        results.append((profile, scheduler, params, sum(timings) / len(timings), min(timings)))
+
+    print(f"\n{'profile':<10}{'scheduler':<11}{'steps':>6}{'size':>6}{'s/image':>10}{'best':>8}")
+    for profile, scheduler, params, mean, best in results:
+        print(f"{profile:<10}{scheduler:<11}{params['num_inference_steps']:>6}{params['height']:>6}{mean:>10.1f}{best:>8.1f}")
+    print(f"\nImages written to {out.resolve()}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,144 @@
+"""Compare API responsiveness with the models in the server process and in inference workers
+
+For each mode the server runs under uvicorn in a fresh process (paths and
+the mode are read at import time), in a scratch PHARMAPEDIA_HOME with the
+stand-in models and the openFDA stub (see run_suite.py). While blogs are
+generated through /generate-blog, GET / is polled and its latency recorded.
+
+    python benchmarks/bench_inference_workers.py --blogs 3
+    python benchmarks/bench_inference_workers.py --home C:\\BlogAgent --real-models --blogs 1
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from run_suite import FIXTURE_DIR, free_port, percentile, prepare_home
+
+MODES = {"in-process": "0", "workers": "1"}
+PROBE_SECONDS = 0.05
+
+
+def wait_for_job(client, job_url):
+    while True:
+        job = client.get(job_url).json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.2)
+
+
+def probe_home(base_url, stop, latencies):
+    with httpx.Client(base_url=base_url, timeout=60) as client:
+        while not stop.is_set():
+            started = time.perf_counter()
+            client.get("/")
+            latencies.append(time.perf_counter() - started)
+            time.sleep(PROBE_SECONDS)
+
+
+def run_mode(args):
+    """Child process: start the server, generate blogs while probing /, print the results as JSON"""
+    scratch = None
+    if not args.home:
+        scratch = args.home = tempfile.mkdtemp(prefix="pharmapedia-workers-")
+    stub = prepare_home(args.home, args.real_models)
+    server = None
+
+    try:
+        from load_test import start_server
+
+        port = free_port()
+        server, thread, generator = start_server(port)
+        base_url = f"http://127.0.0.1:{port}"
+        body = {"image_profile": args.image_profile, "force_refresh": True}
+        drugs = sorted(path.stem for path in FIXTURE_DIR.glob("*.json"))[:args.blogs]
+
+        with httpx.Client(base_url=base_url, timeout=60) as client:
+            started = time.perf_counter()
+            generator.model_manager.load()
+            load_seconds = time.perf_counter() - started
+
+            idle = []
+            for _ in range(20):
+                probe_started = time.perf_counter()
+                client.get("/")
+                idle.append(time.perf_counter() - probe_started)
+
+            busy = []
+            stop = threading.Event()
+            prober = threading.Thread(target=probe_home, args=(base_url, stop, busy), daemon=True)
+            prober.start()
+            blog_seconds = []
+            for drug in drugs:
+                started = time.perf_counter()
+                job = client.post("/generate-blog", json={"drug_name": drug, **body}).json()
+                result = wait_for_job(client, job["job_url"])
+                if result["status"] != "completed":
+                    raise RuntimeError(f"{drug}: {result['error']}")
+                blog_seconds.append(time.perf_counter() - started)
+            stop.set()
+            prober.join()
+
+        print(json.dumps({"load": load_seconds, "idle": idle, "busy": busy, "blogs": blog_seconds}))
+    finally:
+        if server is not None:
+            server.should_exit = True
+            thread.join(timeout=30)
+            if hasattr(generator.model_manager, "close"):
+                generator.model_manager.close()
+        stub.stop()
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+
+def ms(value):
+    return f"{value * 1000:.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--blogs", type=int, default=3, help="blogs generated per mode")
+    parser.add_argument("--image-profile", default="draft")
+    parser.add_argument("--home", help="PHARMAPEDIA_HOME to run in (default: a scratch directory per mode)")
+    parser.add_argument("--real-models", action="store_true", help="use the models in <home>/models instead of stand-ins")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.real_models and not args.home:
+        parser.error("--real-models needs --home pointing at a tree with downloaded models")
+    if args.mode:
+        return run_mode(args)
+
+    results = {}
+    for mode, enabled in MODES.items():
+        command = [sys.executable, __file__, "--mode", mode, "--blogs", str(args.blogs),
+                   "--image-profile", args.image_profile]
+        if args.home:
+            command += ["--home", args.home]
+        if args.real_models:
+            command.append("--real-models")
+        env = {**os.environ, "PHARMAPEDIA_INFERENCE_WORKERS": enabled, "TQDM_DISABLE": "1"}
+        output = subprocess.run(command, env=env, capture_output=True, text=True)
+        if output.returncode != 0:
+            sys.exit(f"{mode} run failed:\n{output.stderr}")
+        results[mode] = json.loads(output.stdout.strip().splitlines()[-1])
+
+    print(f"{'mode':<12}{'load s':>8}{'blog p50 s':>12}{'idle / p50 ms':>15}{'busy / p50 ms':>15}"
+          f"{'busy / p95 ms':>15}{'busy / max ms':>15}")
+    for mode, r in results.items():
+        print(f"{mode:<12}{r['load']:>8.1f}{percentile(r['blogs'], 50):>12.2f}{ms(percentile(r['idle'], 50)):>15}"
+              f"{ms(percentile(r['busy'], 50)):>15}{ms(percentile(r['busy'], 95)):>15}{ms(max(r['busy'])):>15}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
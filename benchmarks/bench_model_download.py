@@ -0,0 +1,175 @@
+"""Time model downloads from a local Hub stand-in: one connection vs parallel, a flaky network, resume and re-runs
+
+Synthetic repos laid out like TinyLlama and Stable Diffusion (JSON and
+tokenizer files, large safetensors weights, a pickled .bin to convert, and
+checkpoints and fp16 variants the model specs leave out) are served by
+hub_stub.py with a per-connection rate limit, then downloaded through
+HubDownloader with the specs from models_downloading.py.
+
+    python benchmarks/bench_model_download.py --weights-mb 256 --rate-mb 40
+"""
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import torch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from hub_stub import StubHub
+
+
+def random_bytes(megabytes):
+    return os.urandom(int(megabytes * 1024**2))
+
+
+def torch_checkpoint(megabytes):
+    buffer = io.BytesIO()
+    torch.save({"weight": torch.randn(int(megabytes * 1024**2) // 4)}, buffer)
+    return buffer.getvalue()
+
+
+def synthetic_repos(models, weights_mb):
+    """Repos named like the real ones; weights_mb is split over their weight files"""
+    text = {
+        "config.json": b'{"architectures": ["LlamaForCausalLM"]}',
+        "generation_config.json": b'{"max_length": 2048}',
+        "tokenizer.json": random_bytes(1.8),
+        "tokenizer.model": random_bytes(0.5),
+        "tokenizer_config.json": b'{"model_max_length": 2048}',
+        "special_tokens_map.json": b'{"bos_token": "<s>"}',
+        "model.safetensors": random_bytes(weights_mb * 0.35),
+        "README.md": b"# Model card",
+    }
+    image = {
+        "model_index.json": b'{"_class_name": "StableDiffusionPipeline"}',
+        "scheduler/scheduler_config.json": b'{"num_train_timesteps": 1000}',
+        "tokenizer/vocab.json": random_bytes(0.8),
+        "tokenizer/merges.txt": random_bytes(0.5),
+        "text_encoder/config.json": b"{}",
+        "text_encoder/model.safetensors": random_bytes(weights_mb * 0.1),
+        "unet/config.json": b"{}",
+        "unet/diffusion_pytorch_model.safetensors": random_bytes(weights_mb * 0.35),
+        "unet/diffusion_pytorch_model.fp16.safetensors": random_bytes(weights_mb * 0.1),
+        "unet/diffusion_pytorch_model.bin": random_bytes(weights_mb * 0.1),
+        "vae/config.json": b"{}",
+        "vae/diffusion_pytorch_model.bin": torch_checkpoint(weights_mb * 0.05),
+        "safety_checker/config.json": b"{}",
+        "safety_checker/model.safetensors": random_bytes(weights_mb * 0.05),
+        "v1-5-pruned.ckpt": random_bytes(weights_mb * 0.2),
+    }
+    return {models["tinyllama"]["name"]: text, models["stable_diffusion"]["name"]: image}
+
+
+def run(name, downloader, specs, stub, expected_bytes, cancel_at=None):
+    served = stub.bytes_served
+    started = time.perf_counter()
+    if cancel_at is None:
+        errors = downloader.download(specs)
+    else:
+        result = {}
+        thread = threading.Thread(target=lambda: result.update(downloader.download(specs)))
+        thread.start()
+        while thread.is_alive() and downloader.bytes_downloaded < cancel_at:
+            time.sleep(0.01)
+        downloader.cancel()
+        thread.join()
+        errors = result
+    seconds = time.perf_counter() - started
+
+    failed = sum(len(problems) for problems in errors.values())
+    fetched = (stub.bytes_served - served) / 1024**2
+    return {
+        "scenario": name,
+        "seconds": seconds,
+        "fetched": fetched,
+        "rate": fetched / max(seconds, 1e-9),
+        "result": "ok" if not failed else f"{failed} unfinished",
+        "expected": expected_bytes / 1024**2,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--weights-mb", type=float, default=256, help="total size of the synthetic weight files")
+    parser.add_argument("--rate-mb", type=float, default=40, help="stand-in throughput per connection, MB/s")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--segment-mb", type=float, default=16)
+    parser.add_argument("--drop-rate", type=float, default=0.2, help="share of responses cut off in the flaky run")
+    args = parser.parse_args()
+
+    home = tempfile.mkdtemp(prefix="pharmapedia-download-")
+    os.environ["PHARMAPEDIA_HOME"] = home
+    import hub_downloader
+    from hub_downloader import HubDownloader, load_manifest, verify
+    from models_downloading import MODELS
+
+    # Keep the retry back-off short; the stand-in drops connections on purpose
+    hub_downloader.RETRY_SECONDS = 0.1
+
+    stub = StubHub(synthetic_repos(MODELS, args.weights_mb), rate_mb=args.rate_mb).start()
+    segment_bytes = int(args.segment_mb * 1024**2)
+    results = []
+
+    def specs_in(directory):
+        return [{**spec, "path": str(Path(home) / directory / key)} for key, spec in MODELS.items()]
+
+    def selected_bytes(specs):
+        total = 0
+        for spec in specs:
+            _, listing = HubDownloader(stub.url).fetch_listing(spec["name"])
+            total += sum(entry["size"] for entry in hub_downloader.select_files(listing, spec["allow"], spec["ignore"]))
+        return total
+
+    try:
+        expected = selected_bytes(specs_in("serial"))
+
+        results.append(run("1 connection", HubDownloader(stub.url, workers=1, segment_bytes=2**62),
+                           specs_in("serial"), stub, expected))
+        parallel = specs_in("parallel")
+        results.append(run(f"{args.workers} connections", HubDownloader(stub.url, workers=args.workers,
+                                                                        segment_bytes=segment_bytes),
+                           parallel, stub, expected))
+
+        stub.drop_rate = args.drop_rate
+        results.append(run(f"{args.drop_rate:.0%} dropped responses",
+                           HubDownloader(stub.url, workers=args.workers, segment_bytes=segment_bytes),
+                           specs_in("flaky"), stub, expected))
+        stub.drop_rate = 0.0
+
+        resumed = specs_in("resumed")
+        results.append(run("cancelled at 50%", HubDownloader(stub.url, workers=args.workers,
+                                                            segment_bytes=segment_bytes),
+                           resumed, stub, expected, cancel_at=expected // 2))
+        results.append(run("resumed", HubDownloader(stub.url, workers=args.workers, segment_bytes=segment_bytes),
+                           resumed, stub, expected))
+
+        results.append(run("re-run, up to date", HubDownloader(stub.url, workers=args.workers),
+                           parallel, stub, expected))
+
+        started = time.perf_counter()
+        problems = [problem for spec in parallel for problem in verify(spec["path"])]
+        results.append({"scenario": "verify SHA256s", "seconds": time.perf_counter() - started, "fetched": 0,
+                        "rate": 0, "result": "ok" if not problems else f"{len(problems)} problems",
+                        "expected": expected / 1024**2})
+
+        converted = load_manifest(parallel[1]["path"])["files"]["vae/diffusion_pytorch_model.safetensors"]
+        print(f"\nvae/diffusion_pytorch_model.bin was converted: {converted['size'] / 1024**2:.1f} MB safetensors")
+    finally:
+        stub.stop()
+        shutil.rmtree(home, ignore_errors=True)
+
+    print(f"\nSelected files: {expected / 1024**2:.0f} MB, {args.rate_mb:.0f} MB/s per connection\n")
+    print(f"{'scenario':<26}{'seconds':>9}{'MB fetched':>12}{'MB/s':>8}  result")
+    for r in results:
+        print(f"{r['scenario']:<26}{r['seconds']:>9.2f}{r['fetched']:>12.0f}{r['rate']:>8.1f}  {r['result']}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
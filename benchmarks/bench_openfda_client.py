@@ -0,0 +1,98 @@
+"""Exercise the openFDA client against the local stub: coalescing, retries, 429s and the rate limiter
+
+Each scenario starts a fresh stub server and client, runs lookups from a
+thread pool like the FDA stage does, and checks the outcome.
+
+    python benchmarks/bench_openfda_client.py --callers 100
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fda_client import OpenFDAClient, OpenFDAError
+from fda_store import OPENFDA_LABEL_PATH
+
+from openfda_stub import StubOpenFDA
+
+
+def lookup(client, name):
+    params = {"search": f'openfda.generic_name:"{name}"', "limit": 1}
+    try:
+        data = client.get_json_sync(OPENFDA_LABEL_PATH, params)
+        return "found" if data else "not_found"
+    except OpenFDAError as e:
+        return e.kind
+
+
+def run(names, callers, stub_options, client_options):
+    stub = StubOpenFDA(**stub_options).start()
+    client = OpenFDAClient(base_url=stub.url, **client_options)
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=callers) as pool:
+            outcomes = list(pool.map(lambda name: lookup(client, name), names))
+        seconds = time.perf_counter() - start
+    finally:
+        client.close()
+        stub.stop()
+
+    stamps = stub.timestamps
+    window = stamps[-1] - stamps[0] if len(stamps) > 1 else 0
+    return {
+        "calls": len(names),
+        "found": outcomes.count("found"),
+        "not_found": outcomes.count("not_found"),
+        "errors": len(outcomes) - outcomes.count("found") - outcomes.count("not_found"),
+        "upstream": sum(stub.requests.values()),
+        "retries": client.retries,
+        "coalesced": client.coalesced,
+        "seconds": seconds,
+        "upstream_per_minute": (len(stamps) - 1) / window * 60 if window else 0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--callers", type=int, default=100)
+    parser.add_argument("--drugs", type=int, default=5)
+    args = parser.parse_args()
+
+    drugs = [f"drug{i}" for i in range(args.drugs)]
+    fast = {"rate_per_minute": 6000, "burst": 100}
+    scenarios = [
+        ("coalescing", [drugs[i % len(drugs)] for i in range(args.callers)], {"latency": 0.3}, fast,
+         lambda r: r["upstream"] == len(drugs) and r["found"] == r["calls"]),
+        ("404 is not an error", ["unknown-a", "unknown-b"], {}, fast,
+         lambda r: r["not_found"] == 2 and r["retries"] == 0),
+        ("30% 503s", [f"flaky{i}" for i in range(50)], {"fail_rate": 0.3, "seed": 1}, dict(fast, max_retries=6),
+         lambda r: r["found"] == r["calls"] and r["retries"] > 0),
+        ("every 4th is a 429", [f"busy{i}" for i in range(40)], {"rate_limit_every": 4}, fast,
+         lambda r: r["found"] == r["calls"]),
+        ("always 503", ["down"], {"fail_rate": 1.0}, dict(fast, max_retries=2),
+         lambda r: r["errors"] == 1 and r["upstream"] == 3),
+        ("rate limit 600/min", [f"paced{i}" for i in range(60)], {}, {"rate_per_minute": 600, "burst": 5},
+         lambda r: r["upstream_per_minute"] <= 600 * 1.1),
+        ("daily quota", [f"quota{i}" for i in range(12)], {}, dict(fast, daily_limit=10),
+         lambda r: r["found"] == 10 and r["errors"] == 2),
+    ]
+
+    print(f"{'scenario':<22}{'calls':>7}{'found':>7}{'404':>5}{'errors':>8}{'upstream':>10}{'retries':>9}"
+          f"{'coalesced':>11}{'req/min':>9}{'seconds':>9}  result")
+    failed = 0
+    for name, names, stub_options, client_options, check in scenarios:
+        r = run(names, args.callers, stub_options, client_options)
+        ok = check(r)
+        failed += not ok
+        print(f"{name:<22}{r['calls']:>7}{r['found']:>7}{r['not_found']:>5}{r['errors']:>8}{r['upstream']:>10}"
+              f"{r['retries']:>9}{r['coalesced']:>11}{r['upstream_per_minute']:>9.0f}{r['seconds']:>9.2f}  "
+              f"{'ok' if ok else 'FAILED'}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""Prefill time per request with and without the prompt prefix cache
+
+Builds real prompts with BlogGenerator.prepare for each drug and title, then
+times the prompt forward pass (prefill) from scratch and with cached prefixes.
+The first title of each drug pays for caching the drug's label facts; the
+rest only prefill their title-specific tail.
+
+    python benchmarks/bench_prefix_cache.py --drugs lisinopril aspirin metformin
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import torch
+
+from rag_agent import BlogGenerator, MODELS_DIR, TEXT_THREADS
+from prefix_cache import PrefixCache
+from text_backends import BACKENDS, load_text_model
+
+TITLES = ["Complete Medical Guide to {drug}", "Understanding {drug}: Uses and Benefits",
+          "{drug} Dosage Explained", "Is {drug} Safe? Warnings and Precautions"]
+
+
+def prefill(model, input_ids, cache=None, cached_length=0):
+    start = time.perf_counter()
+    with torch.no_grad():
+        model(input_ids=input_ids[:, cached_length:], past_key_values=cache, use_cache=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--drugs", nargs="+", default=["lisinopril", "aspirin", "metformin"])
+    parser.add_argument("--backend", choices=[b for b in BACKENDS if b != "onnx"], default="fp32")
+    parser.add_argument("--threads", type=int, default=TEXT_THREADS)
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    generator = BlogGenerator()
+    model, tokenizer = load_text_model(args.backend, Path(MODELS_DIR) / "tinyllama")
+    cache = PrefixCache(model, tokenizer)
+
+    rows = []
+    for drug in args.drugs:
+        for i, title in enumerate(TITLES):
+            plan = generator.prepare(drug, title.format(drug=drug))
+            if not plan:
+                print(f"Skipping {drug}: no label found")
+                break
+
+            input_ids = tokenizer(plan["text_prompt"], return_tensors="pt")["input_ids"]
+            full = prefill(model, input_ids)
+
+            start = time.perf_counter()
+            cached_length, kv = cache.lookup(input_ids, plan["text_prefixes"])
+            lookup = time.perf_counter() - start
+            tail = prefill(model, input_ids, kv, cached_length)
+
+            rows.append((drug, "first" if i == 0 else "repeat", input_ids.shape[1], cached_length, full, lookup + tail))
+
+    print(f"\n{'drug':<14}{'request':<9}{'tokens':>8}{'cached':>8}{'full ms':>10}{'cached ms':>11}{'saved':>8}")
+    for drug, kind, tokens, cached_length, full, with_cache in rows:
+        print(f"{drug:<14}{kind:<9}{tokens:>8}{cached_length:>8}{full * 1000:>10.0f}{with_cache * 1000:>11.0f}"
+              f"{1 - with_cache / full:>8.0%}")
+
+    for kind in ("first", "repeat"):
+        subset = [(full, cached) for _, k, _, _, full, cached in rows if k == kind]
+        if subset:
+            full_ms = statistics.mean(full for full, _ in subset) * 1000
+            cached_ms = statistics.mean(cached for _, cached in subset) * 1000
+            print(f"\nMean {kind} request prefill: {full_ms:.0f} ms -> {cached_ms:.0f} ms ({1 - cached_ms / full_ms:.0%} less)")
+    print(f"Prefix cache: {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""Label retrieval index build time and query latency at 10k+ labels
+
+Uses synthetic openFDA-shaped labels unless --from-store is given, in which
+case the bulk-ingested labels in the label store are indexed instead.
+
+    python benchmarks/bench_retrieval.py --labels 10000 --embedder hashing
+"""
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from label_retrieval import HashingEmbedder, LabelIndex, get_embedder
+
+SECTIONS = ["indications_and_usage", "dosage_and_administration", "adverse_reactions", "warnings", "contraindications",
+            "drug_interactions", "mechanism_of_action"]
+WORDS = ("patients tablet daily dose hypertension renal hepatic impairment adverse reactions headache nausea dizziness "
+         "contraindicated pregnancy lactation clearance plasma concentration increase decrease monitor blood pressure "
+         "glucose infection therapy treatment adults pediatric mg kg administered orally food interaction inhibitor "
+         "receptor enzyme clinical trials placebo incidence discontinue symptoms risk severe mild moderate").split()
+QUERIES = ["Complete Medical Guide to {drug}", "How {drug} works", "Is {drug} safe during pregnancy",
+           "{drug} dosage for adults", "Side effects of {drug}", "{drug} drug interactions"]
+
+
+def synthetic_label(rng, index):
+    def sentence():
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 22))).capitalize() + "."
+
+    record = {"set_id": f"synthetic-{index}", "openfda": {"generic_name": [f"drug{index}"]}}
+    for section in SECTIONS:
+        record[section] = [" ".join(sentence() for _ in range(rng.randint(3, 14)))]
+    return record
+
+
+def label_batches(count, batch_size, seed):
+    rng = random.Random(seed)
+    for start in range(0, count, batch_size):
+        yield [(f"synthetic-{i}", synthetic_label(rng, i)) for i in range(start, min(start + batch_size, count))]
+
+
+def percentile(values, pct):
+    return sorted(values)[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--labels", type=int, default=10000)
+    parser.add_argument("--batch-labels", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--embedder", choices=["auto", "hashing"], default="auto")
+    parser.add_argument("--from-store", action="store_true", help="index the bulk labels in the label store")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    embedder = HashingEmbedder() if args.embedder == "hashing" else get_embedder()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = LabelIndex(tmp, embedder=embedder)
+
+        start = time.perf_counter()
+        if args.from_store:
+            from fda_store import get_label_store
+            batches = get_label_store().iter_bulk_labels(args.batch_labels)
+        else:
+            batches = label_batches(args.labels, args.batch_labels, args.seed)
+
+        labels = 0
+        for batch in batches:
+            index.add_labels(batch)
+            labels += len(batch)
+        build_seconds = time.perf_counter() - start
+
+        rows = index.rows
+        size_mb = index.vectors_path.stat().st_size / 1e6
+        print(f"Embedder: {embedder.name}")
+        print(f"Indexed {labels} labels / {rows} chunks in {build_seconds:.1f}s "
+              f"({rows / build_seconds:.0f} chunks/s, vectors {size_mb:.1f} MB)")
+
+        rng = random.Random(args.seed + 1)
+        keys = index.label_keys()
+        scoped = []
+        full = []
+        for _ in range(args.queries):
+            key = rng.choice(keys)
+            query = rng.choice(QUERIES).format(drug=key)
+
+            t = time.perf_counter()
+            index.search(query, label_key=key)
+            scoped.append((time.perf_counter() - t) * 1000)
+
+            t = time.perf_counter()
+            index.search(query)
+            full.append((time.perf_counter() - t) * 1000)
+
+    print(f"\n{'query':<24}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+    for name, timings in (("one label", scoped), (f"all {rows} chunks", full)):
+        print(f"{name:<24}{percentile(timings, 50):>10.2f}{percentile(timings, 95):>10.2f}{statistics.mean(timings):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
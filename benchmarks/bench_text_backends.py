@@ -0,0 +1,123 @@
+"""Compare TinyLlama CPU text backends: tokens/sec, first-token latency, peak RSS and output quality
+
+Each backend runs in its own subprocess so peak RSS is measured in isolation.
+Quality is reported as perplexity on a reference label passage and as the
+share of greedy output tokens that agree with the fp32 baseline.
+
+    python benchmarks/bench_text_backends.py --backends fp32 int8 bf16 onnx
+"""
+import argparse
+import json
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from text_backends import BACKENDS
+from run_suite import MemorySampler
+
+PROMPT = """Write professional pharmaceutical blog about lisinopril.
+
+Title: Complete Medical Guide to Lisinopril
+
+Blog:"""
+
+
+def reference_text():
+    with open(ROOT / "data" / "lisinopril.json") as f:
+        return json.load(f)["indications"]
+
+
+def run_backend(backend, max_new_tokens):
+    """Measure one backend in this process and print a JSON result line"""
+    import torch
+    from transformers import TextIteratorStreamer
+    from rag_agent import MODELS_DIR
+    from text_backends import load_text_model, resolve_backend
+
+    sampler = MemorySampler().start()
+    start = time.perf_counter()
+    model, tokenizer = load_text_model(backend, Path(MODELS_DIR) / "tinyllama")
+    load_seconds = time.perf_counter() - start
+
+    inputs = tokenizer(PROMPT, return_tensors="pt")
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True)
+    result = {}
+
+    def generate():
+        with torch.no_grad():
+            result["output"] = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False, streamer=streamer)
+
+    start = time.perf_counter()
+    worker = threading.Thread(target=generate)
+    worker.start()
+    first_token = None
+    for _ in streamer:
+        if first_token is None:
+            first_token = time.perf_counter() - start
+    worker.join()
+    elapsed = time.perf_counter() - start
+
+    new_tokens = result["output"][0][inputs["input_ids"].shape[1]:].tolist()
+
+    ref = tokenizer(reference_text(), return_tensors="pt")
+    with torch.no_grad():
+        logits = model(**ref).logits.float()
+    loss = torch.nn.functional.cross_entropy(logits[0, :-1], ref["input_ids"][0, 1:])
+    sampler.stop()
+
+    print(json.dumps({
+        "backend": backend,
+        "loaded": resolve_backend(backend),
+        "load_seconds": load_seconds,
+        "first_token_seconds": first_token,
+        "tokens_per_second": len(new_tokens) / elapsed,
+        "perplexity": float(torch.exp(loss)),
+        "peak_rss_mb": max(sampler.rss) / 1024**2,
+        "tokens": new_tokens
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--worker", choices=BACKENDS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_backend(args.worker, args.max_new_tokens)
+        return
+
+    results = []
+    for backend in args.backends:
+        print(f"Benchmarking {backend}...")
+        proc = subprocess.run(
+            [sys.executable, __file__, "--worker", backend, "--max-new-tokens", str(args.max_new_tokens)],
+            capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            print(f"  failed: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else proc.returncode}")
+            continue
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    baseline = next((r["tokens"] for r in results if r["loaded"] == "fp32"), None)
+
+    print(f"\n{'backend':<14}{'load s':>9}{'1st tok s':>11}{'tok/s':>9}{'peak RSS MB':>13}{'ppl':>9}{'fp32 agree':>12}")
+    for r in results:
+        agree = "-"
+        if baseline:
+            same = sum(a == b for a, b in zip(r["tokens"], baseline))
+            agree = f"{same / max(len(baseline), 1):.0%}"
+        # A backend that fell back to another dtype is shown as e.g. "bf16>fp32"
+        label = r["backend"] if r["loaded"] == r["backend"] else f"{r['backend']}>{r['loaded']}"
+        print(f"{label:<14}{r['load_seconds']:>9.1f}{r['first_token_seconds']:>11.2f}{r['tokens_per_second']:>9.1f}"
+              f"{r['peak_rss_mb']:>13.0f}{r['perplexity']:>9.2f}{agree:>12}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
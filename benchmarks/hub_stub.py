@@ -0,0 +1,193 @@
+"""Local stand-in for the Hugging Face Hub file API, with per-connection throttling and dropped connections
+
+Serves the two endpoints hub_downloader.py uses, for repos held in memory or
+read from local directories: /api/models/<repo>/revision/<rev>?blobs=true and
+/<repo>/resolve/<rev>/<path>, with Range requests.
+
+    python benchmarks/hub_stub.py --port 8766 --repo TinyLlama/TinyLlama-1.1B-Chat-v1.0=C:\\BlogAgent-bench\\models\\tinyllama
+    PHARMAPEDIA_HF_ENDPOINT=http://127.0.0.1:8766 python models_downloading.py --yes
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+# Files the Hub would keep in LFS, which are listed with a SHA256; the rest only have a git blob id
+LFS_SUFFIXES = (".safetensors", ".bin", ".ckpt", ".model", ".msgpack", ".onnx")
+LFS_MIN_BYTES = 1024**2
+SEND_CHUNK = 1 << 16
+COMMIT = "0123456789abcdef0123456789abcdef01234567"
+
+
+def directory_files(directory):
+    """{repo path: file path} for every file under a directory"""
+    root = Path(directory)
+    return {path.relative_to(root).as_posix(): path for path in sorted(root.rglob("*")) if path.is_file()}
+
+
+class StubHub:
+    """Threaded HTTP server for repos given as {repo: {path: bytes or file Path}}
+
+    rate_mb caps each connection's throughput (the Hub's CDN limits single
+    connections too), and with probability drop_rate a file response is cut
+    off partway through, as a flaky network would.
+    """
+
+    def __init__(self, repos, port=0, rate_mb=0.0, drop_rate=0.0, seed=0):
+        self.repos = repos
+        self.rate_mb = rate_mb
+        self.drop_rate = drop_rate
+        self.rng = random.Random(seed)
+        self.requests = Counter()
+        self.bytes_served = 0
+        self.listings = {repo: self.listing(files) for repo, files in repos.items()}
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                stub.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    @staticmethod
+    def read(source, start=0, end=None):
+        if isinstance(source, (bytes, bytearray)):
+            return bytes(source[start:end])
+        with open(source, "rb") as f:
+            f.seek(start)
+            return f.read(-1 if end is None else end - start)
+
+    @classmethod
+    def listing(cls, files):
+        siblings = []
+        for path, source in files.items():
+            data = cls.read(source)
+            sibling = {
+                "rfilename": path,
+                "size": len(data),
+                "blobId": hashlib.sha1(f"blob {len(data)}\0".encode() + data).hexdigest(),
+            }
+            if path.endswith(LFS_SUFFIXES) or len(data) >= LFS_MIN_BYTES:
+                sibling["lfs"] = {"sha256": hashlib.sha256(data).hexdigest(), "size": len(data)}
+            siblings.append(sibling)
+        return {"sha": COMMIT, "siblings": siblings}
+
+    def send_json(self, handler, status, body):
+        payload = json.dumps(body).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def handle(self, handler):
+        path = unquote(urlparse(handler.path).path)
+
+        match = re.fullmatch(r"/api/models/(.+)/revision/[^/]+", path)
+        if match:
+            with self._lock:
+                self.requests["listing"] += 1
+            listing = self.listings.get(match.group(1))
+            return self.send_json(handler, 200 if listing else 404, listing or {"error": "Repository not found"})
+
+        match = re.fullmatch(r"/(.+?/[^/]+)/resolve/[^/]+/(.+)", path)
+        source = match and self.repos.get(match.group(1), {}).get(match.group(2))
+        if source is None:
+            return self.send_json(handler, 404, {"error": "Entry not found"})
+        self.send_file(handler, source)
+
+    def send_file(self, handler, source):
+        size = len(source) if isinstance(source, (bytes, bytearray)) else Path(source).stat().st_size
+        start, end = 0, size
+        status = 200
+        ranged = re.fullmatch(r"bytes=(\d+)-(\d*)", handler.headers.get("Range", ""))
+        if ranged:
+            start = int(ranged.group(1))
+            end = min(int(ranged.group(2)) + 1, size) if ranged.group(2) else size
+            status = 206
+
+        with self._lock:
+            self.requests["file"] += 1
+            drop_at = start + self.rng.randrange(end - start) if end > start and self.rng.random() < self.drop_rate else None
+
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/octet-stream")
+        handler.send_header("Content-Length", str(end - start))
+        handler.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            handler.send_header("Content-Range", f"bytes {start}-{end - 1}/{size}")
+        handler.end_headers()
+
+        position = start
+        while position < end:
+            chunk_end = min(position + SEND_CHUNK, end, drop_at if drop_at is not None else end)
+            chunk = self.read(source, position, chunk_end)
+            started = time.perf_counter()
+            try:
+                handler.wfile.write(chunk)
+            except OSError:
+                break
+            position = chunk_end
+            with self._lock:
+                self.bytes_served += len(chunk)
+            if position == drop_at:
+                handler.close_connection = True
+                with self._lock:
+                    self.requests["dropped"] += 1
+                return
+            if self.rate_mb:
+                time.sleep(max(0.0, len(chunk) / (self.rate_mb * 1024**2) - (time.perf_counter() - started)))
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="hub-stub", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--repo", action="append", default=[], metavar="NAME=DIR",
+                        help="serve the files under DIR as repo NAME (repeatable)")
+    parser.add_argument("--rate-mb", type=float, default=0.0, help="MB/s per connection, 0 for no limit")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="share of file responses cut off partway")
+    args = parser.parse_args()
+
+    if not args.repo:
+        parser.error("pass at least one --repo NAME=DIR")
+    repos = {}
+    for item in args.repo:
+        name, _, directory = item.partition("=")
+        repos[name] = directory_files(directory)
+
+    stub = StubHub(repos, args.port, args.rate_mb, args.drop_rate)
+    print(f"Stub Hub on {stub.url} serving {', '.join(repos)}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Served {stub.bytes_served / 1024**2:.0f} MB in {dict(stub.requests)}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
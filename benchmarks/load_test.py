@@ -0,0 +1,438 @@
+"""Load test the FastAPI server with concurrent asyncio clients: throughput, tail latency, errors and saturation
+
+The app runs under uvicorn in this process, in a scratch PHARMAPEDIA_HOME
+with the stand-in models and the openFDA stub (see run_suite.py), and is
+driven over real HTTP. Each level is either a number of clients sending
+back-to-back requests (--concurrency) or Poisson arrivals at a fixed rate
+(--rate). Stepping through several levels finds the saturation point, where
+throughput stops growing while latency and 429s climb.
+
+Thread safety is checked two ways. Every shared model call (text model,
+UNet, VAE decode, CLIP text encoder, scheduler steps) is wrapped to flag
+calls overlapping from different threads. Every blog is also compared with
+the same blog generated on its own first, since generation is seeded and a
+pipeline disturbed by another thread produces different output.
+
+    python benchmarks/load_test.py --concurrency 1 2 4 8 --requests 8
+    python benchmarks/load_test.py --rate 0.1 0.2 0.4 --duration 120 --mix lisinopril=3 metformin=1
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+from run_suite import (
+    FIXTURE_DIR, GENERATION_SEED, RESULTS_DIR, free_port, git_commit, percentile, prepare_home, quiet_pipelines
+)
+
+# Throughput has saturated once a level adds less than this over the previous one
+SATURATION_GAIN = 0.10
+METRICS_POLL_SECONDS = 1.0
+GAUGE = re.compile(r"^pharmapedia_(job_queue_depth|jobs_running|streams_active) (\S+)$", re.M)
+
+
+class OverlapDetector:
+    """Wraps methods of shared model objects to record calls that overlap across threads"""
+
+    def __init__(self):
+        self.overlaps = Counter()
+        self.calls = Counter()
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def watch(self, name, obj, method):
+        original = getattr(obj, method)
+        key = f"{name}.{method}"
+
+        def guarded(*args, **kwargs):
+            thread = threading.get_ident()
+            with self._lock:
+                active = self._active.setdefault(key, Counter())
+                if any(other != thread for other in active):
+                    self.overlaps[key] += 1
+                active[thread] += 1
+                self.calls[key] += 1
+            try:
+                return original(*args, **kwargs)
+            finally:
+                with self._lock:
+                    active[thread] -= 1
+                    if not active[thread]:
+                        del active[thread]
+
+        setattr(obj, method, guarded)
+
+    def watch_models(self, model_manager, image_profile):
+        self.watch("text_model", model_manager.text_pipe.model, "forward")
+        image_pipe = model_manager.image_pipe
+        self.watch("unet", image_pipe.unet, "forward")
+        self.watch("vae", image_pipe.vae, "decode")
+        self.watch("text_encoder", image_pipe.text_encoder, "forward")
+
+        # Profile pipelines share the weights above but each has its own scheduler
+        with model_manager.image_lock:
+            pipe, scheduler, _ = model_manager.profile_pipeline(image_profile)
+        self.watch(f"scheduler[{scheduler}]", pipe.scheduler, "step")
+
+
+class ErrorRecorder(logging.Handler):
+    """Counts error records logged anywhere in the server, e.g. exceptions in request handlers"""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.messages = Counter()
+
+    def emit(self, record):
+        message = record.getMessage()
+        if record.exc_info and record.exc_info[1] is not None:
+            message = f"{message}: {type(record.exc_info[1]).__name__}: {record.exc_info[1]}"
+        self.messages[message[:200]] += 1
+
+
+def fingerprint(blog):
+    """What a seeded generation should reproduce exactly: the text and the image bytes"""
+    text = hashlib.sha256(blog.get("blog_content", "").encode()).hexdigest()[:16]
+    return text, (blog.get("image_asset") or {}).get("digest")
+
+
+def parse_mix(values, default):
+    if not values:
+        return {drug: 1.0 for drug in default}
+    mix = {}
+    for value in values:
+        drug, _, weight = value.partition("=")
+        mix[drug] = float(weight or 1)
+    return mix
+
+
+class LoadTest:
+    def __init__(self, args, base_url):
+        self.args = args
+        self.base_url = base_url
+        self.rng = random.Random(args.seed)
+        self.drugs = list(args.mix)
+        self.weights = list(args.mix.values())
+        self.references = {}
+        self.nondeterministic = set()
+
+    def body(self, drug):
+        return {
+            "drug_name": drug, "force_refresh": True, "image_profile": self.args.image_profile, "seed": GENERATION_SEED
+        }
+
+    async def generate_stream(self, client, drug):
+        """(status, blog or error message, retry_after) over /generate-blog/stream"""
+        async with client.stream("POST", "/generate-blog/stream", json=self.body(drug)) as response:
+            if response.status_code != 200:
+                await response.aread()
+                return response.status_code, response.text, response.headers.get("Retry-After")
+
+            event = None
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: ") and event in ("done", "error"):
+                    data = json.loads(line[len("data: "):])
+                    if event == "done":
+                        return 200, data, None
+                    return 500, data.get("message") or data.get("error"), None
+        return 500, "stream ended without a result", None
+
+    async def generate_job(self, client, drug):
+        """(status, blog or error message, retry_after) through the job queue"""
+        response = await client.post("/generate-blog", json=self.body(drug))
+        if response.status_code != 202:
+            return response.status_code, response.text, response.headers.get("Retry-After")
+
+        job = response.json()
+        async with client.stream("GET", job["events_url"]) as events:
+            async for line in events.aiter_lines():
+                if line.startswith("event: ") and line[len("event: "):] in ("completed", "failed"):
+                    break
+
+        result = (await client.get(job["job_url"])).json()
+        if result["status"] != "completed":
+            return 500, result.get("error"), None
+        return 200, result["result"], None
+
+    async def request(self, client, drug, records):
+        generate = self.generate_stream if self.args.endpoint == "stream" else self.generate_job
+        start = time.perf_counter()
+        try:
+            status, data, retry_after = await generate(client, drug)
+        except httpx.HTTPError as e:
+            status, data, retry_after = None, f"{type(e).__name__}: {e}", None
+
+        record = {"drug": drug, "status": status, "seconds": time.perf_counter() - start}
+        if status == 200:
+            record["outcome"] = "ok"
+            reference = self.references.get(drug)
+            if reference and fingerprint(data) != reference:
+                record["outcome"] = "inconsistent"
+        elif status == 429:
+            record["outcome"] = "rejected"
+        else:
+            record["outcome"] = "error"
+            record["error"] = str(data)[:200]
+        records.append(record)
+        return float(retry_after) if retry_after else 0.0
+
+    async def learn_references(self, client):
+        """Generate each drug twice on an idle server; drugs whose output differs between the two aren't checked"""
+        for drug in self.drugs:
+            runs = []
+            for _ in range(2):
+                status, data, _ = await self.generate_stream(client, drug)
+                if status != 200:
+                    raise RuntimeError(f"Reference generation for {drug} failed: {data}")
+                runs.append(fingerprint(data))
+            if runs[0] == runs[1]:
+                self.references[drug] = runs[1]
+            else:
+                self.nondeterministic.add(drug)
+
+    async def closed_loop(self, client, concurrency, records):
+        remaining = [self.args.requests]
+
+        async def user():
+            while remaining[0] > 0:
+                remaining[0] -= 1
+                backoff = await self.request(client, self.pick(), records)
+                if backoff:
+                    await asyncio.sleep(backoff)
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+
+    async def open_loop(self, client, rate, records):
+        tasks = []
+        deadline = time.perf_counter() + self.args.duration
+        while time.perf_counter() < deadline:
+            tasks.append(asyncio.ensure_future(self.request(client, self.pick(), records)))
+            await asyncio.sleep(self.rng.expovariate(rate))
+        await asyncio.gather(*tasks)
+
+    def pick(self):
+        return self.rng.choices(self.drugs, self.weights)[0]
+
+    async def watch_gauges(self, client, peaks, stop):
+        while not stop.is_set():
+            try:
+                text = (await client.get("/metrics")).text
+                for name, value in GAUGE.findall(text):
+                    peaks[name] = max(peaks.get(name, 0), float(value))
+            except httpx.HTTPError:
+                pass
+            try:
+                await asyncio.wait_for(stop.wait(), METRICS_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_level(self, client, mode, level):
+        records = []
+        peaks = {}
+        stop = asyncio.Event()
+        watcher = asyncio.ensure_future(self.watch_gauges(client, peaks, stop))
+
+        start = time.perf_counter()
+        if mode == "concurrency":
+            await self.closed_loop(client, int(level), records)
+        else:
+            await self.open_loop(client, level, records)
+        wall = time.perf_counter() - start
+
+        stop.set()
+        await watcher
+        return summarize_level(mode, level, records, wall, peaks)
+
+    async def run(self, mode, levels):
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=None, limits=limits) as client:
+            await self.learn_references(client)
+            results = []
+            for level in levels:
+                results.append(await self.run_level(client, mode, level))
+                print_level(results[-1])
+            return results
+
+
+def summarize_level(mode, level, records, wall, peaks):
+    outcomes = Counter(record["outcome"] for record in records)
+    latencies = [record["seconds"] for record in records if record["outcome"] in ("ok", "inconsistent")]
+    completed = len(latencies)
+    return {
+        mode: level,
+        "requests": len(records),
+        "ok": outcomes["ok"],
+        "inconsistent": outcomes["inconsistent"],
+        "rejected": outcomes["rejected"],
+        "errors": outcomes["error"],
+        "error_rate": outcomes["error"] / len(records) if records else 0.0,
+        "rejection_rate": outcomes["rejected"] / len(records) if records else 0.0,
+        "blogs_per_minute": completed * 60 / wall if wall else 0.0,
+        "p50": percentile(latencies, 50) if latencies else None,
+        "p95": percentile(latencies, 95) if latencies else None,
+        "p99": percentile(latencies, 99) if latencies else None,
+        "max": max(latencies) if latencies else None,
+        "seconds": wall,
+        "peak_queue_depth": peaks.get("job_queue_depth"),
+        "peak_streams": peaks.get("streams_active"),
+        "error_samples": sorted({record["error"] for record in records if record.get("error")})[:5],
+    }
+
+
+def saturation(levels, mode):
+    """The last level that still added throughput, and the first level with 429s"""
+    saturated = None
+    for previous, current in zip(levels, levels[1:]):
+        if current["blogs_per_minute"] < previous["blogs_per_minute"] * (1 + SATURATION_GAIN):
+            saturated = previous[mode]
+            break
+    rejecting = next((level[mode] for level in levels if level["rejected"]), None)
+    return {"throughput_plateau_at": saturated, "first_rejections_at": rejecting}
+
+
+def seconds(value):
+    return f"{value:.2f}" if value is not None else "-"
+
+
+def gauge(value):
+    return f"{value:.0f}" if value is not None else "-"
+
+
+def print_header(mode):
+    print(f"\n{mode:>12}{'requests':>10}{'ok':>5}{'429':>5}{'errors':>8}{'mismatch':>10}{'blogs/min':>11}"
+          f"{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}{'max queue':>11}{'max streams':>13}")
+
+
+def print_level(r):
+    mode = "concurrency" if "concurrency" in r else "rate"
+    print(f"{r[mode]:>12}{r['requests']:>10}{r['ok']:>5}{r['rejected']:>5}{r['errors']:>8}{r['inconsistent']:>10}"
+          f"{r['blogs_per_minute']:>11.2f}{seconds(r['p50']):>8}{seconds(r['p95']):>8}{seconds(r['p99']):>8}"
+          f"{gauge(r['peak_queue_depth']):>11}{gauge(r['peak_streams']):>13}")
+    for error in r["error_samples"]:
+        print(f"{'':>12}error: {error}")
+
+
+def start_server(port):
+    import uvicorn
+
+    import fastapi_blog_server
+
+    config = uvicorn.Config(fastapi_blog_server.app, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, name="uvicorn", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("uvicorn failed to start")
+        time.sleep(0.05)
+    return server, thread, fastapi_blog_server.generator
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    levels = parser.add_mutually_exclusive_group()
+    levels.add_argument("--concurrency", type=int, nargs="+", help="clients sending back-to-back requests, per level")
+    levels.add_argument("--rate", type=float, nargs="+", help="Poisson arrivals per second, per level")
+    parser.add_argument("--requests", type=int, default=8, help="requests per --concurrency level")
+    parser.add_argument("--duration", type=float, default=60, help="seconds of arrivals per --rate level")
+    parser.add_argument("--endpoint", choices=["job", "stream"], default="job")
+    parser.add_argument("--mix", nargs="+", help="drug=weight pairs (default: every fixture drug, equally)")
+    parser.add_argument("--image-profile", default="draft")
+    parser.add_argument("--seed", type=int, default=0, help="seeds the drug choices and arrival times")
+    parser.add_argument("--home", help="PHARMAPEDIA_HOME to run in (default: a scratch directory)")
+    parser.add_argument("--real-models", action="store_true", help="use the models in <home>/models instead of stand-ins")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/load-<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    if args.real_models and not args.home:
+        parser.error("--real-models needs --home pointing at a tree with downloaded models")
+    mode, level_values = ("rate", args.rate) if args.rate else ("concurrency", args.concurrency or [1, 2, 4, 8])
+    args.mix = parse_mix(args.mix, sorted(path.stem for path in FIXTURE_DIR.glob("*.json")))
+
+    scratch = None
+    if not args.home:
+        scratch = args.home = tempfile.mkdtemp(prefix="pharmapedia-load-")
+
+    stub = prepare_home(args.home, args.real_models)
+    errors = ErrorRecorder()
+    logging.getLogger().addHandler(errors)
+    detector = OverlapDetector()
+    server = None
+    try:
+        port = free_port()
+        server, thread, generator = start_server(port)
+        quiet_pipelines(generator.model_manager, args.image_profile)
+        detector.watch_models(generator.model_manager, args.image_profile)
+
+        test = LoadTest(args, f"http://127.0.0.1:{port}")
+        print_header(mode)
+        results = asyncio.run(test.run(mode, level_values))
+    finally:
+        if server is not None:
+            server.should_exit = True
+            thread.join(timeout=30)
+        stub.stop()
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    point = saturation(results, mode)
+    mismatches = sum(level["inconsistent"] for level in results)
+    print(f"\nThroughput plateau at {mode} {point['throughput_plateau_at'] or '(not reached)'}; "
+          f"first 429s at {mode} {point['first_rejections_at'] or '(none)'}")
+
+    print("\nThread safety")
+    print(f"  overlapping model calls: {sum(detector.overlaps.values())} of {sum(detector.calls.values())}"
+          + "".join(f"\n    {name}: {count}" for name, count in detector.overlaps.items()))
+    print(f"  outputs differing from a solo run: {mismatches}"
+          + (f" (not checked: {', '.join(sorted(test.nondeterministic))})" if test.nondeterministic else ""))
+    print(f"  server errors logged: {sum(errors.messages.values())}"
+          + "".join(f"\n    {count}x {message}" for message, count in errors.messages.most_common(5)))
+
+    commit, dirty = git_commit()
+    report = {
+        "commit": commit + ("-dirty" if dirty else ""),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "models": "real" if args.real_models else "stub",
+            "mode": mode,
+            "endpoint": args.endpoint,
+            "mix": args.mix,
+            "requests": args.requests if mode == "concurrency" else None,
+            "duration": args.duration if mode == "rate" else None,
+            "image_profile": args.image_profile,
+            "seed": args.seed,
+        },
+        "levels": results,
+        "saturation": point,
+        "thread_safety": {
+            "overlapping_calls": dict(detector.overlaps),
+            "model_calls": dict(detector.calls),
+            "inconsistent_outputs": mismatches,
+            "unchecked_drugs": sorted(test.nondeterministic),
+            "server_errors": dict(errors.messages),
+        },
+    }
+    output = Path(args.output) if args.output else RESULTS_DIR / f"load-{report['commit']}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Saved {output}")
+
+    unsafe = sum(detector.overlaps.values()) or mismatches or errors.messages
+    sys.exit(1 if unsafe else 0)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
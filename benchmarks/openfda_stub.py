@@ -0,0 +1,156 @@
+"""Local stand-in for the openFDA drug label API, with injectable latency and failures
+
+    python benchmarks/openfda_stub.py --port 8765 --fail-rate 0.2 --fixtures data
+    PHARMAPEDIA_OPENFDA_URL=http://127.0.0.1:8765 python rag_agent.py --drug aspirin
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import sys
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fda_store import normalize_drug_name, seed_to_label
+
+
+def stub_label(name):
+    return {
+        "set_id": f"stub-{name}",
+        "version": "1",
+        "effective_time": "20240101",
+        "openfda": {"generic_name": [name.upper()], "brand_name": [name.title()]},
+        "indications_and_usage": [f"{name.title()} is indicated for the treatment of stub conditions."],
+        "dosage_and_administration": [f"Take {name} once daily with water."],
+        "adverse_reactions": ["Headache and nausea were reported."],
+        "warnings": ["Consult a doctor before use."]
+    }
+
+
+def fixture_labels(fixture_dir):
+    """openFDA-shaped labels for the data/*.json summaries, keyed by drug name"""
+    labels = {}
+    for path in sorted(Path(fixture_dir).glob("*.json")):
+        with open(path) as f:
+            seed = json.load(f)
+        name = normalize_drug_name(seed.get("name", path.stem))
+        label = seed_to_label(seed)
+        label.update({"set_id": f"fixture-{name}", "version": "1", "effective_time": "20240101"})
+        label["openfda"]["generic_name"] = [name.upper()]
+        labels[name] = label
+    return labels
+
+
+class StubOpenFDA:
+    """Threaded HTTP server answering /drug/label.json searches
+
+    Drug names starting with "unknown" get openFDA's 404. Otherwise a
+    response is a 503 with probability fail_rate, every rate_limit_every-th
+    request is a 429 with Retry-After, and the rest return the drug's entry
+    in labels, or a small made-up label.
+    """
+
+    def __init__(self, port=0, latency=0.0, fail_rate=0.0, rate_limit_every=0, retry_after=1, seed=0, labels=None):
+        self.labels = labels or {}
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.rng = random.Random(seed)
+        self.requests = Counter()
+        self.statuses = Counter()
+        self.timestamps = []
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                status, body, headers = stub.respond(self.path)
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def respond(self, path):
+        url = urlparse(path)
+        if url.path != "/drug/label.json":
+            return 404, {"error": {"code": "NOT_FOUND", "message": "No matches found!"}}, {}
+
+        search = parse_qs(url.query).get("search", [""])[0]
+        match = re.search(r'"([^"]+)"', search)
+        name = match.group(1) if match else search
+
+        with self._lock:
+            self.requests[name] += 1
+            self.timestamps.append(time.monotonic())
+            count = sum(self.requests.values())
+            fail = self.rng.random() < self.fail_rate
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self.rate_limit_every and count % self.rate_limit_every == 0:
+            status, body, headers = 429, {"error": {"code": "OVER_RATE_LIMIT"}}, {"Retry-After": str(self.retry_after)}
+        elif fail:
+            status, body, headers = 503, {"error": {"code": "SERVICE_UNAVAILABLE"}}, {}
+        elif name.startswith("unknown"):
+            status, body, headers = 404, {"error": {"code": "NOT_FOUND", "message": "No matches found!"}}, {}
+        else:
+            label = self.labels.get(name) or stub_label(name)
+            status, body, headers = 200, {"meta": {"results": {"total": 1}}, "results": [label]}, {}
+
+        with self._lock:
+            self.statuses[status] += 1
+        return status, body, headers
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="openfda-stub", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per response")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of responses that are 503s")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="answer every Nth request with a 429")
+    parser.add_argument("--fixtures", help="serve the data/*.json summaries in this directory as labels")
+    args = parser.parse_args()
+
+    labels = fixture_labels(args.fixtures) if args.fixtures else None
+    stub = StubOpenFDA(args.port, args.latency, args.fail_rate, args.rate_limit_every, labels=labels)
+    print(f"Stub openFDA API on {stub.url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Served {sum(stub.requests.values())} requests: {dict(stub.statuses)}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,415 @@
+"""End-to-end benchmark of the fetchers, BlogGenerator.generate and the FastAPI app, saved as JSON for comparison
+
+Everything runs in a scratch PHARMAPEDIA_HOME against the local openFDA stub
+serving the data/*.json fixtures, with tiny random-weight stand-in models
+(stub_models.py) unless --real-models is given, so a run needs no network or
+downloads. Per-stage latencies come from the stage timers in metrics.py, and
+peak memory is the process RSS sampled while each stage ran.
+
+    python benchmarks/run_suite.py --repeats 3
+    python benchmarks/run_suite.py --compare benchmarks/results/<earlier run>.json
+    python benchmarks/run_suite.py --home C:\\BlogAgent --real-models --image-profile high
+"""
+import argparse
+import bisect
+import json
+import logging
+import math
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import psutil
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT = BENCH_DIR.parent
+FIXTURE_DIR = ROOT / "data"
+RESULTS_DIR = BENCH_DIR / "results"
+SCENARIOS = ("fetch", "generate", "api")
+SAMPLE_SECONDS = 0.005
+# p50 changes larger than this are flagged by --compare, unless under a few milliseconds
+REGRESSION_THRESHOLD = 0.10
+REGRESSION_MIN_SECONDS = 0.005
+# Passed with force_refresh, which would otherwise draw a new seed and change the output between runs
+GENERATION_SEED = 42
+
+
+def prepare_home(home, real_models=False):
+    """Point the repo at home and at a started openFDA stub serving the fixtures, which is returned
+
+    The paths and the openFDA URL are read when the modules are imported, so
+    this has to run before anything from the repo is imported.
+    """
+    stub_port = free_port()
+    os.environ["PHARMAPEDIA_HOME"] = home
+    os.environ["PHARMAPEDIA_OPENFDA_URL"] = f"http://127.0.0.1:{stub_port}"
+    os.environ["PHARMAPEDIA_LAZY_LOAD"] = "1"
+    os.environ.setdefault("PHARMAPEDIA_LOG_LEVEL", "WARNING")
+    sys.path.insert(0, str(ROOT))
+    sys.path.insert(0, str(BENCH_DIR))
+
+    from logging_setup import configure_logging
+    from openfda_stub import StubOpenFDA, fixture_labels
+
+    configure_logging()
+
+    if not real_models:
+        from stub_models import build_stub_models
+        build_stub_models(Path(home) / "models")
+
+    return StubOpenFDA(stub_port, labels=fixture_labels(FIXTURE_DIR)).start()
+
+
+def quiet_pipelines(model_manager, image_profile):
+    """Turn off the diffusers progress bars, building the profile's pipeline now so it is covered too"""
+    model_manager.load()
+    with model_manager.image_lock:
+        pipe, _, _ = model_manager.profile_pipeline(image_profile)
+    for pipe in {id(p): p for p in (model_manager.image_pipe, pipe)}.values():
+        pipe.set_progress_bar_config(disable=True)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, p):
+    """Nearest-rank percentile, so p95 of a handful of runs is an observed value"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "mean": sum(values) / len(values),
+    }
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return commit, bool(dirty)
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+class MemorySampler:
+    """Background thread recording the process RSS every few milliseconds"""
+
+    def __init__(self, interval=SAMPLE_SECONDS):
+        self.interval = interval
+        self.times = []
+        self.rss = []
+        self._process = psutil.Process()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.times.append(time.time())
+            self.rss.append(self._process.memory_info().rss)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def peak(self, start, end):
+        """Highest RSS sampled between start and end, or the last sample before a very short interval"""
+        lo = bisect.bisect_left(self.times, start)
+        hi = bisect.bisect_right(self.times, end)
+        if hi > lo:
+            return max(self.rss[lo:hi])
+        return self.rss[max(0, lo - 1)] if self.rss else 0
+
+
+class StageRecorder(logging.Handler):
+    """Collects the "Stage timed" records that metrics.stage_timer logs at debug level"""
+
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.stages = []
+
+    def emit(self, record):
+        stage = getattr(record, "stage", None)
+        if stage is not None:
+            self.stages.append((stage, record.created - record.seconds, record.created))
+
+
+class Suite:
+    def __init__(self, args, stub_url):
+        self.args = args
+        self.stub_url = stub_url
+        self.samples = {}
+        self.intervals = {}
+        self.wall = {}
+        self.failures = {}
+        self.scenario_of = {}
+        self.current = None
+
+    def timed(self, scenario, func, *args):
+        """Run func, recording its latency under scenario; a falsy result counts as a failure"""
+        start_wall, start = time.time(), time.perf_counter()
+        result = func(*args)
+        seconds = time.perf_counter() - start
+        self.scenario_of[scenario] = self.current
+        if result:
+            self.samples.setdefault(scenario, []).append(seconds)
+            self.intervals.setdefault(scenario, []).append((start_wall, start_wall + seconds))
+        else:
+            self.failures[scenario] = self.failures.get(scenario, 0) + 1
+        return result
+
+    def run_scenario(self, name, func):
+        self.current = name
+        start = time.perf_counter()
+        func()
+        self.wall[name] = time.perf_counter() - start
+        self.current = None
+
+    def fetch(self):
+        from fda_client import OpenFDAClient
+        from fda_store import LabelStore
+        from rag_agent import OpenFDAManager
+
+        # A fresh store, so the first lookup of each drug goes to the API and the rest are served from disk
+        client = OpenFDAClient(base_url=self.stub_url)
+        store = LabelStore(path=Path(self.args.home) / "bench" / "fetch.sqlite", client=client)
+        try:
+            for drug in self.args.drugs:
+                self.timed("fetch_cold", store.get, drug)
+                for _ in range(self.args.repeats):
+                    self.timed("fetch_warm", store.get, drug)
+                self.timed("fetch_summary", OpenFDAManager.fetch_detailed_drug_data, drug)
+        finally:
+            client.close()
+
+    def generate(self):
+        for _ in range(self.args.repeats):
+            for drug in self.args.drugs:
+                self.timed("generate", self.generate_one, drug)
+
+    def generate_one(self, drug):
+        result = self.generator.generate(
+            drug, force_refresh=True, image_profile=self.args.image_profile, seed=GENERATION_SEED
+        )
+        return result["status"] == "success"
+
+    def api(self):
+        from fastapi.testclient import TestClient
+
+        import fastapi_blog_server
+
+        with TestClient(fastapi_blog_server.app) as client:
+            for _ in range(self.args.repeats):
+                for drug in self.args.drugs:
+                    self.timed("api_job", self.api_job, client, drug)
+                    self.timed("api_stream", self.api_stream, client, drug)
+                    self.timed("api_metrics", lambda: client.get("/metrics").status_code == 200)
+
+    def request_body(self, drug):
+        return {
+            "drug_name": drug, "force_refresh": True, "image_profile": self.args.image_profile, "seed": GENERATION_SEED
+        }
+
+    def api_job(self, client, drug):
+        response = client.post("/generate-blog", json=self.request_body(drug))
+        if response.status_code != 202:
+            return False
+
+        status = None
+        with client.stream("GET", response.json()["events_url"]) as events:
+            for line in events.iter_lines():
+                if line.startswith("event: "):
+                    status = line[len("event: "):]
+                    if status in ("completed", "failed"):
+                        break
+        return status == "completed"
+
+    def api_stream(self, client, drug):
+        # The test client hands over the response once the app has finished it, so this is the full
+        # streamed generation, not time to first token
+        event = None
+        with client.stream("POST", "/generate-blog/stream", json=self.request_body(drug)) as events:
+            for line in events.iter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                    if event in ("done", "error"):
+                        break
+        return event == "done"
+
+    def run(self):
+        from metrics import logger as metrics_logger
+        from rag_agent import BlogGenerator
+
+        recorder = StageRecorder()
+        metrics_logger.addHandler(recorder)
+        metrics_logger.setLevel(logging.DEBUG)
+        metrics_logger.propagate = False
+
+        sampler = MemorySampler().start()
+        baseline_rss = psutil.Process().memory_info().rss
+        try:
+            self.generator = BlogGenerator()
+            self.timed("model_load", lambda: self.generator.model_manager.load() or True)
+            quiet_pipelines(self.generator.model_manager, self.args.image_profile)
+            self.generator.warm_up()
+            for name in self.args.scenarios:
+                self.run_scenario(name, getattr(self, name))
+        finally:
+            sampler.stop()
+            metrics_logger.removeHandler(recorder)
+
+        scenarios = {}
+        for name, values in self.samples.items():
+            scenario = self.scenario_of[name]
+            stats = summarize(values)
+            stats["failures"] = self.failures.get(name, 0)
+            stats["per_second"] = len(values) / self.wall[scenario] if scenario else None
+            stats["peak_rss_mb"] = max(sampler.peak(*interval) for interval in self.intervals[name]) / 2**20
+            scenarios[name] = stats
+        for name, count in self.failures.items():
+            scenarios.setdefault(name, {"count": 0, "failures": count})
+
+        stages = {}
+        for stage in sorted({stage for stage, _, _ in recorder.stages}):
+            intervals = [(start, end) for name, start, end in recorder.stages if name == stage]
+            stats = summarize([end - start for start, end in intervals])
+            stats["peak_rss_mb"] = max(sampler.peak(*interval) for interval in intervals) / 2**20
+            stages[stage] = stats
+
+        return {
+            "baseline_rss_mb": baseline_rss / 2**20,
+            "peak_rss_mb": max(sampler.rss) / 2**20,
+            "scenarios": scenarios,
+            "stages": stages,
+        }
+
+
+def environment():
+    import torch
+
+    return {
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def print_table(title, rows):
+    print(f"\n{title:<28}{'count':>7}{'fail':>6}{'p50 s':>10}{'p95 s':>10}{'per s':>9}{'peak MB':>10}")
+    for name, r in rows.items():
+        if not r.get("count"):
+            print(f"{name:<28}{0:>7}{r.get('failures', 0):>6}")
+            continue
+        per_second = f"{r['per_second']:.2f}" if r.get("per_second") else "-"
+        print(f"{name:<28}{r['count']:>7}{r.get('failures', 0):>6}{r['p50']:>10.3f}{r['p95']:>10.3f}"
+              f"{per_second:>9}{r['peak_rss_mb']:>10.0f}")
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """Print p50/p95 changes against an earlier run; returns how many got slower than threshold"""
+    print(f"\nCompared with {baseline['commit']} ({baseline['created']})")
+    if baseline["config"]["models"] != current["config"]["models"]:
+        print(f"Note: models differ ({baseline['config']['models']} vs {current['config']['models']})")
+
+    print(f"{'':<28}{'p50 before':>12}{'p50 now':>10}{'change':>9}{'p95 before':>12}{'p95 now':>10}{'change':>9}")
+    regressions = 0
+    for section in ("scenarios", "stages"):
+        for name, now in current[section].items():
+            before = baseline[section].get(name)
+            if not before or not before.get("count") or not now.get("count"):
+                continue
+            changes = [(now[p] - before[p]) / before[p] if before[p] else 0.0 for p in ("p50", "p95")]
+            slower = changes[0] > threshold and now["p50"] - before["p50"] > REGRESSION_MIN_SECONDS
+            regressions += slower
+            print(f"{name:<28}{before['p50']:>12.3f}{now['p50']:>10.3f}{changes[0]:>+9.0%}"
+                  f"{before['p95']:>12.3f}{now['p95']:>10.3f}{changes[1]:>+9.0%}{'  slower' if slower else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--drugs", nargs="+", default=sorted(path.stem for path in FIXTURE_DIR.glob("*.json")))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--image-profile", default="draft")
+    parser.add_argument("--home", help="PHARMAPEDIA_HOME to run in (default: a scratch directory)")
+    parser.add_argument("--real-models", action="store_true", help="use the models in <home>/models instead of stand-ins")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<commit>-<time>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help=f"exit 1 if any p50 is more than {REGRESSION_THRESHOLD:.0%}% slower than --compare")
+    args = parser.parse_args()
+
+    if args.real_models and not args.home:
+        parser.error("--real-models needs --home pointing at a tree with downloaded models")
+
+    scratch = None
+    if not args.home:
+        scratch = args.home = tempfile.mkdtemp(prefix="pharmapedia-bench-")
+
+    stub = prepare_home(args.home, args.real_models)
+    try:
+        measured = Suite(args, stub.url).run()
+    finally:
+        stub.stop()
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    commit, dirty = git_commit()
+    results = {
+        "commit": commit + ("-dirty" if dirty else ""),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment(),
+        "config": {
+            "models": "real" if args.real_models else "stub",
+            "drugs": args.drugs,
+            "repeats": args.repeats,
+            "scenarios": args.scenarios,
+            "image_profile": args.image_profile,
+        },
+        **measured,
+    }
+
+    print_table("scenario", results["scenarios"])
+    print_table("stage", results["stages"])
+    print(f"\nPeak RSS {results['peak_rss_mb']:.0f} MB (started at {results['baseline_rss_mb']:.0f} MB)")
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{results['commit']}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"Saved {output}")
+
+    regressions = 0
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results)
+
+    sys.exit(1 if args.fail_on_regression and regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
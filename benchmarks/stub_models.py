@@ -0,0 +1,127 @@
+"""Tiny random-weight stand-ins for TinyLlama and Stable Diffusion, for running the pipeline on any CPU
+
+The models have the real architectures (LlamaForCausalLM, a Stable Diffusion
+UNet/VAE/CLIP text encoder) at a tiny fraction of their size, and tokenizers
+trained on the data/*.json fixtures, so they load through the same code paths
+as the real models without any downloads. Their output is noise, but timings
+of everything around the models are representative.
+
+    python benchmarks/stub_models.py --models-dir C:\\BlogAgent-bench\\models
+"""
+import argparse
+import json
+from pathlib import Path
+
+import torch
+from diffusers import AutoencoderKL, PNDMScheduler, StableDiffusionPipeline, UNet2DConditionModel
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+from transformers import CLIPTextConfig, CLIPTextModel, LlamaConfig, LlamaForCausalLM, PreTrainedTokenizerFast
+
+FIXTURE_DIR = Path(__file__).resolve().parent.parent / "data"
+SEED = 0
+# Bumped whenever the stand-ins change, so stale copies get rebuilt
+STUB_VERSION = 1
+MARKER = "stub_models.json"
+
+TEXT_VOCAB_SIZE = 2000
+TEXT_CONTEXT = 2048
+CLIP_VOCAB_SIZE = 1000
+CLIP_CONTEXT = 77
+
+
+def fixture_corpus(fixture_dir=FIXTURE_DIR):
+    texts = []
+    for path in sorted(Path(fixture_dir).glob("*.json")):
+        with open(path) as f:
+            texts.extend(str(value) for value in json.load(f).values())
+    return texts
+
+
+def train_tokenizer(corpus, vocab_size, special_tokens, model_max_length):
+    """Byte-level BPE, so any text encodes without unknown tokens"""
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(
+        vocab_size=vocab_size, special_tokens=special_tokens,
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet(), show_progress=False
+    )
+    tokenizer.train_from_iterator(corpus, trainer)
+    return PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, bos_token=special_tokens[0], eos_token=special_tokens[1],
+        unk_token=special_tokens[2], pad_token=special_tokens[1], model_max_length=model_max_length
+    )
+
+
+def build_text_model(target, corpus):
+    tokenizer = train_tokenizer(corpus, TEXT_VOCAB_SIZE, ["<s>", "</s>", "<unk>"], TEXT_CONTEXT)
+    config = LlamaConfig(
+        vocab_size=len(tokenizer), hidden_size=64, intermediate_size=128, num_hidden_layers=2,
+        num_attention_heads=4, num_key_value_heads=2, max_position_embeddings=TEXT_CONTEXT,
+        bos_token_id=tokenizer.bos_token_id, eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.pad_token_id
+    )
+    model = LlamaForCausalLM(config)
+    model.save_pretrained(target)
+    tokenizer.save_pretrained(target)
+
+
+def build_image_model(target, corpus):
+    tokenizer = train_tokenizer(corpus, CLIP_VOCAB_SIZE, ["<|startoftext|>", "<|endoftext|>", "<unk>"], CLIP_CONTEXT)
+    text_encoder = CLIPTextModel(CLIPTextConfig(
+        vocab_size=len(tokenizer), hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+        num_attention_heads=4, max_position_embeddings=CLIP_CONTEXT,
+        bos_token_id=tokenizer.bos_token_id, eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.pad_token_id
+    ))
+    unet = UNet2DConditionModel(
+        sample_size=64, in_channels=4, out_channels=4, layers_per_block=1, block_out_channels=(16, 32),
+        # Cross-attention only at the lower resolution keeps a step around a tenth of a second
+        down_block_types=("DownBlock2D", "CrossAttnDownBlock2D"),
+        up_block_types=("CrossAttnUpBlock2D", "UpBlock2D"),
+        cross_attention_dim=32, attention_head_dim=4, norm_num_groups=8
+    )
+    # Four blocks keep the 8x latent downsampling of the real VAE
+    vae = AutoencoderKL(
+        in_channels=3, out_channels=3, latent_channels=4, layers_per_block=1, norm_num_groups=8,
+        block_out_channels=(8, 16, 16, 16),
+        down_block_types=("DownEncoderBlock2D",) * 4, up_block_types=("UpDecoderBlock2D",) * 4
+    )
+    scheduler = PNDMScheduler(
+        beta_start=0.00085, beta_end=0.012, beta_schedule="scaled_linear", skip_prk_steps=True,
+        steps_offset=1
+    )
+    pipe = StableDiffusionPipeline(
+        vae=vae, text_encoder=text_encoder, tokenizer=tokenizer, unet=unet, scheduler=scheduler,
+        safety_checker=None, feature_extractor=None, requires_safety_checker=False
+    )
+    pipe.save_pretrained(target)
+
+
+def build_stub_models(models_dir, force=False):
+    """Write the stand-ins to models_dir/tinyllama and models_dir/stable_diffusion, unless already there"""
+    models_dir = Path(models_dir)
+    marker = models_dir / MARKER
+    if not force and marker.exists() and json.loads(marker.read_text()).get("version") == STUB_VERSION:
+        return False
+
+    torch.manual_seed(SEED)
+    corpus = fixture_corpus()
+    build_text_model(models_dir / "tinyllama", corpus)
+    build_image_model(models_dir / "stable_diffusion", corpus)
+    marker.write_text(json.dumps({"version": STUB_VERSION, "seed": SEED}))
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models-dir", required=True)
+    parser.add_argument("--force", action="store_true", help="rebuild even if the stand-ins are up to date")
+    args = parser.parse_args()
+
+    built = build_stub_models(args.models_dir, args.force)
+    print(f"{'Built' if built else 'Up to date:'} stub models in {args.models_dir}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
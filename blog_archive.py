@@ -0,0 +1,363 @@
+import argparse
+import hashlib
+import html
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from config import HOME_DIR
+
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_PATH = os.path.join(HOME_DIR, "data", "blog_archive.sqlite")
+OUTPUT_DIR = os.path.join(HOME_DIR, "output")
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+INGEST_BATCH_SIZE = 500
+# Versions kept per blog, 0 for all; older ones are dropped, and their images with them (see output_retention.py)
+MAX_VERSIONS = int(os.getenv("PHARMAPEDIA_ARCHIVE_VERSIONS", 10))
+SNIPPET_TOKENS = 24
+
+# Columns kept out of the stored record, since they are columns of their own
+POST_COLUMNS = ("drug_name", "brand_names", "manufacturer", "title", "blog_content", "image_filename")
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS posts (
+        id INTEGER PRIMARY KEY,
+        blog_key TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        latest INTEGER NOT NULL,
+        drug_name TEXT NOT NULL,
+        brand_names TEXT,
+        manufacturer TEXT,
+        title TEXT NOT NULL,
+        blog_content TEXT NOT NULL,
+        image_filename TEXT,
+        content_hash TEXT NOT NULL,
+        record TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        UNIQUE (blog_key, version)
+    );
+    CREATE INDEX IF NOT EXISTS posts_latest ON posts (id) WHERE latest = 1;
+    CREATE INDEX IF NOT EXISTS posts_content_hash ON posts (blog_key, content_hash);
+    CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+        title, drug_name, brand_names, blog_content,
+        content='posts', content_rowid='id', tokenize='porter unicode61'
+    );
+"""
+
+# Snippet highlight markers, swapped for <mark> after the snippet is HTML-escaped
+MARK_START = "\x02"
+MARK_END = "\x03"
+
+
+def blog_key(drug_name):
+    """Id of a drug's blog, as in output/<key>_blog.json and /blogs/<key>.html"""
+    return drug_name.lower()
+
+
+def content_hash(blog_data):
+    payload = json.dumps(blog_data, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def fts_query(text):
+    """FTS5 query matching every word of free text, the last one as a prefix; None without words
+
+    Words are quoted, so operators and punctuation in user input can't
+    produce a syntax error.
+    """
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+    return " ".join(f'"{word}"' for word in words[:-1]) + f' "{words[-1]}"*'
+
+
+def highlight(snippet):
+    return html.escape(snippet or "").replace(MARK_START, "<mark>").replace(MARK_END, "</mark>")
+
+
+class BlogArchive:
+    """SQLite archive of every generated blog, with a full-text index
+
+    output/<drug>_blog.json only holds a drug's latest blog; the archive keeps
+    each generation as a numbered version. Listing pages by id with a cursor
+    and searching through FTS5 keeps queries fast however many posts there are;
+    the full-text index only covers latest versions, so searches never have
+    to filter out superseded ones.
+    """
+
+    def __init__(self, path=ARCHIVE_PATH, max_versions=MAX_VERSIONS):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_versions = max_versions
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def _insert(self, blog_data, created_at, skip_known):
+        """Add a blog as the next version of its drug; returns (id, version), or None if it's a duplicate
+
+        A blog identical to the latest version (e.g. restored from the result
+        cache) is not recorded again; with skip_known, neither is one identical
+        to any earlier version. Versions beyond max_versions are dropped; they
+        are never the latest, so the FTS index is unaffected. Call with the
+        lock held and commit afterwards.
+        """
+        key = blog_key(blog_data["drug_name"])
+        digest = content_hash(blog_data)
+
+        if skip_known:
+            known = self._db.execute(
+                "SELECT 1 FROM posts WHERE blog_key = ? AND content_hash = ?", (key, digest)
+            ).fetchone()
+        else:
+            known = self._db.execute(
+                "SELECT 1 FROM posts WHERE blog_key = ? AND latest = 1 AND content_hash = ?", (key, digest)
+            ).fetchone()
+        if known:
+            return None
+
+        row = self._db.execute("SELECT MAX(version) FROM posts WHERE blog_key = ?", (key,)).fetchone()
+        version = (row[0] or 0) + 1
+        previous = self._db.execute(
+            "SELECT id, title, drug_name, brand_names, blog_content FROM posts WHERE blog_key = ? AND latest = 1", (key,)
+        ).fetchone()
+        if previous:
+            self._db.execute("UPDATE posts SET latest = 0 WHERE id = ?", (previous["id"],))
+            # External-content FTS5 deletes take the indexed values, which are still in posts
+            self._db.execute(
+                """INSERT INTO posts_fts (posts_fts, rowid, title, drug_name, brand_names, blog_content)
+                   VALUES ('delete', ?, ?, ?, ?, ?)""",
+                tuple(previous)
+            )
+
+        record = {k: v for k, v in blog_data.items() if k not in POST_COLUMNS}
+        columns = {column: blog_data.get(column) for column in POST_COLUMNS}
+        columns["blog_content"] = columns["blog_content"] or ""
+        post_id = self._db.execute(
+            """INSERT INTO posts (blog_key, version, latest, drug_name, brand_names, manufacturer, title, blog_content,
+                                  image_filename, content_hash, record, created_at)
+               VALUES (?, ?, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (key, version, columns["drug_name"], columns["brand_names"], columns["manufacturer"], columns["title"],
+             columns["blog_content"], columns["image_filename"], digest, json.dumps(record), created_at)
+        ).lastrowid
+        self._db.execute(
+            "INSERT INTO posts_fts (rowid, title, drug_name, brand_names, blog_content) VALUES (?, ?, ?, ?, ?)",
+            (post_id, columns["title"], columns["drug_name"], columns["brand_names"], columns["blog_content"])
+        )
+        if self.max_versions:
+            self._db.execute(
+                "DELETE FROM posts WHERE blog_key = ? AND version <= ?", (key, version - self.max_versions)
+            )
+        return post_id, version
+
+    def record(self, blog_data, created_at=None):
+        """Archive a newly generated blog; returns its version, or None if it's unchanged"""
+        with self._lock:
+            inserted = self._insert(blog_data, time.time() if created_at is None else created_at, skip_known=False)
+            self._db.commit()
+        return inserted[1] if inserted else None
+
+    def record_many(self, items, batch_size=INGEST_BATCH_SIZE):
+        """Archive (blog_data, created_at) pairs, one transaction per batch; skips blogs already archived"""
+        count = 0
+        batch = []
+
+        def flush():
+            nonlocal count
+            with self._lock:
+                for blog_data, created_at in batch:
+                    if self._insert(blog_data, created_at, skip_known=True):
+                        count += 1
+                self._db.commit()
+            batch.clear()
+
+        for item in items:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+        return count
+
+    def ingest_dir(self, output_dir=OUTPUT_DIR):
+        """Archive the output/*_blog.json files, dated by their modification time"""
+        def blogs():
+            for path in sorted(Path(output_dir).glob("*_blog.json")):
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        blog_data = json.load(f)
+                except (OSError, ValueError) as e:
+                    logger.warning("Skipping unreadable blog file", extra={"path": str(path), "error": str(e)})
+                    continue
+                if blog_data.get("status") == "success" and blog_data.get("drug_name"):
+                    yield blog_data, path.stat().st_mtime
+
+        return self.record_many(blogs())
+
+    @staticmethod
+    def summary(row):
+        return {
+            "id": row["id"],
+            "blog_key": row["blog_key"],
+            "version": row["version"],
+            "latest": bool(row["latest"]),
+            "drug_name": row["drug_name"],
+            "brand_names": row["brand_names"],
+            "title": row["title"],
+            "image_filename": row["image_filename"],
+            "created_at": row["created_at"],
+        }
+
+    def page(self, limit=PAGE_SIZE, cursor=None, drug_name=None):
+        """A page of summaries, newest first: the latest version of every blog, or every version of one drug
+
+        Returns (summaries, next_cursor); pass next_cursor back for the
+        following page, it is None on the last one.
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        columns = "id, blog_key, version, latest, drug_name, brand_names, title, image_filename, created_at"
+        if drug_name:
+            query = f"SELECT {columns} FROM posts WHERE blog_key = ? AND version < ? ORDER BY version DESC LIMIT ?"
+            params = (blog_key(drug_name), cursor or 2**62, limit + 1)
+        else:
+            query = f"SELECT {columns} FROM posts WHERE latest = 1 AND id < ? ORDER BY id DESC LIMIT ?"
+            params = (cursor or 2**62, limit + 1)
+
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1]["version"] if drug_name else rows[-1]["id"]
+        return [self.summary(row) for row in rows], next_cursor
+
+    def _matches(self, query, order, limit, offset):
+        """A page of FTS matches as (summary, snippet) pairs; call with the lock held
+
+        The page is read from the FTS table alone and its posts looked up by
+        id afterwards: joined in the same query, or with the snippet built
+        afterwards for a list of rowids, FTS5 goes through every match again.
+        """
+        if limit <= 0:
+            return []
+        matches = self._db.execute(f"""
+            SELECT rowid, snippet(posts_fts, 3, '{MARK_START}', '{MARK_END}', '…', {SNIPPET_TOKENS})
+            FROM posts_fts WHERE posts_fts MATCH ? ORDER BY {order} LIMIT ? OFFSET ?
+        """, (query, limit, offset)).fetchall()
+        if not matches:
+            return []
+
+        placeholders = ", ".join("?" * len(matches))
+        posts = {row["id"]: row for row in self._db.execute(
+            "SELECT id, blog_key, version, latest, drug_name, brand_names, title, image_filename, created_at "
+            f"FROM posts WHERE id IN ({placeholders})",
+            [post_id for post_id, _ in matches]
+        )}
+        return [(self.summary(posts[post_id]), snippet) for post_id, snippet in matches if post_id in posts]
+
+    def search(self, text, limit=PAGE_SIZE, offset=0):
+        """Latest versions matching free text, with a highlighted snippet; returns (results, total matches)
+
+        Blogs matching in the title, drug or brand names come first, ranked by
+        bm25; blogs matching only in their content follow, newest first. Ranking
+        every content match by bm25 costs time in proportion to the number of
+        matches, which grows with the archive; reading them in rowid order
+        stops after one page.
+        """
+        query = fts_query(text)
+        if query is None:
+            return [], 0
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        offset = max(0, offset)
+        names_query = f"{{title drug_name brand_names}}: ({query})"
+        content_query = f"({query}) NOT {names_query}"
+
+        with self._lock:
+            count = "SELECT COUNT(*) FROM posts_fts WHERE posts_fts MATCH ?"
+            total = self._db.execute(count, (query,)).fetchone()[0]
+            name_matches = self._db.execute(count, (names_query,)).fetchone()[0]
+
+            rows = self._matches(names_query, "bm25(posts_fts, 10.0, 5.0, 5.0, 1.0)", limit, offset)
+            rows += self._matches(
+                content_query, "rowid DESC", limit - len(rows), max(0, offset - name_matches)
+            )
+
+        return [{**summary, "snippet": highlight(snippet)} for summary, snippet in rows], total
+
+    def get(self, drug_name, version=None):
+        """The full blog data of one version (the latest by default), or None"""
+        query = "SELECT * FROM posts WHERE blog_key = ? AND "
+        query += "version = ?" if version else "latest = 1"
+        params = (blog_key(drug_name), version) if version else (blog_key(drug_name),)
+
+        with self._lock:
+            row = self._db.execute(query, params).fetchone()
+        if row is None:
+            return None
+        return {**json.loads(row["record"]), **{column: row[column] for column in POST_COLUMNS}}
+
+    def records(self):
+        """Blog data of every archived version, for finding the files they still use"""
+        with self._lock:
+            rows = self._db.execute("SELECT record, image_filename FROM posts").fetchall()
+        return [{**json.loads(row["record"]), "image_filename": row["image_filename"]} for row in rows]
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM posts").fetchone()[0]
+
+
+_default_archive = None
+_default_archive_lock = threading.Lock()
+
+
+def get_blog_archive():
+    """Process-wide BlogArchive, filled from the output directory on first use"""
+    global _default_archive
+
+    with _default_archive_lock:
+        if _default_archive is None:
+            _default_archive = BlogArchive()
+            if _default_archive.count() == 0:
+                _default_archive.ingest_dir()
+        return _default_archive
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive generated blogs and search them")
+    parser.add_argument("--ingest", nargs="?", const=OUTPUT_DIR, help="archive the *_blog.json files in a directory")
+    parser.add_argument("--search", help="full-text search of the latest versions")
+    parser.add_argument("--list", action="store_true", help="list the latest version of every blog")
+    args = parser.parse_args()
+
+    archive = get_blog_archive()
+
+    if args.ingest:
+        print(f"Archived {archive.ingest_dir(args.ingest)} blogs from {args.ingest}, {archive.count()} posts in total")
+
+    if args.list:
+        posts, _ = archive.page(MAX_PAGE_SIZE)
+        for post in posts:
+            print(f"{post['blog_key']} v{post['version']}: {post['title']}")
+
+    if args.search:
+        results, total = archive.search(args.search)
+        print(f"{total} matches")
+        for result in results:
+            print(f"{result['blog_key']} v{result['version']}: {result['title']}\n    {result['snippet']}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
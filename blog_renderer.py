@@ -0,0 +1,284 @@
+"""Markdown-to-HTML rendering of generated blogs, shared by rag_agent's API and the old Gemini agent
+
+Generated text is parsed once into a list of blocks (headings, paragraphs
+and lists), which are rendered through templates built at import time. The
+parser is incremental, so a streaming generation can be rendered block by
+block as the text arrives. Pages link one stylesheet (blog.css) that is
+served with a content hash in its name and cached indefinitely, instead of
+repeating the CSS in every page.
+"""
+import hashlib
+import html
+import json
+import re
+import shutil
+import threading
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+
+
+CSS_PATH = Path(__file__).resolve().with_name("blog.css")
+CSS = CSS_PATH.read_text(encoding="utf-8")
+CSS_DIGEST = hashlib.sha256(CSS.encode("utf-8")).hexdigest()[:16]
+CSS_NAME = f"blog-{CSS_DIGEST}.css"
+CSS_URL = f"/static/{CSS_NAME}"
+# Bumped whenever the templates change, so rendered pages get new ETags
+RENDER_VERSION = 1
+PAGE_CACHE_SIZE = 64
+
+MARKDOWN_HEADING = re.compile(r"^(#{1,3})\s+(.+?)\s*#*$")
+BOLD_HEADING = re.compile(r"^\*\*(.+?)\*\*:?$")
+PLAIN_HEADING = re.compile(r"^([A-Za-z][A-Za-z ]{2,40}):?$")
+LIST_ITEM = re.compile(r"^([-*•]|\d+[.)])\s+(.+)$")
+
+INLINE_MARKUP = [
+    (re.compile(r"\*\*(.+?)\*\*"), r"<strong>\1</strong>"),
+    (re.compile(r"(?<![\w*])\*(?!\s)(.+?)(?<!\s)\*(?![\w*])"), r"<em>\1</em>"),
+    (re.compile(r"`([^`]+)`"), r"<code>\1</code>"),
+]
+
+HEADING_TEMPLATE = "<h{level}>{text}</h{level}>"
+PARAGRAPH_TEMPLATE = "<p>{text}</p>"
+LIST_TEMPLATE = "<{tag}>\n{items}\n</{tag}>"
+ITEM_TEMPLATE = "<li>{text}</li>"
+IMAGE_TEMPLATE = '<img class="{css_class}" src="{src}"{srcset} alt="{alt}"{loading}>'
+SECTION_IMAGE_TEMPLATE = '<figure class="section-image">\n{image}\n</figure>'
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{title}</title>
+    <link rel="stylesheet" href="{css_href}">
+</head>
+<body>
+    <div class="wrapper">
+        <header>
+            <h1>{heading}</h1>
+            <div class="date">{subtitle}</div>
+        </header>
+        {featured_image}
+        <article class="blog-content">
+{content}
+        </article>
+        <footer>
+            <p>{footer}</p>
+        </footer>
+    </div>
+</body>
+</html>"""
+
+Heading = namedtuple("Heading", "level text")
+Paragraph = namedtuple("Paragraph", "text")
+ListBlock = namedtuple("ListBlock", "ordered items")
+
+
+def parse_heading(line, known_sections=()):
+    """(level, text) when a stripped line is a heading, else None
+
+    Besides markdown and bold lines, plain "Name:" lines count as headings
+    when the name is one of known_sections.
+    """
+    match = MARKDOWN_HEADING.match(line)
+    if match:
+        return len(match.group(1)), match.group(2).strip()
+
+    match = BOLD_HEADING.match(line)
+    if match:
+        return 2, match.group(1).strip()
+
+    match = PLAIN_HEADING.match(line)
+    if match and match.group(1).strip().lower() in known_sections:
+        return 2, match.group(1).strip()
+    return None
+
+
+class MarkdownParser:
+    """Incremental parser; feed() returns the blocks completed by the text fed so far"""
+
+    def __init__(self, known_sections=()):
+        self.known_sections = known_sections
+        self._partial = ""
+        self._lines = []
+        self._items = []
+        self._ordered = False
+
+    def feed(self, text):
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        blocks = []
+        for line in lines:
+            self._add_line(line.strip(), blocks)
+        return blocks
+
+    def close(self):
+        """Blocks still open at the end of the text"""
+        blocks = []
+        if self._partial.strip():
+            self._add_line(self._partial.strip(), blocks)
+        self._partial = ""
+        self._end_paragraph(blocks)
+        self._end_list(blocks)
+        return blocks
+
+    def _end_paragraph(self, blocks):
+        if self._lines:
+            blocks.append(Paragraph(" ".join(self._lines)))
+            self._lines = []
+
+    def _end_list(self, blocks):
+        if self._items:
+            blocks.append(ListBlock(self._ordered, tuple(self._items)))
+            self._items = []
+
+    def _add_line(self, line, blocks):
+        # A blank line ends a paragraph, but list items may be separated by them
+        if not line:
+            self._end_paragraph(blocks)
+            return
+
+        heading = parse_heading(line, self.known_sections)
+        if heading:
+            self._end_paragraph(blocks)
+            self._end_list(blocks)
+            blocks.append(Heading(*heading))
+            return
+
+        match = LIST_ITEM.match(line)
+        if match:
+            ordered = match.group(1)[0].isdigit()
+            self._end_paragraph(blocks)
+            if ordered != self._ordered:
+                self._end_list(blocks)
+            self._ordered = ordered
+            self._items.append(match.group(2))
+            return
+
+        self._end_list(blocks)
+        self._lines.append(line)
+
+
+def parse_markdown(text, known_sections=()):
+    parser = MarkdownParser(known_sections)
+    return parser.feed(text) + parser.close()
+
+
+def render_inline(text):
+    text = html.escape(text, quote=False)
+    for pattern, replacement in INLINE_MARKUP:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def render_image(src, alt, css_class, srcset=None, lazy=False):
+    return IMAGE_TEMPLATE.format(
+        css_class=css_class, src=html.escape(src), alt=html.escape(alt),
+        srcset=f' srcset="{html.escape(srcset)}" sizes="(max-width: 850px) 100vw, 850px"' if srcset else "",
+        loading=' loading="lazy"' if lazy else ""
+    )
+
+
+def render_blocks(blocks, section_images=None):
+    """HTML for parsed blocks; section_images maps heading text to an image rendered after it"""
+    parts = []
+    for block in blocks:
+        if isinstance(block, Heading):
+            parts.append(HEADING_TEMPLATE.format(level=block.level, text=render_inline(block.text)))
+            if section_images and block.text in section_images:
+                parts.append(SECTION_IMAGE_TEMPLATE.format(image=section_images[block.text]))
+        elif isinstance(block, Paragraph):
+            parts.append(PARAGRAPH_TEMPLATE.format(text=render_inline(block.text)))
+        else:
+            items = "\n".join(ITEM_TEMPLATE.format(text=render_inline(item)) for item in block.items)
+            parts.append(LIST_TEMPLATE.format(tag="ol" if block.ordered else "ul", items=items))
+    return "\n".join(parts)
+
+
+def render_page(title, blocks, subtitle="", featured_image="", section_images=None, footer="", css_href=CSS_URL):
+    """A complete HTML page; featured_image and section_images values are rendered <img> tags"""
+    return PAGE_TEMPLATE.format(
+        title=html.escape(title), heading=render_inline(title), subtitle=html.escape(subtitle),
+        featured_image=featured_image, content=render_blocks(blocks, section_images),
+        footer=html.escape(footer), css_href=html.escape(css_href)
+    )
+
+
+def write_stylesheet(directory):
+    """Copy blog.css next to saved pages under its hashed name, unless already there; returns the name"""
+    target = Path(directory) / CSS_NAME
+    if not target.exists():
+        shutil.copyfile(CSS_PATH, target)
+    return CSS_NAME
+
+
+class StreamingRenderer:
+    """Renders text as it is generated; feed() returns the HTML of the blocks it completed"""
+
+    def __init__(self, known_sections=()):
+        self.parser = MarkdownParser(known_sections)
+
+    def feed(self, text):
+        return render_blocks(self.parser.feed(text))
+
+    def close(self):
+        return render_blocks(self.parser.close())
+
+
+class BlogPageRenderer:
+    """Renders saved rag_agent blog JSON as pages, keeping the most recent ones in memory"""
+
+    def __init__(self, known_sections=(), image_url="/images", cache_size=PAGE_CACHE_SIZE):
+        self.known_sections = known_sections
+        self.image_url = image_url
+        self.cache_size = cache_size
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def etag(raw):
+        """Strong validator for the page rendered from a blog's JSON bytes"""
+        digest = hashlib.sha256(raw + f"{RENDER_VERSION}:{CSS_DIGEST}".encode()).hexdigest()[:16]
+        return f'"{digest}"'
+
+    def stream(self):
+        return StreamingRenderer(self.known_sections)
+
+    def image(self, filename, asset, alt, css_class, lazy=False):
+        if asset:
+            return render_image(asset["src"], alt, css_class, asset["srcset"], lazy)
+        return render_image(f"{self.image_url}/{filename}", alt, css_class, lazy=lazy)
+
+    def render(self, blog_data):
+        section_images = {
+            section["heading"]: self.image(
+                section["image_filename"], section.get("image_asset"), section["heading"], "blog-img", lazy=True
+            )
+            for section in blog_data.get("section_images") or []
+        }
+        subtitle = blog_data["drug_name"]
+        if blog_data.get("brand_names") not in (None, "N/A"):
+            subtitle += f" ({blog_data['brand_names']})"
+
+        return render_page(
+            blog_data["title"], parse_markdown(blog_data["blog_content"], self.known_sections),
+            subtitle=subtitle, section_images=section_images,
+            featured_image=self.image(
+                blog_data["image_filename"], blog_data.get("image_asset"), blog_data["title"], "featured-img"
+            ),
+            footer="Generated by Pharmapedia from FDA drug label data"
+        )
+
+    def render_json(self, raw, etag=None):
+        """Page for a blog's JSON bytes, rendered once per ETag"""
+        etag = etag or self.etag(raw)
+        with self._lock:
+            if etag in self._pages:
+                self._pages.move_to_end(etag)
+                return self._pages[etag]
+
+        page = self.render(json.loads(raw))
+        with self._lock:
+            self._pages[etag] = page
+            while len(self._pages) > self.cache_size:
+                self._pages.popitem(last=False)
+        return page
\ No newline at end of file
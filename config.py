@@ -0,0 +1,5 @@
+import os
+
+
+# Root for models, data, cache and output; point it elsewhere to run against another tree
+HOME_DIR = os.getenv("PHARMAPEDIA_HOME", r"C:\BlogAgent")
\ No newline at end of file
@@ -0,0 +1,169 @@
+import bisect
+import heapq
+import threading
+from collections import Counter, defaultdict, namedtuple
+from itertools import chain
+
+from fda_store import normalize_drug_name
+
+
+# Preference between name fields when several labels match equally well
+NAME_TYPE_RANK = {"generic": 0, "substance": 1, "brand": 2}
+MATCH_SCORES = {"exact": 1.0, "prefix": 0.9, "fuzzy": 0.8}
+MIN_FUZZY_SIMILARITY = 0.7
+MAX_FUZZY_CANDIDATES = 20
+
+Candidate = namedtuple("Candidate", ["name", "name_type", "set_id", "match", "score"])
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit=None):
+    """Levenshtein distance, giving up early once every path exceeds `limit`"""
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class DrugResolver:
+    """In-memory inverted index from drug names to openFDA label set ids
+
+    Built from the label_names table filled by fda_bulk_ingest. Lookups try
+    an exact name match, then a prefix match, then trigram candidates ranked
+    by edit distance, all without touching the network.
+    """
+
+    def __init__(self, rows):
+        """rows: iterable of (name, name_type, set_id, effective_time)"""
+        self.entries = defaultdict(list)
+        for name, name_type, set_id, effective_time in rows:
+            self.entries[name].append((name_type, set_id, effective_time or ""))
+
+        for labels in self.entries.values():
+            # Best label first: preferred name field, then most recent label
+            labels.sort(key=lambda label: (NAME_TYPE_RANK.get(label[0], 9), _descending(label[2])))
+
+        self.sorted_names = sorted(self.entries)
+        self.trigram_index = defaultdict(set)
+        for name in self.sorted_names:
+            for gram in trigrams(name):
+                self.trigram_index[gram].add(name)
+
+    @classmethod
+    def from_store(cls, store):
+        return cls(store.label_name_rows())
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _candidates(self, name, match, score):
+        return [Candidate(name, name_type, set_id, match, score) for name_type, set_id, _ in self.entries[name]]
+
+    def _prefix_matches(self, query, limit):
+        index = bisect.bisect_left(self.sorted_names, query)
+        matches = []
+        while index < len(self.sorted_names) and len(matches) < limit:
+            name = self.sorted_names[index]
+            if not name.startswith(query):
+                break
+            if name != query:
+                matches.append(name)
+            index += 1
+        return matches
+
+    def _fuzzy_matches(self, query):
+        query_grams = trigrams(query)
+        postings = (self.trigram_index.get(gram, ()) for gram in query_grams)
+        overlap = Counter(chain.from_iterable(postings))
+        shortlist = heapq.nlargest(MAX_FUZZY_CANDIDATES, overlap, key=overlap.get)
+        matches = []
+        for name in shortlist:
+            limit = int(max(len(name), len(query)) * (1 - MIN_FUZZY_SIMILARITY))
+            # Each edit destroys at most three trigrams, so too little overlap rules a name out
+            if overlap[name] < len(query_grams) - 3 * limit or abs(len(name) - len(query)) > limit:
+                continue
+            distance = edit_distance(query, name, limit)
+            if distance <= limit:
+                similarity = 1 - distance / max(len(name), len(query))
+                matches.append((similarity, name))
+
+        return sorted(matches, reverse=True)
+
+    def resolve(self, drug_name, limit=5):
+        """Ranked candidate labels for a user-supplied drug name"""
+        query = normalize_drug_name(drug_name)
+        if not query:
+            return []
+
+        if query in self.entries:
+            return self._candidates(query, "exact", MATCH_SCORES["exact"])[:limit]
+
+        candidates = []
+        for name in self._prefix_matches(query, limit):
+            # "metformin" -> "metformin hydrochloride" is a whole-word match
+            if name[len(query)] == " ":
+                score = MATCH_SCORES["prefix"]
+            else:
+                score = MATCH_SCORES["prefix"] * len(query) / len(name)
+            candidates.extend(self._candidates(name, "prefix", score))
+
+        if not candidates:
+            for similarity, name in self._fuzzy_matches(query):
+                candidates.extend(self._candidates(name, "fuzzy", MATCH_SCORES["fuzzy"] * similarity))
+
+        seen = set()
+        ranked = []
+        for candidate in sorted(candidates, key=lambda c: (-c.score, NAME_TYPE_RANK.get(c.name_type, 9))):
+            if candidate.set_id not in seen:
+                seen.add(candidate.set_id)
+                ranked.append(candidate)
+        return ranked[:limit]
+
+    def match(self, drug_name):
+        """Best candidate naming the same drug, or None
+
+        Only exact names and whole-word prefixes ("metformin" -> "metformin
+        hydrochloride") count; partial prefixes and fuzzy matches can be a
+        look-alike drug (prednisone -> prednisolone) and are only suggestions.
+        """
+        candidates = self.resolve(drug_name, limit=1)
+        if candidates and (candidates[0].match == "exact" or candidates[0].score == MATCH_SCORES["prefix"]):
+            return candidates[0]
+        return None
+
+
+def _descending(effective_time):
+    """Sort key that orders YYYYMMDD strings newest first"""
+    return tuple(-ord(ch) for ch in effective_time)
+
+
+class ResolverCache:
+    """Keeps a DrugResolver in sync with the store, rebuilding after bulk ingestion"""
+
+    def __init__(self, store):
+        self.store = store
+        self._resolver = None
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        generation = self.store.ingest_generation()
+        with self._lock:
+            if self._resolver is None or generation != self._generation:
+                self._resolver = DrugResolver.from_store(self.store)
+                self._generation = generation
+            return self._resolver
\ No newline at end of file
@@ -1,16 +1,37 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from pathlib import Path
+from typing import List, Optional
+from urllib.parse import quote
+import json
+import logging
+import os
+import re
 import sys
+import threading
 
 sys.path.append(r"C:\BlogAgent")
+from config import HOME_DIR
 from rag_agent import BlogGenerator
+from image_profiles import DEFAULT_IMAGE_PROFILE, IMAGE_PROFILES
+from asset_pipeline import CACHE_CONTROL, DIGEST_CHARS
+from blog_renderer import CSS, CSS_NAME, BlogPageRenderer
+from section_images import KNOWN_SECTIONS
+from logging_setup import configure_logging
+from metrics import live_stats, metrics_payload
+from job_queue import JobManager, QueueFullError
+from fda_store import get_label_store
+from blog_archive import PAGE_SIZE, get_blog_archive
+
+configure_logging()
+logger = logging.getLogger("pharmapedia.server")
 
 app = FastAPI(title="Pharmapedia API")
 
-OUTPUT_DIR = Path(r"C:\BlogAgent\output")
+OUTPUT_DIR = Path(HOME_DIR) / "output"
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
 app.add_middleware(
@@ -19,19 +40,310 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
 
 app.mount("/images", StaticFiles(directory=OUTPUT_DIR), name="images")
 
-generator = BlogGenerator()
+# Models load in the background after startup (or on first use with PHARMAPEDIA_LAZY_LOAD=1),
+# so the API answers / and /healthz immediately
+LAZY_LOAD = os.getenv("PHARMAPEDIA_LAZY_LOAD") == "1"
+WARMUP = os.getenv("PHARMAPEDIA_WARMUP") == "1"
+# Serve the models from separate worker processes (inference_workers.py) instead of this one
+INFERENCE_WORKERS = os.getenv("PHARMAPEDIA_INFERENCE_WORKERS") == "1"
+
+if INFERENCE_WORKERS:
+    from inference_workers import RemoteModelManager
+    generator = BlogGenerator(RemoteModelManager())
+else:
+    generator = BlogGenerator()
+job_manager = JobManager(generator)
+blog_pages = BlogPageRenderer(KNOWN_SECTIONS)
+
+def prepare_models():
+    try:
+        generator.model_manager.load()
+        if WARMUP:
+            generator.warm_up()
+    except Exception as e:
+        logger.error("Model loading failed", extra={"error": str(e)})
+
+@app.on_event("startup")
+def start_background_work():
+    job_manager.start()
+    if not LAZY_LOAD:
+        threading.Thread(target=prepare_models, name="model-loader", daemon=True).start()
+
+@app.on_event("shutdown")
+def stop_inference_workers():
+    if INFERENCE_WORKERS:
+        generator.model_manager.close()
+
+@app.on_event("shutdown")
+def finish_artifact_writes():
+    generator.artifacts.close()
+
+MAX_TITLE_CHARS = 200
 
 class BlogRequest(BaseModel):
     drug_name: str
-    title: str = None
+    title: Optional[str] = Field(None, max_length=MAX_TITLE_CHARS)
+    force_refresh: bool = False
+    image_profile: str = DEFAULT_IMAGE_PROFILE
+    section_images: bool = False
+    # Fixed by default (so results are cached); force_refresh without a seed draws a new one
+    seed: Optional[int] = Field(None, ge=0, lt=2**32)
+
+class BlogBatchRequest(BaseModel):
+    blogs: List[BlogRequest]
+    batch_size: int = 4
+
+MAX_BATCH_BLOGS = 32
+
+# Streaming generations bypass the job queue, so they get their own small limit
+MAX_STREAMS = 2
+stream_slots = threading.BoundedSemaphore(MAX_STREAMS)
+active_streams = 0
+active_streams_lock = threading.Lock()
+
+live_stats.register_gauge("job_queue_depth", "Blog jobs waiting for a worker", lambda: job_manager.queue_depth)
+live_stats.register_gauge("jobs_running", "Blog jobs being generated", lambda: job_manager.running)
+live_stats.register_gauge("streams_active", "Streaming generations in progress", lambda: active_streams)
+
+def check_image_profile(image_profile):
+    if image_profile not in IMAGE_PROFILES:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unknown image_profile '{image_profile}', expected one of {', '.join(IMAGE_PROFILES)}"
+        )
+
+def etag_matches(request, etag):
+    return etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
 
-@app.post("/generate-blog")
+def get_job_or_404(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job
+
+@app.post("/generate-blog", status_code=202)
 def generate_blog(request: BlogRequest):
-    return generator.generate(request.drug_name, request.title)
+    check_image_profile(request.image_profile)
+    try:
+        job = job_manager.submit(
+            request.drug_name, request.title,
+            force_refresh=request.force_refresh, image_profile=request.image_profile,
+            section_images=request.section_images, seed=request.seed
+        )
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many blog generations in progress, try again later",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+    return {
+        "status": "queued",
+        "job_id": job.id,
+        "job_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events"
+    }
+
+@app.post("/generate-blog/stream")
+def generate_blog_stream(request: BlogRequest):
+    """Generate a blog over Server-Sent Events: meta, token (repeated), image, section_images, then done or error
+
+    Every token event that completes a heading, paragraph or list is followed
+    by an html event with that block rendered.
+    """
+    check_image_profile(request.image_profile)
+    if not stream_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=429,
+            detail="Too many streaming generations in progress, try again later",
+            headers={"Retry-After": str(job_manager.retry_after())},
+        )
+
+    stop_event = threading.Event()
+
+    def event_stream():
+        global active_streams
+        with active_streams_lock:
+            active_streams += 1
+        try:
+            events = generator.generate_stream(
+                request.drug_name, request.title,
+                force_refresh=request.force_refresh, image_profile=request.image_profile, stop_event=stop_event,
+                section_images=request.section_images, seed=request.seed
+            )
+            page = blog_pages.stream()
+            for event, data in events:
+                if event == "ping":
+                    yield ": keep-alive\n\n"
+                    continue
+
+                html = page.close() if event == "done" else None
+                if html:
+                    yield f"event: html\ndata: {json.dumps({'html': html})}\n\n"
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+                html = page.feed(data["text"]) if event == "token" else None
+                if html:
+                    yield f"event: html\ndata: {json.dumps({'html': html})}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'status': 'error', 'message': str(e)})}\n\n"
+        finally:
+            # Stops text generation early if the client went away
+            stop_event.set()
+            with active_streams_lock:
+                active_streams -= 1
+            stream_slots.release()
+
+    return StreamingResponse(
+        event_stream(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/generate-blogs")
+def generate_blogs(request: BlogBatchRequest):
+    """Generate several blogs with batched model calls, streaming one JSON line per blog as it finishes"""
+    if not request.blogs:
+        raise HTTPException(status_code=422, detail="No blogs requested")
+    if len(request.blogs) > MAX_BATCH_BLOGS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_BLOGS} blogs per batch")
+
+    for blog in request.blogs:
+        check_image_profile(blog.image_profile)
+
+    items = [(blog.drug_name, blog.title, blog.force_refresh, blog.image_profile, blog.seed) for blog in request.blogs]
+
+    def result_stream():
+        results = generator.generate_batch(items, batch_size=max(1, request.batch_size))
+        for index, result in results:
+            yield json.dumps({"index": index, **result}) + "\n"
+
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    return get_job_or_404(job_id).to_dict()
+
+@app.get("/jobs/{job_id}/events")
+def stream_job_events(job_id: str):
+    job = get_job_or_404(job_id)
+
+    def event_stream():
+        cursor = 0
+        while True:
+            events = job.wait_for_events(cursor)
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+
+            for event in events:
+                yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+            cursor += len(events)
+
+            if job.done and events[-1]["event"] in ("completed", "failed"):
+                break
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+ASSET_NAME = re.compile(rf"^([0-9a-f]{{{DIGEST_CHARS}}})-(\d+)(?:\.(\w+))?$")
+
+@app.get("/assets/{name}")
+def get_asset(name: str, request: Request):
+    """Compact image variant: /assets/<digest>-<width> picks AVIF, WebP or JPEG from Accept, or add .avif/.webp/.jpg"""
+    match = ASSET_NAME.match(name)
+    if not match:
+        raise HTTPException(status_code=404, detail=f"Asset '{name}' not found")
+
+    digest, width, ext = match.groups()
+    resolved = generator.assets.resolve(digest, int(width), request.headers.get("accept"), ext)
+    if resolved is None:
+        raise HTTPException(status_code=404, detail=f"Asset '{name}' not found")
+
+    path, media_type = resolved
+    # Names are content hashes, so the file name is a strong validator
+    headers = {"ETag": f'"{path.name}"', "Cache-Control": CACHE_CONTROL}
+    if ext is None:
+        headers["Vary"] = "Accept"
+
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+def with_page_url(post):
+    return {**post, "page_url": f"/blogs/{quote(post['blog_key'])}.html?version={post['version']}"}
+
+@app.get("/blogs")
+def list_blogs(limit: int = PAGE_SIZE, cursor: int = None, drug: str = None):
+    """Newest first, the latest version of every blog or every version of one drug; pass next_cursor for more"""
+    posts, next_cursor = get_blog_archive().page(limit, cursor, drug)
+    return {"blogs": [with_page_url(post) for post in posts], "next_cursor": next_cursor}
+
+@app.get("/blogs/search")
+def search_blogs(q: str, limit: int = PAGE_SIZE, offset: int = 0):
+    """Full-text search of the latest versions; name and title matches first, then content matches"""
+    results, total = get_blog_archive().search(q, limit, offset)
+    return {"query": q, "total": total, "results": [with_page_url(result) for result in results]}
+
+@app.get("/blogs/{blog_id}.html")
+def get_blog_page(blog_id: str, request: Request, version: int = None):
+    """A saved blog rendered as a page; blog_id is the lowercased drug name, version an archived version"""
+    if version is not None:
+        blog_data = get_blog_archive().get(blog_id, version)
+        if blog_data is None:
+            raise HTTPException(status_code=404, detail=f"Blog '{blog_id}' version {version} not found")
+        raw = json.dumps(blog_data, sort_keys=True).encode("utf-8")
+    else:
+        path = OUTPUT_DIR / f"{blog_id}_blog.json"
+        if Path(blog_id).name != blog_id or not path.is_file():
+            raise HTTPException(status_code=404, detail=f"Blog '{blog_id}' not found")
+        raw = path.read_bytes()
+
+    # Blogs get regenerated under the same id, so browsers revalidate every time
+    headers = {"ETag": blog_pages.etag(raw), "Cache-Control": "no-cache"}
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(blog_pages.render_json(raw, headers["ETag"]), headers=headers)
+
+@app.get(f"/static/{CSS_NAME}")
+def blog_stylesheet():
+    return Response(CSS, media_type="text/css", headers={"Cache-Control": CACHE_CONTROL})
+
+@app.get("/drugs/resolve")
+def resolve_drug(q: str, limit: int = 5):
+    candidates = get_label_store().resolve(q, limit)
+    return {"query": q, "candidates": [candidate._asdict() for candidate in candidates]}
+
+@app.get("/cache/stats")
+def cache_stats():
+    stats = generator.result_cache.stats()
+    prefix_cache = generator.model_manager.prefix_cache
+    stats["prefix_cache"] = prefix_cache.stats() if prefix_cache else None
+    return stats
+
+@app.get("/metrics")
+def metrics():
+    body, content_type = metrics_payload()
+    return Response(body, media_type=content_type)
+
+@app.get("/healthz")
+def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    models = generator.model_manager
+    ready = models.ready and (models.warmed_up or not WARMUP)
+    body = {
+        "status": "ready" if ready else "not_ready",
+        "models": models.state,
+        "warmed_up": models.warmed_up,
+        "error": models.load_error
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
 
 @app.get("/")
 def home():
@@ -0,0 +1,260 @@
+import argparse
+import io
+import json
+import os
+import sqlite3
+import time
+import zipfile
+from pathlib import Path
+
+import requests
+
+from config import HOME_DIR
+from fda_store import STORE_PATH, LabelStore, normalize_drug_name
+
+
+DOWNLOAD_INDEX_URL = "https://api.fda.gov/download.json"
+BULK_DIR = os.path.join(HOME_DIR, "data", "bulk")
+BATCH_SIZE = 500
+READ_CHUNK = 1 << 16
+PROGRESS_EVERY = 5000
+
+NAME_FIELDS = {
+    "generic": "generic_name",
+    "brand": "brand_name",
+    "substance": "substance_name",
+}
+
+
+def iter_json_array(stream, key="results", chunk_size=READ_CHUNK):
+    """Incrementally yield the items of the top-level `key` array in a JSON document
+
+    Only one item (plus a read chunk) is held in memory at a time, so the
+    multi-gigabyte openFDA dump files can be parsed from a zip member stream.
+    Other top-level values (like "meta") are decoded whole and skipped.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+
+    def skip_ws():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf) or not fill():
+                return
+
+    def expect(chars):
+        nonlocal pos
+        skip_ws()
+        if pos >= len(buf) or buf[pos] not in chars:
+            found = buf[pos:pos + 20] if pos < len(buf) else "end of file"
+            raise ValueError(f"Expected one of {chars!r} in label file, found {found!r}")
+        pos += 1
+        return buf[pos - 1]
+
+    def decode_value():
+        nonlocal pos
+        skip_ws()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                # A scalar at the very end of the buffer may continue in the next chunk
+                if end < len(buf) or eof:
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            fill()
+
+    expect("{")
+    skip_ws()
+    if buf[pos:pos + 1] == "}":
+        return
+
+    while True:
+        name = decode_value()
+        expect(":")
+
+        if name != key:
+            decode_value()
+        else:
+            expect("[")
+            skip_ws()
+            if buf[pos:pos + 1] == "]":
+                pos += 1
+            else:
+                while True:
+                    yield decode_value()
+                    if expect(",]") == "]":
+                        break
+
+        if expect(",}") == "}":
+            return
+
+
+def label_names(record):
+    """(name, name_type) pairs used to index a label"""
+    openfda = record.get("openfda", {})
+    names = set()
+    for name_type, field in NAME_FIELDS.items():
+        for value in openfda.get(field, []):
+            names.add((normalize_drug_name(value), name_type))
+    return names
+
+
+class BulkIngestor:
+    """Loads openFDA drug-label dump files into the LabelStore tables
+
+    Progress is committed together with each batch, so an interrupted run
+    resumes from the last committed record of each file.
+    """
+
+    def __init__(self, store_path=STORE_PATH, batch_size=BATCH_SIZE, progress_every=PROGRESS_EVERY):
+        LabelStore(store_path)
+        self.batch_size = batch_size
+        self.progress_every = progress_every
+
+        self._db = sqlite3.connect(str(store_path))
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+
+    def _progress(self, source):
+        row = self._db.execute(
+            "SELECT records_done, completed FROM ingest_progress WHERE source = ?", (source,)
+        ).fetchone()
+        return row if row else (0, 0)
+
+    def _write_batch(self, batch, source, records_done, completed=False):
+        labels = []
+        names = []
+        for record in batch:
+            set_id = record.get("set_id") or record.get("id")
+            if not set_id:
+                continue
+            labels.append((set_id, json.dumps(record, separators=(",", ":")), record.get("effective_time")))
+            names.extend((name, name_type, set_id) for name, name_type in label_names(record))
+
+        with self._db:
+            self._db.executemany("DELETE FROM label_names WHERE set_id = ?", [(row[0],) for row in labels])
+            self._db.executemany("INSERT OR REPLACE INTO bulk_labels (set_id, record, effective_time) VALUES (?, ?, ?)", labels)
+            self._db.executemany("INSERT OR IGNORE INTO label_names (name, name_type, set_id) VALUES (?, ?, ?)", names)
+            self._db.execute(
+                "INSERT OR REPLACE INTO ingest_progress (source, records_done, completed, updated_at) VALUES (?, ?, ?, ?)",
+                (source, records_done, int(completed), time.time())
+            )
+
+    def ingest_stream(self, stream, source):
+        """Ingest one JSON label document, skipping records already committed for `source`"""
+        records_done, completed = self._progress(source)
+        if completed:
+            print(f"{source}: already ingested, skipping")
+            return 0
+
+        if records_done:
+            print(f"{source}: resuming after {records_done} records")
+
+        start = time.time()
+        batch = []
+        index = 0
+        ingested = 0
+
+        for index, record in enumerate(iter_json_array(stream), start=1):
+            if index <= records_done:
+                continue
+
+            batch.append(record)
+            ingested += 1
+
+            if len(batch) >= self.batch_size:
+                self._write_batch(batch, source, index)
+                batch = []
+
+            if ingested % self.progress_every == 0:
+                rate = ingested / max(time.time() - start, 1e-9)
+                print(f"{source}: {index} records ({rate:.0f} records/sec)")
+
+        self._write_batch(batch, source, max(index, records_done), completed=True)
+
+        elapsed = time.time() - start
+        print(f"{source}: done, {ingested} records in {elapsed:.1f}s")
+        return ingested
+
+    def ingest_zip(self, zip_path):
+        """Ingest every JSON member of a zipped openFDA download file"""
+        total = 0
+        with zipfile.ZipFile(zip_path) as archive:
+            for member in archive.namelist():
+                if not member.endswith(".json"):
+                    continue
+                with archive.open(member) as raw:
+                    stream = io.TextIOWrapper(raw, encoding="utf-8")
+                    total += self.ingest_stream(stream, f"{Path(zip_path).name}/{member}")
+        return total
+
+
+def download_label_files(dest_dir=BULK_DIR):
+    """Stream the drug-label partitions listed in download.json to disk"""
+    dest = Path(dest_dir)
+    dest.mkdir(parents=True, exist_ok=True)
+
+    session = requests.Session()
+    index = session.get(DOWNLOAD_INDEX_URL, timeout=30).json()
+    partitions = index["results"]["drug"]["label"]["partitions"]
+
+    paths = []
+    for partition in partitions:
+        url = partition["file"]
+        path = dest / url.rsplit("/", 1)[-1]
+        paths.append(path)
+
+        if path.exists():
+            print(f"Already downloaded: {path.name}")
+            continue
+
+        print(f"Downloading {path.name} ({partition.get('size_mb', '?')} MB)...")
+        part = path.with_suffix(path.suffix + ".part")
+        with session.get(url, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            with open(part, "wb") as f:
+                for chunk in response.iter_content(chunk_size=1 << 20):
+                    f.write(chunk)
+        part.replace(path)
+
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load openFDA drug-label download files into the local label store")
+    parser.add_argument("files", nargs="*", help="drug-label-*.json.zip files to ingest")
+    parser.add_argument("--download", action="store_true", help="download all drug-label partitions first")
+    parser.add_argument("--store", default=STORE_PATH, help="label store path")
+    args = parser.parse_args()
+
+    files = [Path(f) for f in args.files]
+    if args.download:
+        files.extend(download_label_files())
+
+    if not files:
+        parser.error("no files given, pass zip files or --download")
+
+    ingestor = BulkIngestor(args.store)
+    total = sum(ingestor.ingest_zip(path) for path in files)
+    print(f"Ingested {total} label records into {args.store}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,232 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+
+import httpx
+
+
+OPENFDA_BASE_URL = os.getenv("PHARMAPEDIA_OPENFDA_URL", "https://api.fda.gov")
+OPENFDA_API_KEY = os.getenv("PHARMAPEDIA_OPENFDA_API_KEY")
+
+# openFDA allows 240 requests per minute either way, and 1000 (no key) or 120000 (key) per day
+RATE_PER_MINUTE = 240
+DAILY_LIMIT = 1000
+DAILY_LIMIT_WITH_KEY = 120000
+BURST = 40
+
+MAX_CONNECTIONS = 10
+TIMEOUT_SECONDS = 10
+MAX_RETRIES = 4
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 20
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class OpenFDAError(Exception):
+    """Raised when openFDA can't answer a request
+
+    kind is one of "rate_limited", "quota", "server", "network" or
+    "bad_request"; retry_after is set when the caller should wait before
+    trying again.
+    """
+
+    def __init__(self, kind, message, status=None, retry_after=None, attempts=1):
+        super().__init__(message)
+        self.kind = kind
+        self.status = status
+        self.retry_after = retry_after
+        self.attempts = attempts
+
+    def to_dict(self):
+        return {
+            "kind": self.kind,
+            "message": str(self),
+            "status": self.status,
+            "retry_after": self.retry_after,
+            "attempts": self.attempts
+        }
+
+
+class TokenBucket:
+    """Async token bucket: rate_per_minute sustained, up to burst at once"""
+
+    def __init__(self, rate_per_minute=RATE_PER_MINUTE, burst=BURST):
+        self.rate = rate_per_minute / 60
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After"""
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+    return max(delay, retry_after or 0)
+
+
+def parse_retry_after(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class OpenFDAClient:
+    """Shared openFDA client with pooled connections, rate limiting, retries and request coalescing
+
+    Requests run on one event loop in a background thread, so callers on
+    any thread share the connection pool and the rate limiter, and
+    identical requests in flight at the same time go upstream once.
+    Use get_json from async code on that loop, or get_json_sync elsewhere.
+    """
+
+    def __init__(self, base_url=OPENFDA_BASE_URL, api_key=OPENFDA_API_KEY, rate_per_minute=RATE_PER_MINUTE,
+                 burst=BURST, daily_limit=None, max_retries=MAX_RETRIES, timeout=TIMEOUT_SECONDS,
+                 max_connections=MAX_CONNECTIONS):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst
+        self.daily_limit = daily_limit or (DAILY_LIMIT_WITH_KEY if api_key else DAILY_LIMIT)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.max_connections = max_connections
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="openfda-client", daemon=True)
+        self._thread.start()
+        self._http = None
+        self._bucket = None
+        self._inflight = {}
+        self._day = None
+        self._day_count = 0
+
+        self.requests = 0
+        self.coalesced = 0
+        self.retries = 0
+
+    def _ensure_started(self):
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections)
+            )
+            self._bucket = TokenBucket(self.rate_per_minute, self.burst)
+
+    def _count_daily(self):
+        day = time.strftime("%Y-%m-%d", time.gmtime())
+        if day != self._day:
+            self._day, self._day_count = day, 0
+        if self._day_count >= self.daily_limit:
+            raise OpenFDAError("quota", f"Daily openFDA quota of {self.daily_limit} requests used up")
+        self._day_count += 1
+
+    async def _request(self, path, params):
+        params = dict(params)
+        if self.api_key:
+            params["api_key"] = self.api_key
+
+        for attempt in range(self.max_retries + 1):
+            self._count_daily()
+            await self._bucket.acquire()
+            self.requests += 1
+
+            try:
+                response = await self._http.get(path, params=params)
+            except httpx.HTTPError as e:
+                error = OpenFDAError("network", f"openFDA request failed: {e}", attempts=attempt + 1)
+                retry_after = None
+            else:
+                if response.status_code == 404:
+                    # openFDA answers searches without matches with 404
+                    return None
+                if response.status_code < 400:
+                    try:
+                        return response.json()
+                    except ValueError:
+                        # e.g. an HTML error page from a proxy in front of the API; retried like a 5xx
+                        error = OpenFDAError(
+                            "server", f"openFDA returned {response.status_code} with a body that is not JSON",
+                            status=response.status_code, attempts=attempt + 1
+                        )
+                        retry_after = None
+                else:
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    kind = "rate_limited" if response.status_code == 429 else "server"
+                    error = OpenFDAError(
+                        kind, f"openFDA returned {response.status_code}", status=response.status_code,
+                        retry_after=retry_after, attempts=attempt + 1
+                    )
+                    if response.status_code not in RETRY_STATUSES:
+                        error.kind = "bad_request"
+                        raise error
+
+            if attempt == self.max_retries or (retry_after or 0) > BACKOFF_MAX_SECONDS:
+                raise error
+
+            self.retries += 1
+            await asyncio.sleep(backoff_delay(attempt, retry_after))
+
+    async def get_json(self, path, params):
+        """Parsed JSON for a GET request, None on 404; raises OpenFDAError"""
+        self._ensure_started()
+        key = (path, json.dumps(params, sort_keys=True))
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._request(path, params))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+
+        # Shielded so one caller giving up doesn't cancel the request for the others
+        return await asyncio.shield(task)
+
+    def get_json_sync(self, path, params):
+        """get_json for callers outside the client's event loop"""
+        return asyncio.run_coroutine_threadsafe(self.get_json(path, params), self._loop).result()
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "requests_today": self._day_count,
+            "daily_limit": self.daily_limit
+        }
+
+    def close(self):
+        if self._http is not None:
+            asyncio.run_coroutine_threadsafe(self._http.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_openfda_client():
+    """Process-wide OpenFDAClient"""
+    global _default_client
+
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = OpenFDAClient()
+        return _default_client
\ No newline at end of file
@@ -0,0 +1,326 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from config import HOME_DIR
+from fda_client import get_openfda_client
+
+
+logger = logging.getLogger(__name__)
+
+STORE_PATH = os.path.join(HOME_DIR, "data", "labels.sqlite")
+SEED_DIR = os.path.join(HOME_DIR, "data")
+LABEL_TTL_SECONDS = 24 * 3600
+OPENFDA_LABEL_PATH = "/drug/label.json"
+OFFLINE = os.getenv("PHARMAPEDIA_OFFLINE") == "1"
+
+# Maps the summarized fields in data/*.json back to openFDA label sections
+SEED_FIELDS = {
+    "indications": "indications_and_usage",
+    "warnings": "warnings",
+    "dosage": "dosage_and_administration",
+    "side_effects": "adverse_reactions",
+    "contraindications": "contraindications",
+    "mechanism": "mechanism_of_action",
+}
+
+
+# Tables filled by fda_bulk_ingest from the openFDA drug-label download files
+BULK_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS bulk_labels (
+        set_id TEXT PRIMARY KEY,
+        record TEXT NOT NULL,
+        effective_time TEXT
+    );
+    CREATE TABLE IF NOT EXISTS label_names (
+        name TEXT NOT NULL,
+        name_type TEXT NOT NULL,
+        set_id TEXT NOT NULL,
+        PRIMARY KEY (name, name_type, set_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS label_names_set_id ON label_names (set_id);
+    CREATE TABLE IF NOT EXISTS ingest_progress (
+        source TEXT PRIMARY KEY,
+        records_done INTEGER NOT NULL,
+        completed INTEGER NOT NULL DEFAULT 0,
+        updated_at REAL NOT NULL
+    );
+"""
+
+
+def normalize_drug_name(drug_name):
+    return " ".join(drug_name.strip().lower().split())
+
+
+def seed_to_label(seed):
+    """Turn a summarized data/*.json record into an openFDA-shaped label"""
+    label = {"openfda": {}}
+
+    if seed.get("brand_names") and seed["brand_names"] != "N/A":
+        label["openfda"]["brand_name"] = [seed["brand_names"]]
+
+    for field, section in SEED_FIELDS.items():
+        value = seed.get(field)
+        if value and value != "N/A":
+            label[section] = [value]
+
+    return label
+
+
+def label_mentions(label, drug_name):
+    """Whether a label's names or indications actually refer to the drug"""
+    names = [normalize_drug_name(n) for field in ("generic_name", "brand_name", "substance_name")
+             for n in label.get("openfda", {}).get(field, [])]
+    if names:
+        return drug_name in names
+    return drug_name in " ".join(label.get("indications_and_usage", [])).lower()
+
+
+class LabelStore:
+    """SQLite-backed store of full openFDA label records
+
+    Reads are served from disk. Entries older than the TTL are still returned
+    but refreshed in the background, and the cached copy is used whenever the
+    API is unreachable.
+    """
+
+    def __init__(self, path=STORE_PATH, ttl=LABEL_TTL_SECONDS, offline=OFFLINE, client=None):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.offline = offline
+        self.client = client or get_openfda_client()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="label-refresh")
+        self._resolver_cache = None
+
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS labels (
+                drug_key TEXT PRIMARY KEY,
+                record TEXT NOT NULL,
+                version TEXT,
+                source TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        self._db.executescript(BULK_SCHEMA)
+        self._db.commit()
+
+    def _load(self, drug_key):
+        with self._lock:
+            return self._db.execute(
+                "SELECT record, version, fetched_at FROM labels WHERE drug_key = ?", (drug_key,)
+            ).fetchone()
+
+    def _save(self, drug_key, record, source, fetched_at=None):
+        version = self._version_of(record)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO labels (drug_key, record, version, source, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (drug_key, json.dumps(record), version, source, time.time() if fetched_at is None else fetched_at)
+            )
+            self._db.commit()
+        return version
+
+    @staticmethod
+    def _version_of(record):
+        return f"{record.get('set_id', '')}:{record.get('version', '')}:{record.get('effective_time', '')}"
+
+    def fetch_label(self, drug_name):
+        """Fetch the label record from the openFDA API, None if there is no match; raises OpenFDAError
+
+        The search is scoped to the openfda name fields; a free-text search
+        also matches labels that merely mention the drug (e.g. "aspirin"
+        returning a Naproxen label that warns about aspirin allergy).
+        """
+        name = normalize_drug_name(drug_name).replace('"', "")
+        search = " ".join(f'openfda.{field}:"{name}"' for field in ("generic_name", "brand_name", "substance_name"))
+        params = {"search": search, "limit": 1}
+        data = self.client.get_json_sync(OPENFDA_LABEL_PATH, params)
+
+        results = data.get("results", []) if data else []
+        return results[0] if results else None
+
+    def refresh(self, drug_name):
+        """Re-fetch a label, only rewriting the record when its version changed"""
+        drug_key = normalize_drug_name(drug_name)
+        record = self.fetch_label(drug_name)
+
+        if record is None:
+            return None
+
+        row = self._load(drug_key)
+
+        if row and row[1] == self._version_of(record):
+            with self._lock:
+                self._db.execute("UPDATE labels SET fetched_at = ? WHERE drug_key = ?", (time.time(), drug_key))
+                self._db.commit()
+        else:
+            self._save(drug_key, record, "api")
+
+        return record
+
+    def _refresh_in_background(self, drug_name):
+        drug_key = normalize_drug_name(drug_name)
+
+        with self._lock:
+            if drug_key in self._refreshing:
+                return
+            self._refreshing.add(drug_key)
+
+        def run():
+            try:
+                self.refresh(drug_name)
+            except Exception as e:
+                logger.warning("Background label refresh failed", extra={"drug": drug_name, "error": str(e)})
+            finally:
+                with self._lock:
+                    self._refreshing.discard(drug_key)
+
+        self._refresher.submit(run)
+
+    def _resolver(self):
+        if self._resolver_cache is None:
+            from drug_resolver import ResolverCache
+            self._resolver_cache = ResolverCache(self)
+        return self._resolver_cache.get()
+
+    def resolve(self, drug_name, limit=5):
+        """Ranked label candidates for a drug name from the local name index, including look-alikes"""
+        return self._resolver().resolve(drug_name, limit)
+
+    def match(self, drug_name):
+        """Bulk-ingested label candidate that names this exact drug, or None"""
+        return self._resolver().match(drug_name)
+
+    def get(self, drug_name):
+        """Return the label record for a drug, from disk when possible
+
+        The per-drug cache is checked first, then the bulk-ingested label
+        index, accepting only exact or whole-word name matches, then the
+        openFDA API. Raises OpenFDAError when the label has to come from the
+        API and the API can't be reached.
+        """
+        drug_key = normalize_drug_name(drug_name)
+        row = self._load(drug_key)
+
+        if row:
+            record, _, fetched_at = row
+            if not self.offline and time.time() - fetched_at > self.ttl:
+                self._refresh_in_background(drug_name)
+            return json.loads(record)
+
+        candidate = self.match(drug_name)
+        if candidate:
+            record = self.get_by_set_id(candidate.set_id)
+            if record:
+                return record
+
+        if self.offline:
+            return None
+
+        return self.refresh(drug_name)
+
+    def import_seed_dir(self, seed_dir=SEED_DIR):
+        """Import data/*.json summaries so the store can serve offline
+
+        Seeded entries are marked stale so they get replaced by the full
+        label the first time the API is reachable.
+        """
+        count = 0
+        for path in sorted(Path(seed_dir).glob("*.json")):
+            with open(path, encoding="utf-8") as f:
+                seed = json.load(f)
+
+            drug_key = normalize_drug_name(seed.get("name", path.stem))
+            if self._load(drug_key):
+                continue
+
+            label = seed_to_label(seed)
+            if not label_mentions(label, drug_key):
+                logger.warning("Skipping seed, label does not describe the drug", extra={"seed": path.name, "drug": drug_key})
+                continue
+
+            self._save(drug_key, label, "seed", fetched_at=0)
+            count += 1
+
+        return count
+
+    def get_by_set_id(self, set_id):
+        """Return a bulk-ingested label record by its set_id"""
+        with self._lock:
+            row = self._db.execute("SELECT record FROM bulk_labels WHERE set_id = ?", (set_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def iter_bulk_labels(self, batch_size=500):
+        """Yield lists of (set_id, record) for every bulk-ingested label, batch_size at a time"""
+        last_rowid = 0
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT rowid, set_id, record FROM bulk_labels WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last_rowid, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            last_rowid = rows[-1][0]
+            yield [(set_id, json.loads(record)) for _, set_id, record in rows]
+
+    def label_name_rows(self):
+        """(name, name_type, set_id, effective_time) rows for building a DrugResolver"""
+        with self._lock:
+            return self._db.execute("""
+                SELECT n.name, n.name_type, n.set_id, b.effective_time
+                FROM label_names n JOIN bulk_labels b ON b.set_id = n.set_id
+            """).fetchall()
+
+    def ingest_generation(self):
+        """Changes whenever bulk ingestion commits, used to invalidate the resolver"""
+        with self._lock:
+            return self._db.execute("SELECT MAX(updated_at), COUNT(*) FROM ingest_progress").fetchone()
+
+    def find_set_ids(self, drug_name, name_type=None):
+        """Set ids of bulk-ingested labels whose generic/brand/substance name matches exactly"""
+        query = "SELECT DISTINCT set_id FROM label_names WHERE name = ?"
+        params = [normalize_drug_name(drug_name)]
+        if name_type:
+            query += " AND name_type = ?"
+            params.append(name_type)
+
+        with self._lock:
+            return [row[0] for row in self._db.execute(query, params)]
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM labels").fetchone()[0]
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_label_store():
+    """Process-wide LabelStore shared by both fetchers, seeded on first use"""
+    global _default_store
+
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = LabelStore()
+            if _default_store.count() == 0:
+                _default_store.import_seed_dir()
+        return _default_store
+
+
+if __name__ == "__main__":
+    import sys
+
+    store = get_label_store()
+    seed_dir = sys.argv[1] if len(sys.argv) > 1 else SEED_DIR
+    print(f"Imported {store.import_seed_dir(seed_dir)} seed labels from {seed_dir}")
+    print(f"Store holds {store.count()} labels")
\ No newline at end of file
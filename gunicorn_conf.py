@@ -0,0 +1,55 @@
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+# Workers write their metrics here so /metrics can sum them; it has to be set
+# before prometheus_client is first imported (by rag_agent below)
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", str(Path(tempfile.gettempdir()) / "pharmapedia_metrics"))
+METRICS_DIR = Path(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+shutil.rmtree(METRICS_DIR, ignore_errors=True)
+METRICS_DIR.mkdir(parents=True, exist_ok=True)
+
+sys.path.append(r"C:\BlogAgent")
+import rag_agent
+from prometheus_client import multiprocess
+
+# Run with: gunicorn -c gunicorn_conf.py fastapi_blog_server:app
+#
+# The models are loaded once in the gunicorn master before it forks, so every
+# worker shares the same weight pages copy-on-write instead of loading its own
+# ~6 GB copy. The app itself is imported in each worker (preload_app = False)
+# so job threads, executors and SQLite connections are created after the fork.
+#
+# Jobs live in memory in the worker that accepted them (job_queue.JobManager),
+# so /jobs/{id} and /jobs/{id}/events only work when they reach that worker.
+# One app worker is therefore the default; only raise WEB_CONCURRENCY behind a
+# proxy that routes each client to the same worker.
+#
+# With PHARMAPEDIA_INFERENCE_WORKERS=1 the models live in inference worker
+# processes owned by each app worker instead, so nothing is preloaded.
+INFERENCE_WORKERS = os.getenv("PHARMAPEDIA_INFERENCE_WORKERS") == "1"
+
+bind = os.getenv("PHARMAPEDIA_BIND", "127.0.0.1:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = False
+timeout = 600
+
+
+def on_starting(server):
+    if workers > 1:
+        server.log.warning(
+            "Running %d app workers: job state is per worker, so /jobs/{id} and its events "
+            "return 404 unless requests for a job reach the worker that accepted it", workers
+        )
+
+    # Only load here; warm-up inference must happen in the workers because
+    # OpenMP thread pools started before fork() are not usable in the children
+    if not INFERENCE_WORKERS:
+        rag_agent.get_model_manager().load()
+
+
+def child_exit(server, worker):
+    multiprocess.mark_process_dead(worker.pid)
\ No newline at end of file
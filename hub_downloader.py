@@ -0,0 +1,411 @@
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from artifact_writer import write_json
+
+
+logger = logging.getLogger(__name__)
+
+HF_ENDPOINT = os.getenv("PHARMAPEDIA_HF_ENDPOINT", os.getenv("HF_ENDPOINT", "https://huggingface.co"))
+HF_TOKEN = os.getenv("HF_TOKEN")
+DOWNLOAD_WORKERS = int(os.getenv("PHARMAPEDIA_DOWNLOAD_WORKERS", 8))
+# Files larger than this are fetched as several Range requests at once
+SEGMENT_BYTES = 64 * 1024**2
+READ_CHUNK = 1 << 20
+# Bytes a segment downloads between progress saves, i.e. the most a resume fetches twice
+CHECKPOINT_BYTES = 16 * 1024**2
+HASH_CHUNK = 8 * 1024**2
+MAX_ATTEMPTS = 5
+RETRY_SECONDS = 2
+TIMEOUT_SECONDS = 60
+MANIFEST_NAME = "download_manifest.json"
+
+
+class DownloadError(Exception):
+    pass
+
+
+def matches(path, patterns):
+    return any(fnmatch.fnmatch(path, pattern) for pattern in patterns)
+
+
+def local_name(path):
+    """Name a file is kept under: pickled .bin weights (and their shard index) become safetensors"""
+    if path.endswith(".bin.index.json"):
+        return local_name(path[:-len(".index.json")]) + ".index.json"
+    if not path.endswith(".bin"):
+        return path
+    directory, name = posixpath.split(path)
+    stem = name[:-len(".bin")]
+    if stem.startswith("pytorch_model"):
+        stem = "model" + stem[len("pytorch_model"):]
+    return posixpath.join(directory, stem + ".safetensors")
+
+
+def select_files(listing, allow=("*",), ignore=()):
+    """Files of a repo listing to download; .bin weights are skipped wherever safetensors exist"""
+    files = [entry for entry in listing if matches(entry["path"], allow) and not matches(entry["path"], ignore)]
+    safetensors_dirs = {posixpath.dirname(entry["path"]) for entry in files if entry["path"].endswith(".safetensors")}
+    return [
+        entry for entry in files
+        if not (local_name(entry["path"]) != entry["path"] and posixpath.dirname(entry["path"]) in safetensors_dirs)
+    ]
+
+
+def file_digests(path, size):
+    """(SHA256, git blob id) of a file, in one read"""
+    sha256 = hashlib.sha256()
+    blob = hashlib.sha1(f"blob {size}\0".encode())
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            sha256.update(chunk)
+            blob.update(chunk)
+    return sha256.hexdigest(), blob.hexdigest()
+
+
+def sha256_file(path):
+    return file_digests(path, Path(path).stat().st_size)[0]
+
+
+def convert_to_safetensors(source, target):
+    """Rewrite a pickled PyTorch checkpoint (or its shard index) as safetensors, which load by mmap"""
+    if source.name.endswith(".index.json"):
+        with open(source, encoding="utf-8") as f:
+            index = json.load(f)
+        index["weight_map"] = {name: local_name(shard) for name, shard in index["weight_map"].items()}
+        write_json(target, index)
+        return
+
+    import torch
+    from safetensors.torch import save_file
+
+    state_dict = torch.load(source, map_location="cpu", weights_only=True)
+    tensors = {}
+    storages = set()
+    for name, tensor in state_dict.items():
+        # safetensors refuses tensors sharing memory, e.g. tied embeddings
+        pointer = tensor.untyped_storage().data_ptr()
+        tensors[name] = tensor.clone() if pointer in storages else tensor.contiguous()
+        storages.add(pointer)
+
+    temp_path = target.with_name(f".{target.name}.tmp")
+    save_file(tensors, str(temp_path), metadata={"format": "pt"})
+    os.replace(temp_path, target)
+
+
+def load_manifest(model_dir):
+    try:
+        with open(Path(model_dir) / MANIFEST_NAME, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def verify(model_dir, workers=DOWNLOAD_WORKERS):
+    """Check a model's files against the sizes and SHA256s in its manifest
+
+    Returns a list of problems, empty when everything matches, or None when
+    the model has no manifest (downloaded some other way).
+    """
+    manifest = load_manifest(model_dir)
+    if manifest is None:
+        return None
+
+    def check(item):
+        path, record = item
+        target = Path(model_dir) / path
+        if not target.exists():
+            return f"{path}: missing"
+        if target.stat().st_size != record["size"]:
+            return f"{path}: size {target.stat().st_size}, expected {record['size']}"
+        if sha256_file(target) != record["sha256"]:
+            return f"{path}: SHA256 mismatch"
+        return None
+
+    # hashlib releases the GIL on large buffers, so files hash in parallel
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return [problem for problem in executor.map(check, manifest["files"].items()) if problem]
+
+
+class HubDownloader:
+    """Streams model repositories from the Hugging Face Hub, or any server with its API, straight to disk
+
+    Files are split into SEGMENT_BYTES Range requests and the segments of
+    every file of every model share one pool of connections. Each partial
+    file has a progress record next to it, saved every CHECKPOINT_BYTES, so
+    an interrupted download resumes where it stopped. Finished files are
+    checked against the SHA256 the Hub lists (or the git blob id of small,
+    non-LFS files), .bin weights are converted to safetensors, and the
+    result is recorded in the model's download_manifest.json. Later runs
+    skip files whose manifest entry still matches the Hub and that have not
+    been modified since.
+    """
+
+    def __init__(self, endpoint=HF_ENDPOINT, token=HF_TOKEN, workers=DOWNLOAD_WORKERS, segment_bytes=SEGMENT_BYTES):
+        self.endpoint = endpoint.rstrip("/")
+        self.workers = workers
+        self.segment_bytes = segment_bytes
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+        self.bytes_downloaded = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def cancel(self):
+        """Stop the running download; segments save their progress and it can be resumed later"""
+        self._stop.set()
+
+    def fetch_listing(self, repo, revision="main"):
+        """(commit, [{path, size, sha256, blob_id}]) of a repo revision"""
+        response = self.session.get(
+            f"{self.endpoint}/api/models/{repo}/revision/{quote(revision, safe='')}",
+            params={"blobs": "true"}, timeout=TIMEOUT_SECONDS
+        )
+        response.raise_for_status()
+        info = response.json()
+
+        listing = []
+        for sibling in info["siblings"]:
+            lfs = sibling.get("lfs")
+            listing.append({
+                "path": sibling["rfilename"],
+                "size": lfs["size"] if lfs else sibling["size"],
+                "sha256": lfs["sha256"] if lfs else None,
+                "blob_id": sibling.get("blobId"),
+            })
+        return info.get("sha") or revision, listing
+
+    @staticmethod
+    def up_to_date(model_dir, entry, record):
+        target = Path(model_dir) / local_name(entry["path"])
+        return (
+            record.get("source") == entry["path"]
+            and record.get("source_sha256") == entry["sha256"]
+            and record.get("source_blob_id") == entry["blob_id"]
+            and target.exists() and target.stat().st_size == record["size"]
+            and target.stat().st_mtime_ns == record.get("mtime_ns")
+        )
+
+    def plan(self, spec):
+        """Files of a model spec still to download, as tasks, and the manifest of the rest"""
+        commit, listing = self.fetch_listing(spec["name"], spec.get("revision", "main"))
+        model_dir = Path(spec["path"])
+        model_dir.mkdir(parents=True, exist_ok=True)
+
+        previous = load_manifest(model_dir) or {}
+        recorded = previous.get("files", {}) if previous.get("repo") == spec["name"] else {}
+        manifest = {"repo": spec["name"], "revision": spec.get("revision", "main"), "commit": commit, "files": {}}
+
+        tasks = []
+        for entry in select_files(listing, spec.get("allow", ("*",)), spec.get("ignore", ())):
+            record = recorded.get(local_name(entry["path"]))
+            if record and self.up_to_date(model_dir, entry, record):
+                manifest["files"][local_name(entry["path"])] = record
+                continue
+
+            path = model_dir / entry["path"]
+            tasks.append({
+                **entry,
+                "url": f"{self.endpoint}/{spec['name']}/resolve/{commit}/{quote(entry['path'])}",
+                "target": path,
+                "part": path.with_name(path.name + ".part"),
+                "progress": path.with_name(path.name + ".part.json"),
+                "manifest": manifest,
+                "model_dir": model_dir,
+                "lock": threading.Lock(),
+            })
+        return manifest, tasks
+
+    def _segments(self, task):
+        """Byte ranges of a task still to fetch, resuming from its progress record when that matches"""
+        identity = {"size": task["size"], "sha256": task["sha256"], "blob_id": task["blob_id"]}
+        try:
+            with open(task["progress"], encoding="utf-8") as f:
+                progress = json.load(f)
+            if progress["identity"] == identity and task["part"].stat().st_size == task["size"]:
+                task["identity"] = identity
+                task["segments"] = progress["segments"]
+                return task["segments"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+        task["target"].parent.mkdir(parents=True, exist_ok=True)
+        with open(task["part"], "wb") as f:
+            f.truncate(task["size"])
+        segments = [
+            [start, start, min(start + self.segment_bytes, task["size"])]
+            for start in range(0, task["size"], self.segment_bytes)
+        ]
+        task["identity"] = identity
+        task["segments"] = segments
+        self._checkpoint(task)
+        return segments
+
+    def _checkpoint(self, task):
+        """Save which bytes of a partial file are written: [start, next offset, end] per segment"""
+        with task["lock"]:
+            write_json(task["progress"], {"identity": task["identity"], "segments": task["segments"]})
+
+    def _fetch_segment(self, task, segment):
+        """Stream one byte range into the partial file, resuming and retrying on connection errors"""
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            _, offset, end = segment
+            if offset >= end:
+                return
+            try:
+                headers = {"Range": f"bytes={offset}-{end - 1}"}
+                with self.session.get(task["url"], headers=headers, stream=True, timeout=TIMEOUT_SECONDS) as response:
+                    if response.status_code != 206:
+                        response.raise_for_status()
+                        raise DownloadError(f"{task['path']}: server ignored the Range request")
+
+                    unsaved = 0
+                    # Unbuffered, so a checkpoint never counts bytes still held in this process
+                    with open(task["part"], "r+b", buffering=0) as f:
+                        f.seek(offset)
+                        for chunk in response.iter_content(READ_CHUNK):
+                            written = min(len(chunk), end - segment[1])
+                            view = memoryview(chunk)[:written]
+                            while view:
+                                view = view[f.write(view):]
+                            segment[1] += written
+                            unsaved += written
+                            with self._lock:
+                                self.bytes_downloaded += written
+                            if segment[1] >= end or self._stop.is_set():
+                                break
+                            if unsaved >= CHECKPOINT_BYTES:
+                                self._checkpoint(task)
+                                unsaved = 0
+                    self._checkpoint(task)
+
+                if self._stop.is_set() and segment[1] < end:
+                    raise DownloadError("download cancelled")
+                if segment[1] < end:
+                    raise DownloadError(f"{task['path']}: connection closed at byte {segment[1]}")
+                return
+            except (requests.RequestException, DownloadError) as e:
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                retryable = status is None or status >= 500 or status == 429
+                if self._stop.is_set() or not retryable or attempt == MAX_ATTEMPTS:
+                    raise
+                logger.warning("Segment download failed, retrying", extra={
+                    "path": task["path"], "attempt": attempt, "error": str(e)
+                })
+                time.sleep(RETRY_SECONDS * attempt)
+
+    def _finish(self, task):
+        """Verify a fully downloaded file, move it into place, convert it if needed and record it"""
+        sha256, blob_id = file_digests(task["part"], task["size"])
+        if task["sha256"]:
+            intact = sha256 == task["sha256"]
+        else:
+            intact = task["blob_id"] is None or blob_id == task["blob_id"]
+        if not intact:
+            task["part"].unlink(missing_ok=True)
+            task["progress"].unlink(missing_ok=True)
+            raise DownloadError(f"{task['path']}: checksum mismatch, the partial file was discarded")
+
+        os.replace(task["part"], task["target"])
+        task["progress"].unlink(missing_ok=True)
+
+        name = local_name(task["path"])
+        target = task["model_dir"] / name
+        if name != task["path"]:
+            print(f"Converting {task['path']} to {name}...")
+            convert_to_safetensors(task["target"], target)
+            task["target"].unlink()
+            sha256 = sha256_file(target)
+
+        with self._lock:
+            task["manifest"]["files"][name] = {
+                "size": target.stat().st_size,
+                "mtime_ns": target.stat().st_mtime_ns,
+                "sha256": sha256,
+                "source": task["path"],
+                "source_sha256": task["sha256"],
+                "source_blob_id": task["blob_id"],
+            }
+            write_json(task["model_dir"] / MANIFEST_NAME, task["manifest"])
+        print(f"Downloaded {task['model_dir'].name}/{name} ({task['size'] / 1024**2:.1f} MB)")
+
+    def download(self, specs):
+        """Download model specs ({name, path, revision, allow, ignore}) together; returns {name: [errors]}
+
+        A KeyboardInterrupt cancels the download after saving progress, and
+        is then raised again.
+        """
+        self._stop.clear()
+        self.bytes_downloaded = 0
+        errors = {spec["name"]: [] for spec in specs}
+        tasks = []
+        for spec in specs:
+            try:
+                manifest, model_tasks = self.plan(spec)
+            except (requests.RequestException, ValueError, KeyError) as e:
+                errors[spec["name"]].append(f"listing failed: {e}")
+                continue
+            write_json(Path(spec["path"]) / MANIFEST_NAME, manifest)
+            skipped = len(manifest["files"])
+            print(f"{spec['name']}: {len(model_tasks)} file(s) to download, {skipped} up to date")
+            tasks.extend((spec["name"], task) for task in model_tasks)
+
+        started = time.perf_counter()
+        remaining = {}
+        futures = {}
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="download")
+        try:
+            for name, task in tasks:
+                segments = self._segments(task)
+                remaining[id(task)] = len(segments)
+                if not segments:
+                    futures[executor.submit(lambda: None)] = (name, task)
+                    remaining[id(task)] = 1
+                for segment in segments:
+                    futures[executor.submit(self._fetch_segment, task, segment)] = (name, task)
+
+            # Files are verified here as their last segment lands, while the pool works on the rest
+            failed = set()
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, task = futures[future]
+                    if id(task) in failed:
+                        continue
+                    try:
+                        future.result()
+                        remaining[id(task)] -= 1
+                        if remaining[id(task)] == 0:
+                            self._finish(task)
+                    except Exception as e:
+                        failed.add(id(task))
+                        errors[name].append(f"{task['path']}: {e}")
+        except KeyboardInterrupt:
+            self.cancel()
+            executor.shutdown(wait=True, cancel_futures=True)
+            print("\nDownload interrupted, progress saved; run again to resume")
+            raise
+        executor.shutdown(wait=True)
+
+        seconds = time.perf_counter() - started
+        if tasks:
+            print(f"Fetched {self.bytes_downloaded / 1024**2:.0f} MB in {seconds:.1f}s "
+                  f"({self.bytes_downloaded / 1024**2 / max(seconds, 1e-9):.1f} MB/s)")
+        return errors
\ No newline at end of file
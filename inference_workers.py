@@ -0,0 +1,532 @@
+"""Text and image models served from their own processes
+
+The API process hands generations to one worker process per model over
+multiprocessing queues. Each worker is pinned to its own CPU cores (a few
+are left to the API process), so a running generation doesn't starve the
+event loop, and generated images come back through shared memory instead of
+being pickled. RemoteModelManager has the ModelManager interface, so
+BlogGenerator runs unchanged on top of it.
+"""
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+import torch
+from PIL import Image
+
+from image_profiles import DEFAULT_IMAGE_PROFILE
+from logging_setup import configure_logging
+from metrics import MULTIPROCESS_DIR, STAGE_SECONDS, record_images, record_text_generation
+from rag_agent import (
+    GENERATION_SEED, IMAGE_BATCH_SIZE, IMAGE_THREADS, STREAM_POLL_SECONDS, TEXT_BATCH_SIZE, TEXT_THREADS, ModelManager
+)
+from text_backends import TEXT_BACKEND
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("text", "image")
+# Cores kept out of the workers' affinity for the API process (event loop, PNG saves, asset encoding)
+API_CORES = int(os.getenv("PHARMAPEDIA_API_CORES", 1))
+WORKER_START_TIMEOUT = 600
+# How often the parent checks whether a worker died while waiting for its responses
+WORKER_POLL_SECONDS = 1.0
+# Recently cancelled request ids a worker can see; only streaming generations get cancelled
+CANCEL_SLOTS = 16
+CANCEL_POLL_SECONDS = 0.1
+
+
+class InferenceWorkerError(Exception):
+    """Raised when a worker fails to load, fails a request or exits"""
+
+
+def available_cores():
+    if psutil is not None and hasattr(psutil.Process, "cpu_affinity"):
+        return sorted(psutil.Process().cpu_affinity())
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def split_cores(cores, api_cores=API_CORES):
+    """{"text": cores, "image": cores} for the workers, leaving the first api_cores to the API
+
+    The image worker gets the same share as IMAGE_THREADS. With too few
+    cores to go around, the workers share all of them.
+    """
+    if len(cores) - api_cores >= 2:
+        cores = cores[api_cores:]
+    if len(cores) < 2:
+        return {"text": cores, "image": cores}
+
+    image_count = round(len(cores) * IMAGE_THREADS / (IMAGE_THREADS + TEXT_THREADS))
+    image_count = min(len(cores) - 1, max(1, image_count))
+    return {"text": cores[image_count:], "image": cores[:image_count]}
+
+
+def pin_to_cores(cores):
+    """Restrict this process to `cores`; False where the OS has no affinity API (macOS)"""
+    if psutil is not None and hasattr(psutil.Process, "cpu_affinity"):
+        psutil.Process().cpu_affinity(list(cores))
+    elif hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    else:
+        return False
+    return True
+
+
+def image_to_shared_memory(image):
+    """Copy an image's RGB pixels into a new shared memory block; returns the block and (name, shape)"""
+    pixels = np.asarray(image.convert("RGB"))
+    block = shared_memory.SharedMemory(create=True, size=pixels.nbytes)
+    np.ndarray(pixels.shape, np.uint8, buffer=block.buf)[:] = pixels
+    return block, (block.name, pixels.shape)
+
+
+def image_from_shared_memory(name, shape):
+    """Read back an image written by image_to_shared_memory and unlink its block"""
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        pixels = np.ndarray(shape, np.uint8, buffer=block.buf).copy()
+    finally:
+        block.close()
+        block.unlink()
+    return Image.fromarray(pixels)
+
+
+class CancelFlag:
+    """Event-like view for StopOnEvent, set once the parent cancels the request"""
+
+    def __init__(self, cancelled, request_id):
+        self.cancelled = cancelled
+        self.request_id = request_id
+
+    def is_set(self):
+        return self.request_id in self.cancelled[:]
+
+
+class WorkerRequests:
+    """Runs requests against a ModelManager inside a worker process"""
+
+    def __init__(self, stage, model_manager, responses, cancelled):
+        self.stage = stage
+        self.model_manager = model_manager
+        self.responses = responses
+        self.cancelled = cancelled
+        self.stream_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stream")
+        # Blocks stay open until the parent has copied them out; on Windows closing them frees them
+        self.shared_blocks = {}
+
+    def text_result(self, **result):
+        prefix_cache = self.model_manager.prefix_cache
+        return {**result, "prefix_cache": prefix_cache.stats() if prefix_cache else None}
+
+    def warm_up(self, request_id):
+        if self.stage == "text":
+            self.model_manager.warm_up_text()
+        else:
+            self.model_manager.warm_up_image()
+
+    def generate_text(self, request_id, prompt, prefixes, seed):
+        started = time.perf_counter()
+        text = self.model_manager.generate_text(prompt, prefixes, seed)
+        return self.text_result(
+            text=text, seconds=time.perf_counter() - started,
+            new_tokens=self.model_manager.count_new_tokens(prompt, text)
+        )
+
+    def generate_text_batch(self, request_id, prompts, batch_size, seed):
+        started = time.perf_counter()
+        texts = self.model_manager.generate_text_batch(prompts, batch_size, seed)
+        return self.text_result(
+            texts=texts, seconds=time.perf_counter() - started,
+            new_tokens=sum(self.model_manager.count_new_tokens(p, t) for p, t in zip(prompts, texts))
+        )
+
+    def generate_text_streaming(self, request_id, prompt, prefixes, seed):
+        started = time.perf_counter()
+        streamer = self.model_manager.text_streamer(timeout=STREAM_POLL_SECONDS)
+        future = self.stream_executor.submit(
+            self.model_manager.generate_text_streaming, prompt, streamer, CancelFlag(self.cancelled, request_id), prefixes,
+            seed
+        )
+
+        while True:
+            try:
+                self.responses.put(("token", request_id, next(streamer)))
+            except StopIteration:
+                break
+            except queue.Empty:
+                # A failed generate() never signals the end of the stream
+                if future.done() and future.exception():
+                    break
+
+        text = future.result()
+        return self.text_result(
+            text=text, seconds=time.perf_counter() - started,
+            new_tokens=self.model_manager.count_new_tokens(prompt, text)
+        )
+
+    def generate_images_batch(self, request_id, prompts, batch_size, image_profile, seed):
+        started = time.perf_counter()
+        images = self.model_manager.generate_images_batch(prompts, batch_size, image_profile, seed)
+        seconds = time.perf_counter() - started
+
+        shared = []
+        for image in images:
+            block, descriptor = image_to_shared_memory(image)
+            self.shared_blocks[block.name] = block
+            shared.append(descriptor)
+        return {"images": shared, "seconds": seconds}
+
+    def release(self, request_id, names):
+        for name in names:
+            block = self.shared_blocks.pop(name, None)
+            if block is not None:
+                block.close()
+
+
+def worker_main(stage, cores, requests, responses, cancelled, seed, text_backend):
+    """Entry point of a worker process: load one model, then serve requests until a None arrives"""
+    configure_logging()
+    if not pin_to_cores(cores):
+        logger.warning("CPU affinity not supported, worker is not pinned", extra={"stage": stage})
+    torch.set_num_threads(len(cores))
+
+    model_manager = ModelManager(seed, text_backend, stages=(stage,))
+    try:
+        model_manager.load()
+    except Exception as e:
+        responses.put(("state", "failed", str(e)))
+        return
+    responses.put(("state", "ready", {"lcm_available": model_manager.lcm_available}))
+    logger.info("Inference worker ready", extra={"stage": stage, "cores": cores})
+
+    handler = WorkerRequests(stage, model_manager, responses, cancelled)
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+
+        request_id, method, args = message
+        try:
+            result = getattr(handler, method)(request_id, *args)
+        except Exception as e:
+            logger.error("Inference request failed", extra={"stage": stage, "method": method, "error": str(e)})
+            responses.put(("error", request_id, f"{type(e).__name__}: {e}"))
+        else:
+            if method != "release":
+                responses.put(("result", request_id, result))
+
+
+class WorkerTextStreamer:
+    """Iterator over the tokens relayed from the text worker
+
+    Like TextIteratorStreamer, next() raises queue.Empty after `timeout`
+    seconds without a token, and StopIteration once generation ends.
+    """
+
+    _end = object()
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self._queue = queue.Queue()
+
+    def put(self, text):
+        self._queue.put(text)
+
+    def end(self):
+        self._queue.put(self._end)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        value = self._queue.get(timeout=self.timeout)
+        if value is self._end:
+            raise StopIteration
+        return value
+
+
+class InferenceWorker:
+    """Parent-side handle on one worker process
+
+    Requests are numbered and resolved through Futures by a reader thread
+    that also relays streamed tokens and notices when the process dies.
+    """
+
+    def __init__(self, stage, cores, seed=GENERATION_SEED, text_backend=TEXT_BACKEND, on_exit=None):
+        self.stage = stage
+        self.cores = cores
+        self.seed = seed
+        self.text_backend = text_backend
+        self.on_exit = on_exit
+        # Forking a process that already runs torch threads is unsafe, and Windows can only spawn
+        self.context = multiprocessing.get_context("spawn")
+        self.process = None
+        self.state = "not_started"
+        self.load_error = None
+        self.info = {}
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._cancelled = self.context.Array("q", CANCEL_SLOTS)
+        self._cancel_index = 0
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.is_alive()
+
+    def start(self):
+        """Start the process; wait_ready() blocks until its model is loaded"""
+        self.requests = self.context.Queue()
+        responses = self.context.Queue()
+        self.state = "loading"
+        self.load_error = None
+        self._loaded.clear()
+        self.process = self.context.Process(
+            target=worker_main, name=f"inference-{self.stage}", daemon=True,
+            args=(self.stage, self.cores, self.requests, responses, self._cancelled, self.seed, self.text_backend)
+        )
+        self.process.start()
+        threading.Thread(
+            target=self._read_responses, args=(self.process, responses), name=f"inference-{self.stage}-reader", daemon=True
+        ).start()
+
+    def wait_ready(self, timeout=WORKER_START_TIMEOUT):
+        if not self._loaded.wait(timeout):
+            raise InferenceWorkerError(f"The {self.stage} worker did not load within {timeout}s")
+        if self.state != "ready":
+            raise InferenceWorkerError(f"The {self.stage} worker failed to load: {self.load_error}")
+
+    def submit(self, method, *args, streamer=None):
+        """Send a request, returning (request id, Future of its result)"""
+        future = Future()
+        with self._lock:
+            if self.state != "ready":
+                raise InferenceWorkerError(f"The {self.stage} worker is {self.state}")
+            request_id = next(self._ids)
+            self._pending[request_id] = (future, streamer)
+        self.requests.put((request_id, method, args))
+        return request_id, future
+
+    def release(self, names):
+        """Let the worker close shared memory blocks the parent is done with"""
+        self.requests.put((0, "release", (names,)))
+
+    def cancel(self, request_id):
+        with self._lock:
+            self._cancelled[self._cancel_index % CANCEL_SLOTS] = request_id
+            self._cancel_index += 1
+
+    def stop(self, timeout=10):
+        if not self.running:
+            return
+        self.state = "stopping"
+        self.requests.put(None)
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+
+    def _read_responses(self, process, responses):
+        while True:
+            try:
+                message = responses.get(timeout=WORKER_POLL_SECONDS)
+            except queue.Empty:
+                if not process.is_alive():
+                    self._worker_exited(process)
+                    return
+                continue
+
+            kind = message[0]
+            if kind == "state":
+                _, self.state, detail = message
+                if self.state == "ready":
+                    self.info = detail
+                else:
+                    self.load_error = detail
+                self._loaded.set()
+                continue
+
+            if kind == "token":
+                _, request_id, text = message
+                future, streamer = self._pending.get(request_id, (None, None))
+                if streamer is not None:
+                    streamer.put(text)
+                continue
+
+            _, request_id, payload = message
+            with self._lock:
+                future, streamer = self._pending.pop(request_id, (None, None))
+            if future is None:
+                continue
+            if streamer is not None:
+                streamer.end()
+            if kind == "result":
+                future.set_result(payload)
+            else:
+                future.set_exception(InferenceWorkerError(payload))
+
+    def _worker_exited(self, process):
+        with self._lock:
+            stopping = self.state == "stopping"
+            if self.state in ("loading", "ready"):
+                self.load_error = self.load_error or f"Worker exited with code {process.exitcode}"
+                self.state = "failed"
+            elif stopping:
+                self.state = "stopped"
+            pending, self._pending = self._pending, {}
+
+        self._loaded.set()
+        for future, streamer in pending.values():
+            if streamer is not None:
+                streamer.end()
+            future.set_exception(InferenceWorkerError(f"The {self.stage} worker exited"))
+
+        if not stopping:
+            logger.error("Inference worker exited", extra={"stage": self.stage, "exitcode": process.exitcode})
+            if self.on_exit:
+                self.on_exit(self)
+
+
+class WorkerPrefixCacheStats:
+    """Prefix cache stats as of the text worker's last reply, for GET /cache/stats"""
+
+    def __init__(self, stats):
+        self._stats = stats
+
+    def stats(self):
+        return self._stats
+
+
+class RemoteModelManager(ModelManager):
+    """ModelManager whose models live in inference worker processes
+
+    load() starts the workers (again, after one has died) and waits until
+    both models are loaded. Requests queue up in the worker that owns the
+    model, which runs them one at a time.
+    """
+
+    def __init__(self, seed=GENERATION_SEED, text_backend=TEXT_BACKEND, cores=None):
+        super().__init__(seed, text_backend, stages=())
+        self.cores = split_cores(cores or available_cores())
+        self.workers = {
+            stage: InferenceWorker(stage, self.cores[stage], seed, self.text_backend, on_exit=self._worker_exited)
+            for stage in STAGES
+        }
+
+    @property
+    def ready(self):
+        return self.state == "ready" and all(worker.state == "ready" for worker in self.workers.values())
+
+    def load(self):
+        if self.ready:
+            return
+
+        with self._load_lock:
+            if self.ready:
+                return
+
+            self.state = "loading"
+            started = time.time()
+            for worker in self.workers.values():
+                if not worker.running:
+                    worker.start()
+
+            try:
+                for worker in self.workers.values():
+                    worker.wait_ready()
+            except Exception as e:
+                self.state = "failed"
+                self.load_error = str(e)
+                raise
+
+            self.lcm_available = self.workers["image"].info["lcm_available"]
+            self.load_error = None
+            self.state = "ready"
+            logger.info("Inference workers ready", extra={
+                "seconds": round(time.time() - started, 1), "text_cores": self.cores["text"],
+                "image_cores": self.cores["image"]
+            })
+
+    def close(self):
+        for worker in self.workers.values():
+            worker.stop()
+        self.state = "not_loaded"
+
+    def _worker_exited(self, worker):
+        self.state = "failed"
+        self.load_error = f"The {worker.stage} worker exited: {worker.load_error}"
+
+    def call(self, stage, method, *args, streamer=None, stop_event=None):
+        """Run a request on a worker and wait for its result, cancelling it once stop_event is set"""
+        self.load()
+        worker = self.workers[stage]
+        request_id, future = worker.submit(method, *args, streamer=streamer)
+
+        if stop_event is not None:
+            while not stop_event.is_set():
+                if wait([future], timeout=CANCEL_POLL_SECONDS).done:
+                    break
+            else:
+                worker.cancel(request_id)
+        return future.result()
+
+    def record_text(self, result):
+        if result["prefix_cache"] is not None:
+            self.prefix_cache = WorkerPrefixCacheStats(result["prefix_cache"])
+        # With a metrics directory the workers record their own metrics
+        if not MULTIPROCESS_DIR:
+            STAGE_SECONDS.labels("text_generation").observe(result["seconds"])
+            record_text_generation(result["new_tokens"], result["seconds"])
+
+    def warm_up_text(self):
+        self.call("text", "warm_up")
+
+    def warm_up_image(self):
+        self.call("image", "warm_up")
+
+    def generate_text(self, prompt, prefixes=(), seed=None):
+        result = self.call("text", "generate_text", prompt, tuple(prefixes), seed)
+        self.record_text(result)
+        return result["text"]
+
+    def generate_text_batch(self, prompts, batch_size=TEXT_BATCH_SIZE, seed=None):
+        result = self.call("text", "generate_text_batch", list(prompts), batch_size, seed)
+        self.record_text(result)
+        return result["texts"]
+
+    def text_streamer(self, timeout=None):
+        return WorkerTextStreamer(timeout)
+
+    def generate_text_streaming(self, prompt, streamer, stop_event=None, prefixes=(), seed=None):
+        result = self.call(
+            "text", "generate_text_streaming", prompt, tuple(prefixes), seed, streamer=streamer, stop_event=stop_event
+        )
+        self.record_text(result)
+        return result["text"]
+
+    def generate_images_batch(self, prompts, batch_size=IMAGE_BATCH_SIZE, image_profile=DEFAULT_IMAGE_PROFILE, seed=None):
+        result = self.call("image", "generate_images_batch", list(prompts), batch_size, image_profile, seed)
+        try:
+            images = [image_from_shared_memory(name, shape) for name, shape in result["images"]]
+        finally:
+            self.workers["image"].release([name for name, _ in result["images"]])
+
+        if not MULTIPROCESS_DIR:
+            STAGE_SECONDS.labels("image_generation").observe(result["seconds"])
+            record_images(image_profile, len(images), result["seconds"])
+        return images
\ No newline at end of file
@@ -0,0 +1,195 @@
+import queue
+import threading
+import time
+import uuid
+
+
+STAGES = ["fda_fetch", "text", "image", "section_images", "save"]
+
+MAX_WORKERS = 1
+MAX_QUEUE_DEPTH = 8
+JOB_TTL_SECONDS = 3600
+DEFAULT_JOB_SECONDS = 210
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue is at capacity"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Job queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Job:
+    def __init__(self, drug_name, title=None, options=None):
+        self.id = uuid.uuid4().hex
+        self.drug_name = drug_name
+        self.title = title
+        self.options = options or {}
+        self.status = "queued"
+        self.stage = None
+        self.stages = {stage: "pending" for stage in STAGES}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._events = []
+        self._cond = threading.Condition()
+
+    @property
+    def done(self):
+        return self.status in ("completed", "failed")
+
+    def publish(self, event, **data):
+        """Record a progress event and wake up any listeners"""
+        with self._cond:
+            self._events.append({"event": event, "job_id": self.id, "time": time.time(), **data})
+            self._cond.notify_all()
+
+    def finish(self, status, result=None, error=None):
+        """Set the final status and publish its event at once, so a listener never sees one without the other"""
+        with self._cond:
+            self.result = result
+            self.error = error
+            self.finished_at = time.time()
+            self.status = status
+            self.publish(status, error=error)
+
+    def update_stage(self, stage, status):
+        """Progress callback handed to BlogGenerator.generate"""
+        self.stage = stage
+        self.stages[stage] = status
+        self.publish("stage", stage=stage, status=status)
+
+    def wait_for_events(self, cursor, timeout=15):
+        """Return events after `cursor`, blocking up to `timeout` seconds for new ones"""
+        with self._cond:
+            if len(self._events) <= cursor and not self.done:
+                self._cond.wait(timeout)
+            return self._events[cursor:]
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "drug_name": self.drug_name,
+            "title": self.title,
+            "status": self.status,
+            "stage": self.stage,
+            "stages": dict(self.stages),
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+class JobManager:
+    """Bounded worker pool that runs BlogGenerator.generate off the request path"""
+
+    def __init__(self, generator, max_workers=MAX_WORKERS, max_queue=MAX_QUEUE_DEPTH, job_ttl=JOB_TTL_SECONDS):
+        self.generator = generator
+        self.max_workers = max_workers
+        self.job_ttl = job_ttl
+        self.jobs = {}
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._avg_job_seconds = DEFAULT_JOB_SECONDS
+        self._running = 0
+        self._workers = []
+
+    def start(self):
+        """Start the worker threads; deferred so a pre-forking server starts them per worker process"""
+        with self._lock:
+            if self._workers:
+                return
+            for i in range(self.max_workers):
+                worker = threading.Thread(target=self._worker_loop, name=f"blog-job-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    @property
+    def running(self):
+        return self._running
+
+    def retry_after(self):
+        """Estimate seconds until a queue slot frees up"""
+        waiting = self._queue.qsize() + self._running
+        estimate = self._avg_job_seconds * waiting / max(self.max_workers, 1)
+        return max(1, int(min(estimate, self._avg_job_seconds)))
+
+    def submit(self, drug_name, title=None, **options):
+        self.start()
+        self._prune()
+        job = Job(drug_name, title, options)
+        job.publish("queued", position=self._queue.qsize() + 1)
+
+        with self._lock:
+            self.jobs[job.id] = job
+
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self.jobs[job.id]
+            raise QueueFullError(self.retry_after())
+
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _worker_loop(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job):
+        with self._lock:
+            self._running += 1
+        job.status = "running"
+        job.started_at = time.time()
+        job.publish("started")
+
+        status, result, error = "failed", None, None
+        try:
+            result = self.generator.generate(
+                job.drug_name,
+                job.title,
+                progress_callback=job.update_stage,
+                **job.options
+            )
+
+            if result.get("status") == "success":
+                status = "completed"
+            else:
+                error = result.get("message", "Unknown error")
+                result = None
+
+        except Exception as e:
+            error = str(e)
+
+        finally:
+            with self._lock:
+                self._running -= 1
+                elapsed = time.time() - job.started_at
+                self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * elapsed
+
+        job.finish(status, result, error)
+
+    def _prune(self):
+        """Forget finished jobs older than the TTL"""
+        cutoff = time.time() - self.job_ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self.jobs.items() if job.done and job.finished_at < cutoff]
+            for job_id in expired:
+                del self.jobs[job_id]
\ No newline at end of file
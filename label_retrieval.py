@@ -0,0 +1,397 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from collections import namedtuple
+from itertools import chain
+from pathlib import Path
+
+import numpy as np
+
+from config import HOME_DIR
+from fda_store import get_label_store, normalize_drug_name
+
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = os.path.join(HOME_DIR, "data", "label_index")
+EMBEDDING_MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_MODEL_DIR = os.path.join(HOME_DIR, "models", "minilm")
+HASHING_DIM = 384
+
+EMBED_BATCH_SIZE = 64
+INGEST_BATCH_LABELS = 256
+SEARCH_BLOCK_ROWS = 1 << 16
+CHUNK_WORDS = 120
+CHUNK_OVERLAP_WORDS = 25
+TOP_K = 3
+
+# openFDA label sections worth retrieving from, with the heading used in prompts
+LABEL_SECTIONS = {
+    "boxed_warning": "Boxed warning",
+    "indications_and_usage": "Uses",
+    "dosage_and_administration": "Dosage",
+    "dosage_forms_and_strengths": "Dosage forms",
+    "contraindications": "Contraindications",
+    "warnings_and_cautions": "Warnings",
+    "warnings": "Warnings",
+    "precautions": "Precautions",
+    "adverse_reactions": "Side effects",
+    "drug_interactions": "Interactions",
+    "use_in_specific_populations": "Specific populations",
+    "pregnancy": "Pregnancy",
+    "overdosage": "Overdosage",
+    "mechanism_of_action": "Mechanism",
+    "clinical_pharmacology": "Clinical pharmacology",
+    "patient_counseling_information": "Patient counseling",
+}
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+WORD = re.compile(r"[a-z0-9]+")
+
+Chunk = namedtuple("Chunk", ["label_key", "section", "text", "score"])
+
+
+def label_key(record, drug_name):
+    """Bulk labels are keyed by set_id; seeded and API labels fall back to the drug name"""
+    return record.get("set_id") or record.get("id") or f"drug:{normalize_drug_name(drug_name)}"
+
+
+def label_fingerprint(record):
+    """Changes whenever any indexed section of the label changes"""
+    sections = {section: record.get(section) for section in LABEL_SECTIONS if record.get(section)}
+    return hashlib.sha1(json.dumps(sections, sort_keys=True).encode()).hexdigest()
+
+
+def chunk_text(text, max_words=CHUNK_WORDS, overlap_words=CHUNK_OVERLAP_WORDS):
+    """Split text into chunks of whole sentences, repeating trailing sentences as overlap"""
+    chunks = []
+    current = []
+    current_words = 0
+
+    for sentence in SENTENCE_END.split(" ".join(text.split())):
+        words = len(sentence.split())
+        if current and current_words + words > max_words:
+            chunks.append(" ".join(current))
+
+            overlap = []
+            overlap_count = 0
+            for previous in reversed(current):
+                overlap_count += len(previous.split())
+                if overlap_count > overlap_words:
+                    break
+                overlap.insert(0, previous)
+            current = overlap
+            current_words = sum(len(s.split()) for s in current)
+
+        current.append(sentence)
+        current_words += words
+
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def chunk_label(record):
+    """(section, text) chunks covering every indexed section of a label"""
+    chunks = []
+    for section in LABEL_SECTIONS:
+        for text in record.get(section, []):
+            chunks.extend((section, chunk) for chunk in chunk_text(text))
+    return chunks
+
+
+class SentenceTransformerEmbedder:
+    """all-MiniLM-L6-v2: 384 dimensions, fast enough on CPU for batched ingest"""
+
+    def __init__(self, model_dir=EMBEDDING_MODEL_DIR):
+        from sentence_transformers import SentenceTransformer
+
+        source = model_dir if Path(model_dir).exists() else EMBEDDING_MODEL_ID
+        self.model = SentenceTransformer(source, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"sentence-transformers:{EMBEDDING_MODEL_ID}"
+
+    def embed(self, texts, batch_size=EMBED_BATCH_SIZE):
+        vectors = self.model.encode(texts, batch_size=batch_size, normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.astype(np.float32, copy=False)
+
+
+class HashingEmbedder:
+    """Signed feature hashing of words and bigrams, for when no embedding model is installed"""
+
+    def __init__(self, dim=HASHING_DIM):
+        self.dim = dim
+        self.name = f"hashing:{dim}"
+
+    def embed(self, texts, batch_size=None):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = WORD.findall(text.lower())
+            for feature in chain(words, map(" ".join, zip(words, words[1:]))):
+                h = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+                vectors[row, h % self.dim] += 1.0 if h >> 63 else -1.0
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+def get_embedder():
+    try:
+        return SentenceTransformerEmbedder()
+    except ImportError:
+        logger.warning("sentence-transformers not installed, using the hashing embedder for label retrieval")
+        return HashingEmbedder()
+
+
+class LabelIndex:
+    """Chunked label sections with their embeddings in a memory-mapped float32 matrix
+
+    vectors.f32 holds one normalized row per chunk and is only ever appended
+    to, so it can be memory-mapped read-only by every worker. chunks.sqlite maps
+    rows back to text and records the contiguous row range of each label, which
+    makes a per-label search a single slice and matrix-vector product. Rows of
+    a replaced label stay in vectors.f32 but fall outside every recorded range,
+    so whole-index searches skip them.
+    """
+
+    def __init__(self, index_dir=INDEX_DIR, embedder=None):
+        self.index_dir = Path(index_dir)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.index_dir / "vectors.f32"
+        self.embedder = embedder or get_embedder()
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._live = None
+        self._live_key = None
+        self._writes = 0
+
+        self._db = sqlite3.connect(str(self.index_dir / "chunks.sqlite"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                row INTEGER PRIMARY KEY,
+                label_key TEXT NOT NULL,
+                section TEXT NOT NULL,
+                text TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS labels (
+                label_key TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                start INTEGER NOT NULL,
+                stop INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+        self._check_embedder()
+
+    def _check_embedder(self):
+        """Vectors from a different embedder are meaningless, so start over when it changes"""
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'embedder'").fetchone()
+        if row and row[0] == self.embedder.name:
+            return
+
+        if row:
+            logger.info("Label index embedder changed, rebuilding", extra={"previous": row[0], "embedder": self.embedder.name})
+        with self._db:
+            self._db.execute("DELETE FROM chunks")
+            self._db.execute("DELETE FROM labels")
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('embedder', ?)", (self.embedder.name,))
+        self.vectors_path.write_bytes(b"")
+
+    @property
+    def rows(self):
+        if not self.vectors_path.exists():
+            return 0
+        return self.vectors_path.stat().st_size // (4 * self.embedder.dim)
+
+    def vectors(self):
+        """Memory map of all rows, reopened only when rows were appended"""
+        rows = self.rows
+        if self._vectors is None or len(self._vectors) != rows:
+            if rows == 0:
+                return np.empty((0, self.embedder.dim), dtype=np.float32)
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.embedder.dim))
+        return self._vectors
+
+    def live_rows(self, rows):
+        """Boolean mask of the first `rows` rows that belong to a label's current range
+
+        Rebuilt only after this or another connection changed the index.
+        """
+        key = (self._db.execute("PRAGMA data_version").fetchone()[0], self._writes, rows)
+        if key != self._live_key:
+            live = np.zeros(rows, dtype=bool)
+            for start, stop in self._db.execute("SELECT start, stop FROM labels"):
+                live[start:stop] = True
+            self._live, self._live_key = live, key
+        return self._live
+
+    def label_keys(self):
+        with self._lock:
+            return [key for key, in self._db.execute("SELECT label_key FROM labels")]
+
+    def _fingerprints(self, keys):
+        placeholders = ",".join("?" * len(keys))
+        rows = self._db.execute(
+            f"SELECT label_key, fingerprint FROM labels WHERE label_key IN ({placeholders})", list(keys)
+        )
+        return dict(rows.fetchall())
+
+    def add_labels(self, labels):
+        """Chunk, embed and append (label_key, record) pairs, skipping labels already indexed unchanged
+
+        All chunks of the batch are embedded together, batch_size texts per
+        forward pass. The chunk text of a replaced label is deleted; its old
+        vectors are left in place and masked out of searches.
+        """
+        labels = list(labels)
+        if not labels:
+            return 0
+
+        with self._lock:
+            known = self._fingerprints([key for key, _ in labels])
+            pending = []
+            for key, record in labels:
+                fingerprint = label_fingerprint(record)
+                if known.get(key) != fingerprint:
+                    pending.append((key, fingerprint, chunk_label(record)))
+
+            texts = [text for _, _, chunks in pending for _, text in chunks]
+            if not texts:
+                return 0
+
+            vectors = self.embedder.embed(texts)
+            start = self.rows
+            with open(self.vectors_path, "ab") as f:
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+
+            chunk_rows = []
+            label_rows = []
+            row = start
+            for key, fingerprint, chunks in pending:
+                label_rows.append((key, fingerprint, row, row + len(chunks)))
+                for section, text in chunks:
+                    chunk_rows.append((row, key, section, text))
+                    row += 1
+
+            with self._db:
+                self._db.executemany("DELETE FROM chunks WHERE label_key = ?", [(key,) for key, _, _ in pending if key in known])
+                self._db.executemany("INSERT INTO chunks (row, label_key, section, text) VALUES (?, ?, ?, ?)", chunk_rows)
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO labels (label_key, fingerprint, start, stop) VALUES (?, ?, ?, ?)", label_rows
+                )
+            self._writes += 1
+
+            return len(texts)
+
+    def _chunks(self, rows, scores):
+        placeholders = ",".join("?" * len(rows))
+        with self._lock:
+            found = {
+                row: (key, section, text) for row, key, section, text in self._db.execute(
+                    f"SELECT row, label_key, section, text FROM chunks WHERE row IN ({placeholders})", [int(r) for r in rows]
+                )
+            }
+        return [Chunk(*found[int(row)], float(score)) for row, score in zip(rows, scores) if int(row) in found]
+
+    def search(self, query, k=TOP_K, label_key=None):
+        """Top-k chunks by cosine similarity, within one label or across the whole index"""
+        query_vector = self.embedder.embed([query])[0]
+
+        with self._lock:
+            vectors = self.vectors()
+            span = live = None
+            if label_key is not None:
+                span = self._db.execute("SELECT start, stop FROM labels WHERE label_key = ?", (label_key,)).fetchone()
+            else:
+                live = self.live_rows(len(vectors))
+
+        if label_key is not None:
+            if not span:
+                return []
+            blocks = [(span[0], vectors[span[0]:span[1]])]
+        else:
+            blocks = ((start, vectors[start:start + SEARCH_BLOCK_ROWS]) for start in range(0, len(vectors), SEARCH_BLOCK_ROWS))
+
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start, block in blocks:
+            block_scores = block @ query_vector
+            if live is not None:
+                block_scores[~live[start:start + len(block)]] = -np.inf
+            scores = np.concatenate([best_scores, block_scores])
+            rows = np.concatenate([best_rows, np.arange(start, start + len(block))])
+            if len(scores) > k:
+                keep = np.argpartition(-scores, k)[:k]
+                scores, rows = scores[keep], rows[keep]
+            best_scores, best_rows = scores, rows
+
+        order = np.argsort(-best_scores)
+        order = order[np.isfinite(best_scores[order])]
+        return self._chunks(best_rows[order], best_scores[order])
+
+    def retrieve(self, record, drug_name, query, k=TOP_K):
+        """Top-k chunks of one label for a query, indexing the label first if needed"""
+        key = label_key(record, drug_name)
+        self.add_labels([(key, record)])
+        return self.search(query, k, label_key=key)
+
+    def build_from_store(self, store=None, batch_labels=INGEST_BATCH_LABELS):
+        """Index every bulk-ingested label, batch_labels labels per embedding batch"""
+        store = store or get_label_store()
+        total = 0
+        for batch in store.iter_bulk_labels(batch_labels):
+            total += self.add_labels(batch)
+        return total
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_label_index():
+    """Process-wide LabelIndex, so the embedding model is loaded once"""
+    global _default_index
+
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = LabelIndex()
+        return _default_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the chunked label embedding index")
+    parser.add_argument("--build", action="store_true", help="index every bulk-ingested label in the label store")
+    parser.add_argument("--query", help="search the index")
+    parser.add_argument("--drug", help="restrict --query to this drug's label")
+    parser.add_argument("-k", type=int, default=TOP_K)
+    args = parser.parse_args()
+
+    index = get_label_index()
+
+    if args.build:
+        print(f"Indexed {index.build_from_store()} new chunks, {index.rows} in total")
+
+    if args.query:
+        if args.drug:
+            record = get_label_store().get(args.drug)
+            if not record:
+                parser.error(f"no label found for {args.drug}")
+            results = index.retrieve(record, args.drug, args.query, args.k)
+        else:
+            results = index.search(args.query, args.k)
+
+        for chunk in results:
+            print(f"[{chunk.score:.3f}] {chunk.label_key} / {LABEL_SECTIONS[chunk.section]}: {chunk.text[:200]}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,57 @@
+import json
+import logging
+import os
+import sys
+
+
+LOG_LEVEL = os.getenv("PHARMAPEDIA_LOG_LEVEL", "INFO")
+# "json" writes one object per line for log shippers, "text" is for reading in a terminal
+LOG_FORMAT = os.getenv("PHARMAPEDIA_LOG_FORMAT", "text")
+
+# Attributes every LogRecord has; anything else came in through extra={...}
+RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+
+def record_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in RECORD_ATTRS}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+            **record_fields(record)
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        fields = record_fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT):
+    """Send all logging to stderr in the configured format; later calls are no-ops"""
+    root = logging.getLogger()
+    if any(getattr(handler, "pharmapedia", False) for handler in root.handlers):
+        return
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.pharmapedia = True
+    if fmt == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(TextFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    root.addHandler(handler)
+    root.setLevel(level.upper())
\ No newline at end of file
@@ -0,0 +1,163 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+logger = logging.getLogger(__name__)
+
+# Set by gunicorn_conf.py so histograms from every worker are aggregated on /metrics
+MULTIPROCESS_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+STAGE_SECONDS = Histogram(
+    "pharmapedia_stage_seconds", "Time spent in each blog generation stage", ["stage"], buckets=STAGE_BUCKETS
+)
+DIFFUSION_STEP_SECONDS = Histogram(
+    "pharmapedia_diffusion_step_seconds", "Time per denoising step of one image batch", ["profile"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 1.5, 2, 3, 5, 8, 13, 20)
+)
+TEXT_TOKENS = Counter("pharmapedia_text_tokens_total", "Tokens generated by the text model")
+TEXT_TOKENS_PER_SECOND = Histogram(
+    "pharmapedia_text_tokens_per_second", "Text model throughput per generate call",
+    buckets=(0.5, 1, 2, 4, 6, 8, 10, 15, 20, 30, 50, 100)
+)
+IMAGES = Counter("pharmapedia_images_total", "Images generated", ["profile"])
+IMAGES_PER_SECOND = Histogram(
+    "pharmapedia_images_per_second", "Image model throughput per generate call", ["profile"],
+    buckets=(0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2)
+)
+BLOGS = Counter("pharmapedia_blogs_total", "Blog generations by outcome", ["outcome"])
+
+
+class Timing:
+    seconds = None
+
+
+@contextmanager
+def stage_timer(stage, **fields):
+    """Observe the duration of a block in STAGE_SECONDS and log it with any extra fields
+
+    Yields a Timing whose seconds are set once the block exits.
+    """
+    timing = Timing()
+    start = time.perf_counter()
+    try:
+        yield timing
+    finally:
+        timing.seconds = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage).observe(timing.seconds)
+        logger.debug("Stage timed", extra={"stage": stage, "seconds": round(timing.seconds, 4), **fields})
+
+
+def record_text_generation(new_tokens, seconds):
+    TEXT_TOKENS.inc(new_tokens)
+    if seconds > 0 and new_tokens:
+        TEXT_TOKENS_PER_SECOND.observe(new_tokens / seconds)
+
+
+def record_images(profile, count, seconds):
+    IMAGES.labels(profile).inc(count)
+    if seconds > 0 and count:
+        IMAGES_PER_SECOND.labels(profile).observe(count / seconds)
+
+
+class StepTimer:
+    """diffusers callback_on_step_end recording the time of every denoising step
+
+    The first step also includes prompt encoding, since the timer starts
+    when the pipeline is called.
+    """
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.last = time.perf_counter()
+
+    def __call__(self, pipe, step, timestep, callback_kwargs):
+        now = time.perf_counter()
+        DIFFUSION_STEP_SECONDS.labels(self.profile).observe(now - self.last)
+        self.last = now
+        return callback_kwargs
+
+
+class LiveStatsCollector:
+    """Gauges read at scrape time: cache hit rates, queue depth, process memory
+
+    Sources are functions returning a dict (or None while unavailable).
+    Cache sources report hits and misses, optionally entries and bytes;
+    gauge sources report a single number.
+    """
+
+    def __init__(self):
+        self.caches = {}
+        self.gauges = {}
+
+    def register_cache(self, name, stats):
+        self.caches[name] = stats
+
+    def register_gauge(self, name, description, value):
+        self.gauges[name] = (description, value)
+
+    def collect(self):
+        hits = CounterMetricFamily("pharmapedia_cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("pharmapedia_cache_misses", "Cache misses", labels=["cache"])
+        ratio = GaugeMetricFamily("pharmapedia_cache_hit_ratio", "Share of lookups that hit", labels=["cache"])
+        entries = GaugeMetricFamily("pharmapedia_cache_entries", "Entries held", labels=["cache"])
+        size = GaugeMetricFamily("pharmapedia_cache_bytes", "Bytes held", labels=["cache"])
+
+        for name, source in list(self.caches.items()):
+            try:
+                stats = source()
+            except Exception as e:
+                logger.warning("Cache stats unavailable", extra={"cache": name, "error": str(e)})
+                continue
+            if not stats:
+                continue
+            lookups = stats["hits"] + stats["misses"]
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+            ratio.add_metric([name], stats["hits"] / lookups if lookups else 0.0)
+            if "entries" in stats:
+                entries.add_metric([name], stats["entries"])
+            if "bytes" in stats:
+                size.add_metric([name], stats["bytes"])
+        yield from (hits, misses, ratio, entries, size)
+
+        for name, (description, value) in list(self.gauges.items()):
+            yield GaugeMetricFamily(f"pharmapedia_{name}", description, value=value())
+
+        if psutil is not None:
+            # prometheus_client's own process metrics are Linux-only
+            yield GaugeMetricFamily(
+                "pharmapedia_process_rss_bytes", "Resident memory of this process", value=psutil.Process().memory_info().rss
+            )
+
+
+live_stats = LiveStatsCollector()
+REGISTRY.register(live_stats)
+
+
+def metrics_payload():
+    """(body, content type) for a /metrics response
+
+    With several gunicorn workers, counters and histograms are summed across
+    workers, while the live gauges come from the worker answering the scrape.
+    """
+    if not MULTIPROCESS_DIR:
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+    from prometheus_client import multiprocess
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(live_stats)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
\ No newline at end of file
@@ -1,26 +1,45 @@
 import os
-import torch
+import argparse
 from pathlib import Path
-from transformers import AutoTokenizer, AutoModelForCausalLM
-from diffusers import StableDiffusionPipeline
+from config import HOME_DIR
+from text_backends import export_artifacts
+from image_profiles import LCM_LORA_ID
+from hub_downloader import DOWNLOAD_WORKERS, HF_ENDPOINT, HubDownloader, verify
 
 
-BASE_PATH = r"C:\BlogAgent\models"
+BASE_PATH = os.path.join(HOME_DIR, "models")
 os.makedirs(BASE_PATH, exist_ok=True)
 
+# allow/ignore are glob patterns over repo paths; only the full-precision
+# safetensors weights the app loads are fetched, not checkpoints or variants
 MODELS = {
     "tinyllama": {
         "name": "TinyLlama/TinyLlama-1.1B-Chat-v1.0",
+        "revision": "main",
         "path": os.path.join(BASE_PATH, "tinyllama"),
+        "allow": ["*.json", "tokenizer.model", "*.safetensors", "*.bin"],
+        "ignore": [],
         "size": "2.2 GB"
     },
     "stable_diffusion": {
         "name": "runwayml/stable-diffusion-v1-5",
+        "revision": "main",
         "path": os.path.join(BASE_PATH, "stable_diffusion"),
-        "size": "4 GB"
+        "allow": ["model_index.json", "*/*.json", "*/*.txt", "*/*.safetensors", "*/*.bin"],
+        "ignore": ["*fp16*", "*non_ema*", "*.ema.*"],
+        "size": "5.5 GB"
     }
 }
 
+LCM_LORA = {
+    "name": LCM_LORA_ID,
+    "revision": "main",
+    "path": os.path.join(BASE_PATH, "lcm_lora"),
+    "allow": ["*.safetensors", "*.bin"],
+    "ignore": [],
+    "size": "130 MB"
+}
+
 
 def print_section(title):
     print(f"\n{'='*60}")
@@ -28,54 +47,26 @@ def print_section(title):
     print(f"{'='*60}\n")
 
 
-def download_tinyllama():
-    print_section("Downloading TinyLlama 1.1B")
+def download_models(specs, downloader):
+    """Download models together; returns {name: ok}"""
+    print_section(f"Downloading {', '.join(spec['name'] for spec in specs)}")
     
-    model_info = MODELS["tinyllama"]
-    os.makedirs(model_info["path"], exist_ok=True)
+    errors = downloader.download(specs)
     
-    try:
-        print("Step 1: Downloading tokenizer...")
-        tokenizer = AutoTokenizer.from_pretrained(model_info["name"])
-        tokenizer.save_pretrained(model_info["path"])
-        print("Tokenizer saved")
-        
-        print("Step 2: Downloading model weights...")
-        model = AutoModelForCausalLM.from_pretrained(
-            model_info["name"],
-            dtype=torch.float32
-        )
-        model.save_pretrained(model_info["path"])
-        
-        print(f"Success: {model_info['path']}")
-        print(f"Size: {model_info['size']}\n")
-        return True
-        
-    except Exception as e:
-        print(f"Failed: {e}\n")
-        return False
+    for name, problems in errors.items():
+        for problem in problems:
+            print(f"Failed: {name}: {problem}")
+    print()
+    return {name: not problems for name, problems in errors.items()}
 
 
-def download_stable_diffusion():
-    print_section("Downloading Stable Diffusion v1.5")
-    
-    model_info = MODELS["stable_diffusion"]
-    os.makedirs(model_info["path"], exist_ok=True)
+def export_text_backends(backends):
+    print_section(f"Exporting TinyLlama backends: {', '.join(backends)}")
     
     try:
-        print("Step 1: Downloading image model...")
-        print("This is large, it will take 5-10 minutes...\n")
-        
-        pipeline = StableDiffusionPipeline.from_pretrained(
-            model_info["name"],
-            dtype=torch.float32
-        )
-        pipeline.save_pretrained(model_info["path"])
-        
-        print(f"\nSuccess: {model_info['path']}")
-        print(f"Size: {model_info['size']}\n")
+        export_artifacts(MODELS["tinyllama"]["path"], backends)
         return True
-        
+    
     except Exception as e:
         print(f"Failed: {e}\n")
         return False
@@ -94,51 +85,94 @@ def get_dir_size(path):
     return total
 
 
-def verify_downloads():
+def verify_downloads(specs):
+    """Check every downloaded file against its recorded SHA256; returns whether all passed"""
     print_section("Verification")
     
-    for key, model in MODELS.items():
-        path = model["path"]
+    all_ok = True
+    for spec in specs:
+        path = spec["path"]
+        print(spec["name"])
+        print(f"Path: {path}")
+        
+        if not os.path.exists(path):
+            print("Status: NOT FOUND\n")
+            all_ok = False
+            continue
+        
+        files = sum(1 for _ in Path(path).rglob('*') if _.is_file())
+        size_gb = get_dir_size(path) / (1024**3)
+        print(f"Files: {files} | Size: {size_gb:.2f} GB")
         
-        if os.path.exists(path):
-            try:
-                files = sum(1 for _ in Path(path).rglob('*') if _.is_file())
-                size_gb = get_dir_size(path) / (1024**3)
-                
-                print(f"{key.upper()}")
-                print(f"Path: {path}")
-                print(f"Files: {files} | Size: {size_gb:.2f} GB")
-                
-                if size_gb > 0.5:
-                    print("Status: Downloaded")
-                else:
-                    print("Status: Incomplete or empty")
-                print()
-            except Exception as e:
-                print(f"{key.upper()} - Error: {e}\n")
+        problems = verify(path)
+        if problems is None:
+            print("Status: No download manifest, run without --verify to check and refresh it")
+            all_ok = False
+        elif problems:
+            print(f"Status: {len(problems)} problem(s), run again to re-download")
+            for problem in problems:
+                print(f"  {problem}")
+            all_ok = False
         else:
-            print(f"{key.upper()} - NOT FOUND\n")
+            print("Status: Verified")
+        print()
+    return all_ok
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Download models for BlogAgent")
+    parser.add_argument("--text-backends", nargs="+", choices=["int8", "bf16", "onnx"], default=[],
+                        help="also build these CPU text backends (select one with PHARMAPEDIA_TEXT_BACKEND)")
+    parser.add_argument("--lcm-lora", action="store_true",
+                        help="also download the LCM LoRA (~130 MB) so the draft image profile runs 6-step LCM")
+    parser.add_argument("--skip-download", action="store_true", help="only build backends from already downloaded models")
+    parser.add_argument("--verify", action="store_true", help="only check downloaded files against their SHA256s")
+    parser.add_argument("--workers", type=int, default=DOWNLOAD_WORKERS, help="parallel connections")
+    parser.add_argument("--endpoint", default=HF_ENDPOINT, help="Hub URL (or a mirror / local stand-in)")
+    parser.add_argument("-y", "--yes", action="store_true", help="don't wait for Enter before downloading")
+    args = parser.parse_args()
+    
+    specs = [MODELS["tinyllama"], MODELS["stable_diffusion"]] + ([LCM_LORA] if args.lcm_lora else [])
+    downloader = HubDownloader(args.endpoint, workers=args.workers)
+    
+    if args.verify:
+        ok = verify_downloads(specs)
+        print_section("Status")
+        print("All files verified" if ok else "Some files are missing or corrupt. Run again to re-download them.")
+        return
+    
+    if args.skip_download:
+        ok = export_text_backends(args.text_backends) if args.text_backends else True
+        if args.lcm_lora:
+            ok = download_models([LCM_LORA], downloader)[LCM_LORA["name"]] and ok
+        print_section("Status")
+        print("Extras ready" if ok else "Some steps failed. Check errors above.")
+        return
+    
     print_section("Model Downloader for BlogAgent")
     print(f"Target: {BASE_PATH}\n")
     
     print("This will download:")
-    print("- TinyLlama 1.1B (text generation)")
-    print("- Stable Diffusion v1.5 (image generation)")
-    print("- Total size: ~6 GB")
-    print("- Time: 15-20 minutes\n")
+    print(f"- TinyLlama 1.1B (text generation, {MODELS['tinyllama']['size']})")
+    print(f"- Stable Diffusion v1.5 (image generation, {MODELS['stable_diffusion']['size']})")
+    if args.lcm_lora:
+        print(f"- LCM LoRA (draft image profile, {LCM_LORA['size']})")
+    print(f"- Over {args.workers} parallel connections; interrupted downloads resume and up-to-date files are skipped\n")
+    
+    if not args.yes:
+        input("Press Enter to start downloading...")
     
-    input("Press Enter to start downloading...")
+    results = download_models(specs, downloader)
+    text_ok = results[MODELS["tinyllama"]["name"]]
+    image_ok = all(results[spec["name"]] for spec in specs[1:])
     
-    text_ok = download_tinyllama()
-    image_ok = download_stable_diffusion()
+    if text_ok and args.text_backends:
+        text_ok = export_text_backends(args.text_backends)
     
-    verify_downloads()
+    verified = verify_downloads(specs)
     
     print_section("Status")
-    if text_ok and image_ok:
+    if text_ok and image_ok and verified:
         print("All models downloaded successfully!")
         print("Ready for blog generator")
     else:
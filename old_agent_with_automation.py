@@ -4,6 +4,7 @@ from datetime import datetime
 from pathlib import Path
 import logging
 import html2text
+from blog_renderer import CSS_NAME, Heading, parse_markdown, render_image, render_page, write_stylesheet
 from dotenv import load_dotenv
 import os
 
@@ -82,221 +83,36 @@ Total length: 1500-2000 words. Use clear, professional language with proper spac
         return images
     
     def parse_content_with_headings(self, content, images):
-        """Convert markdown content to HTML with proper headings and images"""
-        lines = content.split('\n')
-        html_sections = []
+        """Parse markdown content, picking the headings that get an image after them"""
+        blocks = parse_markdown(content)
+        section_images = {}
         image_index = 0
         section_count = 0
         
-        for line in lines:
-            line = line.strip()
-            
-            if not line:
+        for block in blocks:
+            if not isinstance(block, Heading) or block.level > 2:
                 continue
+            section_count += 1
             
-            if line.startswith('# '):
-                heading = line.replace('# ', '')
-                html_sections.append(f'<h1>{heading}</h1>')
-                section_count += 1
-                
-            elif line.startswith('## '):
-                heading = line.replace('## ', '')
-                html_sections.append(f'<h2>{heading}</h2>')
-                section_count += 1
-                
-                if section_count > 1 and section_count % 2 == 0 and image_index < len(images):
-                    html_sections.append(f'''
-                    <div class="section-image">
-                        <img src="{images[image_index]}" alt="Illustration" class="blog-img">
-                    </div>
-                    ''')
-                    image_index += 1
-                    
-            elif line.startswith('### '):
-                heading = line.replace('### ', '')
-                html_sections.append(f'<h3>{heading}</h3>')
-                
-            else:
-                if line:
-                    html_sections.append(f'<p>{line}</p>')
+            if block.level == 2 and section_count > 1 and section_count % 2 == 0 and image_index < len(images):
+                section_images[block.text] = render_image(images[image_index], "Illustration", "blog-img")
+                image_index += 1
         
-        return '\n'.join(html_sections)
+        return blocks, section_images
     
     def create_html(self, topic, content, image_urls):
         """Create professional, well-structured HTML blog"""
         logger.info("Creating HTML document")
         
         timestamp = datetime.now().strftime("%B %d, %Y")
-        content_html = self.parse_content_with_headings(content, image_urls)
-        
-        featured_image = f'<img src="{image_urls[0]}" alt="{topic}" class="featured-img">'
-        
-        css_styles = """
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-        
-        body {
-            font-family: 'Georgia', 'Segoe UI', serif;
-            line-height: 1.9;
-            color: #2c3e50;
-            background: linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%);
-            padding: 40px 20px;
-        }
-        
-        .wrapper {
-            max-width: 850px;
-            margin: 0 auto;
-            background: white;
-            padding: 60px 50px;
-            border-radius: 12px;
-            box-shadow: 0 10px 40px rgba(0, 0, 0, 0.1);
-        }
-        
-        header {
-            margin-bottom: 50px;
-            border-bottom: 4px solid #3498db;
-            padding-bottom: 30px;
-        }
-        
-        h1 {
-            font-size: 3.2em;
-            color: #2c3e50;
-            margin-bottom: 15px;
-            line-height: 1.2;
-            font-weight: 700;
-        }
-        
-        .date {
-            color: #7f8c8d;
-            font-size: 1em;
-            font-style: italic;
-            letter-spacing: 0.5px;
-        }
-        
-        .featured-img {
-            width: 100%;
-            height: auto;
-            max-height: 500px;
-            border-radius: 10px;
-            margin: 40px 0;
-            box-shadow: 0 8px 25px rgba(0, 0, 0, 0.15);
-            object-fit: cover;
-        }
-        
-        .blog-content {
-            font-size: 1.15em;
-            line-height: 2;
-            color: #34495e;
-        }
-        
-        h2 {
-            font-size: 2.2em;
-            color: #2980b9;
-            margin-top: 50px;
-            margin-bottom: 20px;
-            padding-bottom: 10px;
-            border-bottom: 3px solid #3498db;
-            font-weight: 700;
-        }
-        
-        h3 {
-            font-size: 1.6em;
-            color: #34495e;
-            margin-top: 30px;
-            margin-bottom: 15px;
-            font-weight: 600;
-        }
-        
-        p {
-            margin-bottom: 22px;
-            text-align: justify;
-            text-indent: 2em;
-            color: #455a64;
-            line-height: 2;
-        }
-        
-        .section-image {
-            margin: 40px 0;
-            text-align: center;
-            padding: 20px;
-            background: #f8f9fa;
-            border-radius: 10px;
-        }
-        
-        .blog-img {
-            width: 100%;
-            height: auto;
-            max-height: 400px;
-            border-radius: 8px;
-            box-shadow: 0 5px 20px rgba(0, 0, 0, 0.12);
-            object-fit: cover;
-        }
-        
-        footer {
-            margin-top: 60px;
-            padding-top: 30px;
-            border-top: 2px solid #ecf0f1;
-            text-align: center;
-            color: #7f8c8d;
-            font-size: 0.95em;
-        }
-        
-        @media (max-width: 768px) {
-            .wrapper {
-                padding: 30px 20px;
-            }
-            
-            h1 {
-                font-size: 2.2em;
-            }
-            
-            h2 {
-                font-size: 1.8em;
-            }
-            
-            h3 {
-                font-size: 1.3em;
-            }
-            
-            p {
-                font-size: 1em;
-                text-indent: 1.5em;
-            }
-        }
-        """
-        
-        html_template = f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{topic} - Professional Blog</title>
-    <style>
-{css_styles}
-    </style>
-</head>
-<body>
-    <div class="wrapper">
-        <header>
-            <h1>{topic}</h1>
-            <div class="date">Published on {timestamp}</div>
-        </header>
-        
-        {featured_image}
-        
-        <article class="blog-content">
-            {content_html}
-        </article>
+        blocks, section_images = self.parse_content_with_headings(content, image_urls)
         
-        <footer>
-            <p>Generated using Gemini AI. All rights reserved. {datetime.now().year}</p>
-        </footer>
-    </div>
-</body>
-</html>"""
+        # The styles live in a shared stylesheet saved next to the page (see save_blog)
+        html_template = render_page(
+            topic, blocks, subtitle=f"Published on {timestamp}",
+            featured_image=render_image(image_urls[0], topic, "featured-img"), section_images=section_images,
+            footer=f"Generated using Gemini AI. All rights reserved. {datetime.now().year}", css_href=CSS_NAME
+        )
         
         logger.info("HTML document created successfully")
         return html_template
@@ -308,6 +124,7 @@ Total length: 1500-2000 words. Use clear, professional language with proper spac
         
         try:
             filepath.write_text(html_content, encoding='utf-8')
+            write_stylesheet(filepath.parent)
             logger.info(f"Blog saved to {filepath}")
             return str(filepath)
         except Exception as error:
@@ -1,44 +1,43 @@
-import requests
 import json
+import logging
+import os
 from pathlib import Path
+from fda_client import OpenFDAError
+from config import HOME_DIR
+from fda_store import get_label_store
+from logging_setup import configure_logging
 
+logger = logging.getLogger(__name__)
 
-OUTPUT_DIR = r"C:\BlogAgent\data"
+OUTPUT_DIR = os.path.join(HOME_DIR, "data")
 Path(OUTPUT_DIR).mkdir(parents=True, exist_ok=True)
 
 
 def fetch_drug_data(drug_name):
-    """Fetch drug data from OpenFDA API"""
-    print(f"Fetching data for: {drug_name}")
+    """Fetch drug data through the local OpenFDA label store
     
-    url = f"https://api.fda.gov/drug/label.json?search={drug_name}&limit=1"
+    Returns None when openFDA has no label for the drug. Raises OpenFDAError
+    when it could not be asked (rate limited, timed out, server errors).
+    """
+    logger.info("Fetching drug data", extra={"drug": drug_name})
     
-    try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        
-        if 'results' not in data or len(data['results']) == 0:
-            print(f"No data found for {drug_name}")
-            return None
-        
-        result = data['results'][0]
-        
-        drug_info = {
-            "name": drug_name,
-            "brand_names": result.get('openfda', {}).get('brand_name', ['N/A'])[0],
-            "indications": result.get('indications_and_usage', ['N/A'])[0][:300],
-            "warnings": result.get('warnings', ['N/A'])[0][:200],
-            "dosage": result.get('dosage_and_administration', ['N/A'])[0][:200],
-            "side_effects": result.get('adverse_reactions', ['N/A'])[0][:200]
-        }
-        
-        print(f"Success: {drug_info['brand_names']}")
-        return drug_info
+    result = get_label_store().get(drug_name)
     
-    except Exception as e:
-        print(f"Error: {e}")
+    if not result:
+        logger.info("No label found", extra={"drug": drug_name})
         return None
+    
+    drug_info = {
+        "name": drug_name,
+        "brand_names": result.get('openfda', {}).get('brand_name', ['N/A'])[0],
+        "indications": result.get('indications_and_usage', ['N/A'])[0][:300],
+        "warnings": result.get('warnings', ['N/A'])[0][:200],
+        "dosage": result.get('dosage_and_administration', ['N/A'])[0][:200],
+        "side_effects": result.get('adverse_reactions', ['N/A'])[0][:200]
+    }
+    
+    logger.info("Fetched drug data", extra={"drug": drug_name, "brand": drug_info['brand_names']})
+    return drug_info
 
 
 def save_drug_data(drug_info, filename=None):
@@ -51,15 +50,20 @@ def save_drug_data(drug_info, filename=None):
     with open(filepath, 'w') as f:
         json.dump(drug_info, f, indent=2)
     
-    print(f"Saved: {filepath}\n")
+    logger.info("Saved drug data", extra={"path": str(filepath)})
     return filepath
 
 
 def main():
+    configure_logging()
     drugs = ["aspirin", "ibuprofen", "metformin", "lisinopril", "amoxicillin"]
     
     for drug in drugs:
-        data = fetch_drug_data(drug)
+        try:
+            data = fetch_drug_data(drug)
+        except OpenFDAError as e:
+            logger.error("OpenFDA unavailable", extra={"drug": drug, "error": e.to_dict()})
+            continue
         
         if data:
             save_drug_data(data)
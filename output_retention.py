@@ -0,0 +1,63 @@
+import json
+import logging
+import time
+from pathlib import Path
+
+
+logger = logging.getLogger(__name__)
+
+# Files younger than this are left alone, since they may belong to a generation still being saved
+MIN_AGE_SECONDS = 3600
+
+
+def current_blogs(output_dir):
+    """Blog data of the output/*_blog.json files"""
+    for path in sorted(Path(output_dir).glob("*_blog.json")):
+        try:
+            with open(path, encoding="utf-8") as f:
+                yield json.load(f)
+        except (OSError, ValueError):
+            continue
+
+
+def referenced_files(blogs):
+    """(image filenames, section image filenames, asset digests) the given blog data uses"""
+    images, sections, digests = set(), set(), set()
+    for blog in blogs:
+        if blog.get("image_filename"):
+            images.add(Path(blog["image_filename"]).name)
+        if (blog.get("image_asset") or {}).get("digest"):
+            digests.add(blog["image_asset"]["digest"])
+        for section in blog.get("section_images") or []:
+            sections.add(Path(section["image_filename"]).name)
+            if (section.get("image_asset") or {}).get("digest"):
+                digests.add(section["image_asset"]["digest"])
+    return images, sections, digests
+
+
+def prune_outputs(blogs, output_dir, section_dir, asset_dir, min_age=MIN_AGE_SECONDS):
+    """Delete generated images, section images and asset variants no blog in `blogs` uses
+
+    Only per-generation images (<drug>_blog_<id>.png) are considered in
+    output_dir, so files put there by hand stay. Temporary files left by an
+    interrupted write are removed too. Returns the number of files deleted.
+    """
+    images, sections, digests = referenced_files(blogs)
+    candidates = [(path, path.name in images) for path in Path(output_dir).glob("*_blog_*.png")]
+    candidates += [(path, path.name in sections) for path in Path(section_dir).glob("*.png")]
+    candidates += [(path, path.name.split("-")[0] in digests) for path in Path(asset_dir).glob("*-*.*")]
+    for directory in (output_dir, section_dir, asset_dir):
+        candidates += [(path, False) for path in Path(directory).glob(".*.tmp")]
+
+    cutoff = time.time() - min_age
+    removed = 0
+    for path, used in candidates:
+        if used:
+            continue
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:
+            continue
+    return removed
\ No newline at end of file
@@ -0,0 +1,114 @@
+import copy
+import hashlib
+import os
+from collections import OrderedDict
+
+import torch
+
+from metrics import stage_timer
+
+
+PREFIX_CACHE_MAX_BYTES = int(os.getenv("PHARMAPEDIA_PREFIX_CACHE_MB", 512)) * 1024 * 1024
+
+
+class PrefixCache:
+    """LRU of past key values for prompt prefixes, bounded by memory
+
+    Prefixes are nested: the instruction scaffold shared by every prompt,
+    then the scaffold plus one drug's label facts. A new drug only prefills
+    its facts on top of the cached scaffold, and a repeat request for a drug
+    only prefills the title-specific tail. Entries are copied before use
+    since generate() extends a cache in place.
+
+    Not thread-safe; callers hold the text model lock.
+    """
+
+    def __init__(self, model, tokenizer, max_bytes=PREFIX_CACHE_MAX_BYTES):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_bytes = max_bytes
+
+        config = model.config
+        head_dim = getattr(config, "head_dim", None) or config.hidden_size // config.num_attention_heads
+        kv_heads = getattr(config, "num_key_value_heads", None) or config.num_attention_heads
+        dtype_bytes = torch.finfo(model.dtype).bits // 8
+        self.bytes_per_token = 2 * config.num_hidden_layers * kv_heads * head_dim * dtype_bytes
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.tokens_reused = 0
+
+    def _store(self, key, prefix_ids, cache):
+        size = len(prefix_ids) * self.bytes_per_token
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (prefix_ids, cache)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (evicted_ids, _) = self._entries.popitem(last=False)
+            self._bytes -= len(evicted_ids) * self.bytes_per_token
+
+    def lookup(self, input_ids, prefixes):
+        """(prefix length, private cache copy) for the longest prefix of input_ids, prefilling missing levels"""
+        length, cache = 0, None
+
+        for prefix in prefixes:
+            key = hashlib.sha1(prefix.encode()).hexdigest()
+            entry = self._entries.get(key)
+
+            if entry is None:
+                prefix_ids = self.tokenizer(prefix, return_tensors="pt")["input_ids"][0]
+                # Tokens can merge across the boundary, in which case the prefix is not reusable
+                if len(prefix_ids) >= input_ids.shape[1] or not torch.equal(input_ids[0, :len(prefix_ids)], prefix_ids):
+                    continue
+
+                with torch.no_grad():
+                    output = self.model(
+                        input_ids=prefix_ids[length:].unsqueeze(0),
+                        past_key_values=copy.deepcopy(cache) if cache is not None else None,
+                        use_cache=True
+                    )
+                entry = (prefix_ids, output.past_key_values)
+                self._store(key, *entry)
+                self.misses += 1
+
+            else:
+                prefix_ids = entry[0]
+                if not torch.equal(input_ids[0, :len(prefix_ids)], prefix_ids):
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+
+            length, cache = len(entry[0]), entry[1]
+
+        if cache is None:
+            return 0, None
+
+        self.tokens_reused += length
+        return length, copy.deepcopy(cache)
+
+    def generate(self, prompt, prefixes, **generate_kwargs):
+        """Generate from prompt reusing cached prefixes; returns prompt plus generated text like the pipeline"""
+        with stage_timer("tokenization"):
+            inputs = self.tokenizer(prompt, return_tensors="pt")
+        with stage_timer("prefix_lookup"):
+            _, cache = self.lookup(inputs["input_ids"], prefixes)
+        if cache is not None:
+            generate_kwargs["past_key_values"] = cache
+
+        with torch.no_grad():
+            output = self.model.generate(**inputs, pad_token_id=self.tokenizer.pad_token_id, **generate_kwargs)
+
+        new_tokens = output[0, inputs["input_ids"].shape[1]:]
+        return prompt + self.tokenizer.decode(new_tokens, skip_special_tokens=True)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "tokens_reused": self.tokens_reused
+        }
\ No newline at end of file
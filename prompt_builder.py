@@ -0,0 +1,197 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+from transformers import AutoTokenizer
+
+
+CONTEXT_WINDOW = 2048
+# Joining sentences can add a token per boundary that per-sentence counts miss
+SAFETY_MARGIN_TOKENS = 32
+MIN_SECTION_TOKENS = 24
+# Fields (drug name, title) come from the request; longer ones are cut so they can't crowd out the label
+MAX_FIELD_TOKENS = 64
+FRAGMENT_CACHE_SIZE = 1024
+
+# Base share of the token budget per prompt section
+SECTION_WEIGHTS = {"indications": 3.0, "dosage": 2.0, "side_effects": 2.0, "warnings": 2.0, "excerpts": 3.0}
+
+# A section whose keywords appear in the title gets TITLE_BOOST times its base share
+TITLE_KEYWORDS = {
+    "indications": ["use", "benefit", "help", "treat", "what is"],
+    "dosage": ["dose", "dosage", "administration", "take", "taking"],
+    "side_effects": ["side effect", "adverse", "reaction"],
+    "warnings": ["safe", "safety", "warning", "risk", "pregnan", "interaction"],
+}
+TITLE_BOOST = 2.0
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_sentences(text):
+    return [s for s in SENTENCE_END.split(" ".join(text.split())) if s]
+
+
+def clip_sentences(text, max_chars):
+    """Whole leading sentences of text up to max_chars, for short previews"""
+    clipped = ""
+    for sentence in split_sentences(text):
+        candidate = f"{clipped} {sentence}".strip()
+        if len(candidate) > max_chars:
+            break
+        clipped = candidate
+    return clipped or text[:max_chars].rsplit(" ", 1)[0]
+
+
+def section_weights(title):
+    title_lower = title.lower()
+    weights = dict(SECTION_WEIGHTS)
+    for section, keywords in TITLE_KEYWORDS.items():
+        if any(keyword in title_lower for keyword in keywords):
+            weights[section] *= TITLE_BOOST
+    return weights
+
+
+def allocate(budget, demands, weights):
+    """Split budget across sections by weight, handing what short sections don't need to the rest"""
+    allocation = {section: 0 for section in demands}
+    active = {section for section, demand in demands.items() if demand > 0}
+    remaining = budget
+
+    while active and remaining > 0:
+        total_weight = sum(weights[section] for section in active)
+        shares = {section: remaining * weights[section] / total_weight for section in active}
+        satisfied = {section for section in active if demands[section] <= shares[section]}
+
+        if not satisfied:
+            for section in active:
+                allocation[section] = int(shares[section])
+            break
+
+        for section in satisfied:
+            allocation[section] = demands[section]
+            remaining -= demands[section]
+        active -= satisfied
+
+    return allocation
+
+
+class PromptBuilder:
+    """Fills the text prompt template within TinyLlama's context window
+
+    The budget is the context window minus max_new_tokens and the template
+    scaffold. It is shared between the label sections by relevance to the
+    title, and each section is cut at a sentence boundary. Sentences are
+    tokenized once and cached, so regenerating a blog for the same drug
+    does not re-tokenize its label.
+    """
+
+    def __init__(self, template, tokenizer_dir, max_new_tokens, context_window=CONTEXT_WINDOW,
+                 cache_size=FRAGMENT_CACHE_SIZE):
+        self.template = template
+        self.tokenizer_dir = tokenizer_dir
+        self.max_new_tokens = max_new_tokens
+        self.context_window = context_window
+        self.cache_size = cache_size
+        self._tokenizer = None
+        self._fragments = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            self._tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_dir)
+            if 0 < self._tokenizer.model_max_length < self.context_window:
+                self.context_window = self._tokenizer.model_max_length
+        return self._tokenizer
+
+    def count(self, text):
+        with self._lock:
+            return len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def sentences(self, text):
+        """[(sentence, token_ids)] for text, from the fragment cache when possible"""
+        key = hashlib.sha1(text.encode()).digest()
+        with self._lock:
+            cached = self._fragments.get(key)
+            if cached is not None:
+                self._fragments.move_to_end(key)
+                self.hits += 1
+                return cached
+
+            self.misses += 1
+            sentences = split_sentences(text)
+            ids = self.tokenizer(sentences, add_special_tokens=False)["input_ids"] if sentences else []
+            fragments = list(zip(sentences, ids))
+
+            self._fragments[key] = fragments
+            while len(self._fragments) > self.cache_size:
+                self._fragments.popitem(last=False)
+            return fragments
+
+    def fit(self, text, budget):
+        """Leading whole sentences of text within budget tokens, or a word-aligned cut of the first one"""
+        kept = []
+        used = 0
+        fragments = self.sentences(text)
+        for sentence, ids in fragments:
+            if used + len(ids) > budget:
+                break
+            kept.append(sentence)
+            used += len(ids)
+
+        if not kept and fragments and budget >= MIN_SECTION_TOKENS:
+            with self._lock:
+                partial = self.tokenizer.decode(fragments[0][1][:budget - 1])
+            return partial.rsplit(" ", 1)[0] + "...", budget
+
+        return " ".join(kept), used
+
+    def fit_excerpts(self, excerpts, budget):
+        """(heading, text) excerpts in rank order, each cut to whatever budget is left"""
+        lines = []
+        for heading, text in excerpts:
+            prefix = f"- {heading}: "
+            remaining = budget - self.count(prefix)
+            if remaining < MIN_SECTION_TOKENS:
+                break
+            fitted, used = self.fit(text, remaining)
+            if fitted:
+                lines.append(prefix + fitted)
+                budget = remaining - used
+        return "\n".join(lines)
+
+    def clip_field(self, text):
+        """text cut to MAX_FIELD_TOKENS tokens at a word boundary"""
+        with self._lock:
+            # No token is longer than ~16 characters, so the rest never needs tokenizing
+            ids = self.tokenizer(text[:MAX_FIELD_TOKENS * 16], add_special_tokens=False)["input_ids"]
+            if len(ids) <= MAX_FIELD_TOKENS and len(text) <= MAX_FIELD_TOKENS * 16:
+                return text
+            return self.tokenizer.decode(ids[:MAX_FIELD_TOKENS]).rsplit(" ", 1)[0] + "..."
+
+    def budget(self, fields):
+        """Tokens left for the label sections once the scaffold and the generation are accounted for"""
+        scaffold = self.template.format(**fields, indications="", dosage="", side_effects="", warnings="", excerpts="")
+        return self.context_window - self.max_new_tokens - self.count(scaffold) - SAFETY_MARGIN_TOKENS
+
+    def build(self, fields, sections, excerpts=()):
+        """Format the template
+
+        fields: short values (name, title), cut to MAX_FIELD_TOKENS each;
+        sections: label text for indications, dosage, side_effects and
+        warnings; excerpts: ranked (heading, text) retrieval results.
+        """
+        fields = {key: self.clip_field(value) for key, value in fields.items()}
+        demands = {section: sum(len(ids) for _, ids in self.sentences(text)) for section, text in sections.items()}
+        demands["excerpts"] = sum(
+            self.count(f"- {heading}: ") + sum(len(ids) for _, ids in self.sentences(text)) for heading, text in excerpts
+        )
+        allocation = allocate(max(self.budget(fields), 0), demands, section_weights(fields["title"]))
+
+        values = {section: self.fit(text, allocation[section])[0] or "N/A" for section, text in sections.items()}
+        values["excerpts"] = self.fit_excerpts(excerpts, allocation["excerpts"]) or "N/A"
+        return self.template.format(**fields, **values)
\ No newline at end of file
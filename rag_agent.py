@@ -1,100 +1,458 @@
-import json
+import logging
 from pathlib import Path
-from transformers import pipeline
+from transformers import set_seed, StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
 from diffusers import StableDiffusionPipeline
 import torch
-import requests
+import sqlite3
+import threading
+import argparse
+import itertools
+import os
+import queue
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from result_cache import ResultCache
+from config import HOME_DIR
+from fda_store import get_label_store
+from fda_client import OpenFDAError
+from label_retrieval import LABEL_SECTIONS, TOP_K as RETRIEVAL_TOP_K, get_label_index
+from prompt_builder import PromptBuilder, clip_sentences
+from prefix_cache import PREFIX_CACHE_MAX_BYTES, PrefixCache
+from section_images import SectionImageScheduler
+from asset_pipeline import AssetPipeline
+from artifact_writer import ArtifactWriter, copy_file, unique_filename, write_json
+from blog_archive import get_blog_archive
+from output_retention import current_blogs, prune_outputs
+from logging_setup import configure_logging
+from metrics import BLOGS, STAGE_SECONDS, StepTimer, live_stats, record_images, record_text_generation, stage_timer
+from text_backends import TEXT_BACKEND, load_text_pipeline, resolve_backend
+from image_profiles import (
+    DEFAULT_IMAGE_PROFILE, IMAGE_PROFILES, build_profile_pipeline, load_lcm_lora, optimize_for_cpu, profile_settings, upscale
+)
 
-OUTPUT_DIR = r"C:\BlogAgent\output"
-MODELS_DIR = r"C:\BlogAgent\models"
+logger = logging.getLogger(__name__)
+
+OUTPUT_DIR = os.path.join(HOME_DIR, "output")
+MODELS_DIR = os.path.join(HOME_DIR, "models")
+LCM_LORA_DIR = os.path.join(MODELS_DIR, "lcm_lora")
+
+TEXT_MODEL_ID = "TinyLlama/TinyLlama-1.1B-Chat-v1.0"
+IMAGE_MODEL_ID = "runwayml/stable-diffusion-v1-5"
+# Default seed, so repeated requests reproduce (and can be served from) the same result;
+# force_refresh draws a fresh one unless the request names a seed
+GENERATION_SEED = 42
+
+TEXT_GENERATION_PARAMS = {"max_new_tokens": 300, "truncation": True, "do_sample": True, "temperature": 0.7}
+
+TEXT_BATCH_SIZE = 4
+IMAGE_BATCH_SIZE = 2
+
+# Torch intra-op thread budget per stage; text and image run at the same time,
+# so by default diffusion (the longer stage) gets two thirds of the cores
+CPU_COUNT = os.cpu_count() or 1
+IMAGE_THREADS = int(os.getenv("PHARMAPEDIA_IMAGE_THREADS", max(1, CPU_COUNT * 2 // 3)))
+TEXT_THREADS = int(os.getenv("PHARMAPEDIA_TEXT_THREADS", max(1, CPU_COUNT - IMAGE_THREADS)))
+FDA_WORKERS = 4
+
+# How often a streaming generation checks on the other stage while waiting for tokens
+STREAM_POLL_SECONDS = 0.5
+KEEP_ALIVE_SECONDS = 15
+
+# How often saving a blog also sweeps output/ for images nothing refers to any more
+PRUNE_INTERVAL_SECONDS = 600
+
+# Ordered from most to least shared so the text backend can reuse the prefill of
+# the instructions (every prompt) and of the label facts (every prompt for a drug)
+TEXT_PROMPT_TEMPLATE = """Write a professional pharmaceutical blog. Write an engaging blog with:
+- Introduction
+- What is it
+- Benefits and uses
+- Dosage
+- Side effects
+- Warnings
+- Conclusion
+
+Drug: {name}
+Uses: {indications}
+Dosage: {dosage}
+Side Effects: {side_effects}
+Warnings: {warnings}
+
+Relevant label excerpts:
+{excerpts}
+
+Title: {title}
+
+Blog:"""
+# Prefixes end at a newline so their tokens never merge with the text that follows
+PROMPT_SCAFFOLD = TEXT_PROMPT_TEMPLATE.split("{", 1)[0].rsplit("\n", 1)[0] + "\n"
+DRUG_PREFIX_END = "Relevant label excerpts:\n"
+
+# generate() takes the pipeline's generation params minus the tokenizer-only ones
+MODEL_GENERATION_PARAMS = {k: v for k, v in TEXT_GENERATION_PARAMS.items() if k != "truncation"}
 
 Path(OUTPUT_DIR).mkdir(parents=True, exist_ok=True)
 
 
 class OpenFDAManager:
     @staticmethod
-    def fetch_detailed_drug_data(drug_name):
-        """Fetch comprehensive drug data from OpenFDA API"""
-        print(f"Fetching detailed data for {drug_name} from OpenFDA...\n")
+    def fetch_label(drug_name):
+        """Fetch the full OpenFDA label record from the local label store; openFDA outages raise OpenFDAError"""
+        logger.info("Fetching OpenFDA label", extra={"drug": drug_name})
         
         try:
-            url = f"https://api.fda.gov/drug/label.json?search={drug_name}&limit=1"
-            response = requests.get(url, timeout=10)
-            data = response.json()
-            
-            if 'results' not in data or len(data['results']) == 0:
-                return None
-            
-            result = data['results'][0]
-            
-            drug_info = {
-                "name": drug_name,
-                "brand_names": result.get('openfda', {}).get('brand_name', ['N/A'])[0],
-                "manufacturer": result.get('openfda', {}).get('manufacturer_name', ['N/A'])[0],
-                "indications": result.get('indications_and_usage', ['N/A'])[0][:400],
-                "dosage": result.get('dosage_and_administration', ['N/A'])[0][:400],
-                "side_effects": result.get('adverse_reactions', ['N/A'])[0][:400],
-                "warnings": result.get('warnings', ['N/A'])[0][:400],
-                "contraindications": result.get('contraindications', ['N/A'])[0][:200],
-                "mechanism": result.get('mechanism_of_action', ['N/A'])[0][:200] if 'mechanism_of_action' in result else "N/A"
-            }
-            
-            return drug_info
+            with stage_timer("fda_lookup"):
+                return get_label_store().get(drug_name)
+        
+        except OpenFDAError:
+            raise
         
         except Exception as e:
-            print(f"API Error: {e}\n")
+            logger.error("Label lookup failed", extra={"drug": drug_name, "error": str(e)})
             return None
+    
+    @staticmethod
+    def summarize_label(drug_name, result):
+        """Condense a label record into the fields used by the prompt and the saved blog"""
+        return {
+            "name": drug_name,
+            "brand_names": result.get('openfda', {}).get('brand_name', ['N/A'])[0],
+            "manufacturer": result.get('openfda', {}).get('manufacturer_name', ['N/A'])[0],
+            "indications": result.get('indications_and_usage', ['N/A'])[0],
+            "dosage": result.get('dosage_and_administration', ['N/A'])[0],
+            "side_effects": result.get('adverse_reactions', ['N/A'])[0],
+            "warnings": result.get('warnings', result.get('warnings_and_cautions', ['N/A']))[0],
+            "contraindications": result.get('contraindications', ['N/A'])[0],
+            "mechanism": result.get('mechanism_of_action', ['N/A'])[0],
+            "drug_class": result.get('openfda', {}).get('pharm_class_epc', ['N/A'])[0]
+        }
+    
+    @classmethod
+    def fetch_detailed_drug_data(cls, drug_name):
+        """Fetch comprehensive drug data from the local OpenFDA label store"""
+        result = cls.fetch_label(drug_name)
+        return cls.summarize_label(drug_name, result) if result else None
+
+
+class StopOnEvent(StoppingCriteria):
+    """Ends generation early once the event is set, e.g. when a streaming client disconnects"""
+    
+    def __init__(self, event):
+        self.event = event
+    
+    def __call__(self, input_ids, scores, **kwargs):
+        return self.event.is_set()
 
 
 class ModelManager:
-    def __init__(self):
-        print("Loading TinyLlama...\n")
-        self.text_pipe = pipeline("text-generation", model=f"{MODELS_DIR}\\tinyllama", device=-1)
+    """Owns the text and image pipelines, loaded on first use or by an explicit load()
+    
+    `stages` limits which of the two models load() loads, for processes that
+    only serve one of them (see inference_workers.py).
+    """
+    
+    def __init__(self, seed=GENERATION_SEED, text_backend=TEXT_BACKEND, stages=("text", "image")):
+        self.seed = seed
+        # Resolved up front so settings() reports the dtype actually loaded, e.g. fp32 when bf16 isn't native
+        self.text_backend = resolve_backend(text_backend)
+        self.stages = stages
+        self.text_pipe = None
+        self.image_pipe = None
+        self.image_pipes = {}
+        self.prefix_cache = None
+        self.state = "not_loaded"
+        self.load_error = None
+        self.warmed_up = False
+        self._load_lock = threading.Lock()
+        
+        # Decided up front since it changes the draft profile's output, and so its cache key
+        self.lcm_available = Path(LCM_LORA_DIR).exists()
         
-        print("Loading Stable Diffusion...\n")
-        self.image_pipe = StableDiffusionPipeline.from_pretrained(f"{MODELS_DIR}\\stable_diffusion")
-        self.image_pipe.enable_attention_slicing()
-        self.image_pipe = self.image_pipe.to("cpu")
+        # The pipelines are not safe to call from several threads at once
+        self.text_lock = threading.Lock()
+        self.image_lock = threading.Lock()
     
-    def generate_text(self, prompt):
-        result = self.text_pipe(prompt, max_new_tokens=300, truncation=True, do_sample=True, temperature=0.7)
-        return result[0]["generated_text"]
+    @property
+    def ready(self):
+        return self.state == "ready"
     
-    def generate_image(self, prompt):
-        with torch.no_grad():
-            image = self.image_pipe(prompt, height=512, width=512, num_inference_steps=35, guidance_scale=7.5).images[0]
-        return image
+    def load(self):
+        """Load the models once; concurrent callers wait for the first load"""
+        if self.ready:
+            return
+        
+        with self._load_lock:
+            if self.ready:
+                return
+            
+            self.state = "loading"
+            started = time.time()
+            
+            text_pipe = prefix_cache = image_pipe = None
+            try:
+                if "text" in self.stages:
+                    logger.info("Loading TinyLlama", extra={"backend": self.text_backend})
+                    text_pipe = load_text_pipeline(self.text_backend, os.path.join(MODELS_DIR, "tinyllama"))
+                
+                    # Batched generation with a decoder-only model needs left padding
+                    tokenizer = text_pipe.tokenizer
+                    if tokenizer.pad_token is None:
+                        tokenizer.pad_token = tokenizer.eos_token
+                    tokenizer.padding_side = "left"
+                
+                    # ONNX Runtime models take their own past key value format
+                    if self.text_backend != "onnx" and PREFIX_CACHE_MAX_BYTES > 0:
+                        prefix_cache = PrefixCache(text_pipe.model, tokenizer)
+                
+                if "image" in self.stages:
+                    logger.info("Loading Stable Diffusion")
+                    image_pipe = StableDiffusionPipeline.from_pretrained(
+                        os.path.join(MODELS_DIR, "stable_diffusion"), low_cpu_mem_usage=True
+                    )
+                    image_pipe.enable_attention_slicing()
+                    image_pipe = image_pipe.to("cpu")
+                
+                    if self.lcm_available and not load_lcm_lora(image_pipe, LCM_LORA_DIR):
+                        self.lcm_available = False
+                    image_pipe = optimize_for_cpu(image_pipe)
+            
+            except Exception as e:
+                self.state = "failed"
+                self.load_error = str(e)
+                raise
+            
+            self.text_pipe = text_pipe
+            self.prefix_cache = prefix_cache
+            self.image_pipe = image_pipe
+            self.image_pipes = {}
+            self.state = "ready"
+            logger.info("Models loaded", extra={"seconds": round(time.time() - started, 1)})
+    
+    def warm_up_text(self):
+        """Tiny inference so the first real request doesn't pay for lazy kernel setup"""
+        self.load()
+        with self.text_lock:
+            self.text_pipe("Warm up", max_new_tokens=1)
+    
+    def warm_up_image(self):
+        self.load()
+        with self.image_lock, torch.no_grad():
+            self.image_pipe("warm up", height=256, width=256, num_inference_steps=1)
+    
+    def settings(self, image_profile=DEFAULT_IMAGE_PROFILE, seed=None):
+        """Everything about the models that affects generated output"""
+        scheduler, image_params = profile_settings(image_profile, self.lcm_available)
+        return {
+            "text_model": TEXT_MODEL_ID,
+            "text_backend": self.text_backend,
+            "image_model": IMAGE_MODEL_ID,
+            "text_params": TEXT_GENERATION_PARAMS,
+            "image_profile": image_profile,
+            "image_scheduler": scheduler,
+            "image_params": image_params,
+            "seed": self.seed if seed is None else seed
+        }
+    
+    def generate_text(self, prompt, prefixes=(), seed=None):
+        """Generate text for one prompt, reusing the cached prefill of any of its prefixes"""
+        if not prefixes:
+            return self.generate_text_batch([prompt], seed=seed)[0]
+        
+        self.load()
+        if self.prefix_cache is None:
+            return self.generate_text_batch([prompt], seed=seed)[0]
+        
+        with self.text_lock:
+            set_seed(self.seed if seed is None else seed)
+            with stage_timer("text_generation", prefix_cache=True) as timing:
+                text = self.prefix_cache.generate(prompt, prefixes, **MODEL_GENERATION_PARAMS)
+        record_text_generation(self.count_new_tokens(prompt, text), timing.seconds)
+        return text
+    
+    def generate_text_batch(self, prompts, batch_size=TEXT_BATCH_SIZE, seed=None):
+        """Generate text for several prompts, batch_size prompts per forward pass"""
+        self.load()
+        with self.text_lock:
+            set_seed(self.seed if seed is None else seed)
+            with stage_timer("text_generation", prompts=len(prompts)) as timing:
+                results = self.text_pipe(prompts, batch_size=batch_size, **TEXT_GENERATION_PARAMS)
+        texts = [result[0]["generated_text"] for result in results]
+        record_text_generation(sum(self.count_new_tokens(p, t) for p, t in zip(prompts, texts)), timing.seconds)
+        return texts
+    
+    def count_new_tokens(self, prompt, text):
+        """Tokens the model added to prompt, for throughput metrics"""
+        return len(self.text_pipe.tokenizer(text[len(prompt):], add_special_tokens=False)["input_ids"])
+    
+    def profile_pipeline(self, image_profile):
+        """(pipeline, scheduler name, params) for an image profile; call with image_lock held"""
+        scheduler, params = profile_settings(image_profile, self.lcm_available)
+        if scheduler not in self.image_pipes:
+            self.image_pipes[scheduler] = build_profile_pipeline(self.image_pipe, scheduler)
+        return self.image_pipes[scheduler], scheduler, params
+    
+    def text_streamer(self, timeout=None):
+        """Streamer yielding decoded text as generate_text_streaming produces it"""
+        self.load()
+        return TextIteratorStreamer(self.text_pipe.tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=timeout)
+    
+    def generate_text_streaming(self, prompt, streamer, stop_event=None, prefixes=(), seed=None):
+        """Same output as generate_text, but every new token is also pushed to `streamer`"""
+        self.load()
+        extra = {}
+        if stop_event is not None:
+            extra["stopping_criteria"] = StoppingCriteriaList([StopOnEvent(stop_event)])
+        
+        with self.text_lock:
+            set_seed(self.seed if seed is None else seed)
+            with stage_timer("text_generation", streaming=True) as timing:
+                if prefixes and self.prefix_cache is not None:
+                    text = self.prefix_cache.generate(prompt, prefixes, streamer=streamer, **MODEL_GENERATION_PARAMS, **extra)
+                else:
+                    text = self.text_pipe(prompt, streamer=streamer, **TEXT_GENERATION_PARAMS, **extra)[0]["generated_text"]
+        record_text_generation(self.count_new_tokens(prompt, text), timing.seconds)
+        return text
+    
+    def generate_image(self, prompt, image_profile=DEFAULT_IMAGE_PROFILE, seed=None):
+        return self.generate_images_batch([prompt], image_profile=image_profile, seed=seed)[0]
+    
+    def generate_images_batch(self, prompts, batch_size=IMAGE_BATCH_SIZE, image_profile=DEFAULT_IMAGE_PROFILE, seed=None):
+        """Generate one image per prompt, denoising batch_size prompts together"""
+        self.load()
+        seed = self.seed if seed is None else seed
+        images = []
+        with self.image_lock:
+            pipe, scheduler, params = self.profile_pipeline(image_profile)
+            
+            # The LoRA weights live in the shared UNet, so only enable them for LCM runs
+            if scheduler == "lcm":
+                pipe.enable_lora()
+            try:
+                with stage_timer("image_generation", profile=image_profile, images=len(prompts)) as timing:
+                    for start in range(0, len(prompts), batch_size):
+                        chunk = prompts[start:start + batch_size]
+                        generators = [torch.Generator("cpu").manual_seed(seed) for _ in chunk]
+                        with torch.no_grad():
+                            images.extend(pipe(
+                                chunk, generator=generators, callback_on_step_end=StepTimer(image_profile), **params
+                            ).images)
+            finally:
+                if scheduler == "lcm":
+                    pipe.disable_lora()
+        record_images(image_profile, len(images), timing.seconds)
+        return [upscale(image) for image in images]
 
 
-class BlogGenerator:
-    def __init__(self):
-        self.fda_manager = OpenFDAManager()
-        self.model_manager = ModelManager()
+_model_manager = None
+_model_manager_lock = threading.Lock()
+
+
+def get_model_manager():
+    """Process-wide ModelManager, so forked workers can share weights loaded by their parent"""
+    global _model_manager
     
-    def create_detailed_text_prompt(self, drug_info, title):
-        """Create intelligent prompt using detailed FDA data"""
-        prompt = f"""Write professional pharmaceutical blog about {drug_info['name']}.
+    with _model_manager_lock:
+        if _model_manager is None:
+            _model_manager = ModelManager()
+        return _model_manager
 
-Title: {title}
 
-Uses: {drug_info['indications'][:200]}
-Dosage: {drug_info['dosage'][:150]}
-Side Effects: {drug_info['side_effects'][:150]}
-Warnings: {drug_info['warnings'][:100]}
+def set_stage_threads(num_threads):
+    """Executor initializer giving a stage thread its own torch thread budget
+    
+    With the OpenMP backend the thread count is a per-thread setting, so the
+    text and image executors each keep their own share of the cores.
+    """
+    torch.set_num_threads(num_threads)
 
-Write engaging blog with:
-- Introduction
-- What is it
-- Benefits and uses
-- Dosage
-- Side effects
-- Warnings
-- Conclusion
 
-Blog:"""
+class BlogGenerator:
+    def __init__(self, model_manager=None, text_threads=TEXT_THREADS, image_threads=IMAGE_THREADS):
+        self.fda_manager = OpenFDAManager()
+        self.label_index = None
+        self.prompt_builder = PromptBuilder(
+            TEXT_PROMPT_TEMPLATE, os.path.join(MODELS_DIR, "tinyllama"), TEXT_GENERATION_PARAMS["max_new_tokens"]
+        )
+        self.model_manager = model_manager or get_model_manager()
+        self.result_cache = ResultCache()
+        self.section_images = SectionImageScheduler(self.model_manager)
+        self.assets = AssetPipeline()
+        self.artifacts = ArtifactWriter()
+        self.archive = get_blog_archive()
+        self._last_prune = 0
+        
+        live_stats.register_cache("result", self.result_cache.stats)
+        live_stats.register_cache(
+            "prefix", lambda: self.model_manager.prefix_cache and self.model_manager.prefix_cache.stats()
+        )
+        live_stats.register_cache(
+            "prompt_fragments", lambda: {"hits": self.prompt_builder.hits, "misses": self.prompt_builder.misses}
+        )
+        live_stats.register_cache(
+            "section_images", lambda: {"hits": self.section_images.hits, "misses": self.section_images.misses}
+        )
+        
+        # One executor per stage so FDA lookups, text and image generation overlap
+        self.fda_executor = ThreadPoolExecutor(max_workers=FDA_WORKERS, thread_name_prefix="stage-fda")
+        self.text_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="stage-text",
+            initializer=set_stage_threads, initargs=(text_threads,)
+        )
+        self.image_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="stage-image",
+            initializer=set_stage_threads, initargs=(image_threads,)
+        )
+    
+    def retrieve_excerpts(self, drug_name, label, title):
+        """Label chunks most relevant to the blog title, from the whole label rather than its first lines"""
+        try:
+            if self.label_index is None:
+                self.label_index = get_label_index()
+            with stage_timer("retrieval"):
+                return self.label_index.retrieve(label, drug_name, f"{title} {drug_name}", RETRIEVAL_TOP_K)
+        
+        except Exception as e:
+            logger.warning(
+                "Label retrieval failed, continuing without excerpts", extra={"drug": drug_name, "error": str(e)}
+            )
+            return []
+    
+    def create_detailed_text_prompt(self, drug_info, title, excerpts=()):
+        """Create intelligent prompt using detailed FDA data, sized to the model's context window"""
+        with stage_timer("prompt_build"):
+            prompt = self.prompt_builder.build(
+                fields={"name": drug_info['name'], "title": title},
+                sections={
+                    "indications": drug_info['indications'],
+                    "dosage": drug_info['dosage'],
+                    "side_effects": drug_info['side_effects'],
+                    "warnings": drug_info['warnings']
+                },
+                excerpts=[(LABEL_SECTIONS[chunk.section], chunk.text) for chunk in excerpts]
+            )
         
         return prompt
     
+    @staticmethod
+    def prompt_prefixes(text_prompt):
+        """Nested prefixes of a text prompt worth caching: the shared scaffold, then everything drug-specific"""
+        end = text_prompt.find(DRUG_PREFIX_END)
+        if end == -1:
+            return [PROMPT_SCAFFOLD]
+        return [PROMPT_SCAFFOLD, text_prompt[:end + len(DRUG_PREFIX_END)]]
+    
+    def cache_key(self, drug_name, title, drug_info, text_prompt, image_profile=DEFAULT_IMAGE_PROFILE,
+                  section_images=False, seed=None):
+        return self.result_cache.make_key(
+            drug=drug_name.strip().lower(),
+            title=title,
+            fda=drug_info,
+            prompt=text_prompt,
+            models=self.model_manager.settings(image_profile, seed),
+            section_images=section_images
+        )
+    
     def create_intelligent_image_prompt(self, drug_info, title):
         """Create image prompt based on drug characteristics"""
         drug_name = drug_info['name']
@@ -115,75 +473,421 @@ Blog:"""
         else:
             return f"{base} medication pharmaceutical clinical professional medical"
     
-    def generate(self, drug_name, custom_title=None):
-        print("="*80)
-        print("STARTING BLOG GENERATION")
-        print("="*80 + "\n")
-        
-        drug_info = self.fda_manager.fetch_detailed_drug_data(drug_name)
+    def pick_seed(self, seed=None, force_refresh=False):
+        """The requested seed, else a fresh one when regenerating, else the fixed default"""
+        if seed is not None:
+            return seed
+        if force_refresh:
+            return random.randrange(2**32)
+        return self.model_manager.seed
+    
+    def prepare(self, drug_name, custom_title=None, image_profile=DEFAULT_IMAGE_PROFILE, section_images=False,
+                seed=None):
+        """Fetch FDA data and build everything needed to generate one blog"""
+        label = self.fda_manager.fetch_label(drug_name)
         
-        if not drug_info:
-            return {"status": "error", "message": f"Drug '{drug_name}' not found in FDA database"}
+        if not label:
+            return None
         
+        seed = self.pick_seed(seed)
+        drug_info = self.fda_manager.summarize_label(drug_name, label)
         title = custom_title if custom_title else f"Complete Medical Guide to {drug_name}"
+        excerpts = self.retrieve_excerpts(drug_name, label, title)
+        text_prompt = self.create_detailed_text_prompt(drug_info, title, excerpts)
+        drug_lower = drug_name.lower()
+        # The JSON is replaced in place, but each generation gets its own image, which archived versions keep
+        image_filename = unique_filename(f"{drug_lower}_blog", ".png")
         
-        print(f"Drug: {drug_info['name']}")
-        print(f"Brand: {drug_info['brand_names']}")
-        print(f"Title: {title}\n")
-        
-        print("-"*80)
-        print("GENERATING BLOG CONTENT...")
-        print("-"*80 + "\n")
-        
-        text_prompt = self.create_detailed_text_prompt(drug_info, title)
-        blog_text = self.model_manager.generate_text(text_prompt)
-        blog_content = blog_text.split("Blog:")[-1].strip() if "Blog:" in blog_text else blog_text.strip()
-        
-        print("✓ Blog content generated\n")
-        
-        print("-"*80)
-        print("GENERATING FEATURED IMAGE...")
-        print("-"*80 + "\n")
-        
-        image_prompt = self.create_intelligent_image_prompt(drug_info, title)
-        print(f"Image Prompt: {image_prompt}\n")
-        image = self.model_manager.generate_image(image_prompt)
-        
-        print("✓ Image generated\n")
+        return {
+            "drug_name": drug_name,
+            "drug_info": drug_info,
+            "title": title,
+            "image_filename": image_filename,
+            "image_path": Path(OUTPUT_DIR) / image_filename,
+            "json_path": Path(OUTPUT_DIR) / f"{drug_lower}_blog.json",
+            "image_profile": image_profile,
+            "section_images": section_images,
+            "seed": seed,
+            "cache_key": self.cache_key(drug_name, title, drug_info, text_prompt, image_profile, section_images, seed),
+            "text_prompt": text_prompt,
+            "text_prefixes": self.prompt_prefixes(text_prompt),
+            "image_prompt": self.create_intelligent_image_prompt(drug_info, title)
+        }
+    
+    def try_prepare(self, drug_name, custom_title=None, image_profile=DEFAULT_IMAGE_PROFILE, section_images=False,
+                    seed=None):
+        """(plan, None), or (None, error result) when the drug is unknown or openFDA is unavailable"""
+        try:
+            plan = self.prepare(drug_name, custom_title, image_profile, section_images, seed)
+        except OpenFDAError as e:
+            logger.error("OpenFDA unavailable", extra={"drug": drug_name, "error": e.to_dict()})
+            BLOGS.labels("openfda_error").inc()
+            return None, {"status": "error", "message": f"OpenFDA unavailable: {e}", "error": e.to_dict()}
         
-        print("-"*80)
-        print("SAVING FILES...")
-        print("-"*80 + "\n")
+        if not plan:
+            BLOGS.labels("not_found").inc()
+            return None, {"status": "error", "message": f"Drug '{drug_name}' not found in FDA database"}
+        return plan, None
+    
+    def restore_cached(self, plan, cached):
+        """Write a cached blog back to the output directory, reusing its image if that is still there"""
+        blog_data, cached_image = cached
+        image_path = Path(OUTPUT_DIR) / blog_data["image_filename"]
+        if not image_path.exists():
+            image_path = copy_file(cached_image, plan["image_path"])
+            blog_data["image_filename"] = plan["image_filename"]
+        blog_data["image_path"] = str(image_path)
+        with stage_timer("json_write"):
+            write_json(plan["json_path"], blog_data)
+        BLOGS.labels("cached").inc()
+        return blog_data
+    
+    @staticmethod
+    def blog_content(blog_text):
+        """The generated blog without the echoed prompt"""
+        return blog_text.split("Blog:")[-1].strip() if "Blog:" in blog_text else blog_text.strip()
+    
+    def generate_section_images(self, plan, blog_text):
+        sections = self.section_images.generate(
+            self.blog_content(blog_text), plan["drug_info"], plan["image_profile"], plan["seed"]
+        )
+        for section in sections:
+            image_path = self.section_images.image_dir / Path(section["image_filename"]).name
+            section["image_asset"] = self.assets.submit(image_path)
+        return sections
+    
+    def save(self, plan, blog_text, image_write=None, section_images=None):
+        """Save the blog JSON once the image is written, and add them to the result cache
         
-        drug_lower = drug_name.lower()
+        image_write is the ArtifactWriter future of the image, if it was not
+        already waited on.
+        """
+        drug_info = plan["drug_info"]
+        blog_content = self.blog_content(blog_text)
         
-        image_filename = f"{drug_lower}_blog.png"
-        image_path = Path(OUTPUT_DIR) / image_filename
-        image.save(image_path)
+        if image_write is not None:
+            with stage_timer("png_wait"):
+                image_write.result()
         
-        json_filename = f"{drug_lower}_blog.json"
-        json_path = Path(OUTPUT_DIR) / json_filename
+        # WebP/AVIF variants are encoded in the background; the digest is known right away
+        image_asset = self.assets.submit(plan["image_path"])
         
         blog_data = {
             "drug_name": drug_info['name'],
             "brand_names": drug_info['brand_names'],
             "manufacturer": drug_info['manufacturer'],
-            "title": title,
+            "title": plan["title"],
             "blog_content": blog_content,
-            "image_filename": image_filename,
-            "image_path": str(image_path),
+            "image_filename": plan["image_filename"],
+            "image_path": str(plan["image_path"]),
+            "image_asset": image_asset,
+            "section_images": section_images or [],
+            "seed": plan["seed"],
             "fda_data": {
-                "indications": drug_info['indications'][:200],
-                "dosage": drug_info['dosage'][:200],
-                "warnings": drug_info['warnings'][:200]
+                "indications": clip_sentences(drug_info['indications'], 200),
+                "dosage": clip_sentences(drug_info['dosage'], 200),
+                "warnings": clip_sentences(drug_info['warnings'], 200)
             },
             "status": "success"
         }
         
-        with open(json_path, 'w') as f:
-            json.dump(blog_data, f, indent=2)
+        with stage_timer("json_write"):
+            write_json(plan["json_path"], blog_data)
+        
+        BLOGS.labels("generated").inc()
+        # A blog saved without the section images it asked for is not cached, so the next request retries them
+        if section_images is not None or not plan["section_images"]:
+            self.result_cache.put(plan["cache_key"], blog_data, plan["image_path"])
         
+        # The blog is already saved, so a failing archive only costs its history
+        try:
+            with stage_timer("archive_write"):
+                self.archive.record(blog_data)
+        except sqlite3.Error as e:
+            logger.warning("Blog archive write failed", extra={"drug": drug_info['name'], "error": str(e)})
+        
+        if time.time() - self._last_prune > PRUNE_INTERVAL_SECONDS:
+            self._last_prune = time.time()
+            self.artifacts.submit(self.prune_outputs)
         return blog_data
+    
+    def prune_outputs(self):
+        """Delete images and their variants that no current, cached or archived blog refers to
+        
+        Every generation writes new files, so this is what bounds output/:
+        files go once their result cache entries are evicted and their
+        archived versions drop out of the archive's retention.
+        """
+        try:
+            blogs = itertools.chain(current_blogs(OUTPUT_DIR), self.result_cache.blogs(), self.archive.records())
+            removed = prune_outputs(blogs, OUTPUT_DIR, self.section_images.image_dir, self.assets.asset_dir)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("Pruning output files failed", extra={"error": str(e)})
+            return 0
+        
+        if removed:
+            logger.info("Pruned unused output files", extra={"files": removed})
+        return removed
+    
+    def warm_up(self):
+        """Warm both models up on their own stage threads"""
+        text_future = self.text_executor.submit(self.model_manager.warm_up_text)
+        image_future = self.image_executor.submit(self.model_manager.warm_up_image)
+        text_future.result()
+        image_future.result()
+        self.model_manager.warmed_up = True
+    
+    @staticmethod
+    def run_stage(report, stage, func, *args):
+        report(stage, "started")
+        with stage_timer(stage) as timing:
+            result = func(*args)
+        report(stage, "completed")
+        logger.info("Stage finished", extra={"stage": stage, "seconds": round(timing.seconds, 2)})
+        return result
+    
+    def generate(self, drug_name, custom_title=None, force_refresh=False, progress_callback=None,
+                 image_profile=DEFAULT_IMAGE_PROFILE, section_images=False, seed=None):
+        """Run the full pipeline; progress_callback(stage, status) is called around each stage
+        
+        seed picks the sampling seed; without one force_refresh draws a new
+        seed, so the blog really is regenerated rather than reproduced.
+        """
+        report = progress_callback or (lambda stage, status: None)
+        started = time.perf_counter()
+        
+        logger.info("Starting blog generation", extra={"drug": drug_name, "image_profile": image_profile})
+        
+        report("fda_fetch", "started")
+        plan, error = self.fda_executor.submit(
+            self.try_prepare, drug_name, custom_title, image_profile, section_images,
+            self.pick_seed(seed, force_refresh)
+        ).result()
+        
+        if not plan:
+            report("fda_fetch", "failed")
+            return error
+        
+        report("fda_fetch", "completed")
+        
+        logger.info("FDA data ready", extra={
+            "drug": plan['drug_info']['name'], "brand": plan['drug_info']['brand_names'], "title": plan['title']
+        })
+        
+        cached = None if force_refresh else self.result_cache.get(plan["cache_key"])
+        
+        if cached:
+            logger.info("Found cached blog for these inputs, skipping generation", extra={"drug": drug_name})
+            for stage in ("text", "image", "section_images"):
+                report(stage, "cached")
+            
+            report("save", "started")
+            blog_data = self.restore_cached(plan, cached)
+            report("save", "completed")
+            return blog_data
+        
+        logger.info("Generating blog content and featured image", extra={
+            "drug": drug_name, "image_prompt": plan['image_prompt'], "image_profile": image_profile
+        })
+        
+        # The image prompt only depends on the FDA data and title, so both run at once
+        text_future = self.text_executor.submit(
+            self.run_stage, report, "text", self.model_manager.generate_text, plan["text_prompt"], plan["text_prefixes"],
+            plan["seed"]
+        )
+        image_future = self.image_executor.submit(
+            self.run_stage, report, "image", self.model_manager.generate_image, plan["image_prompt"], image_profile,
+            plan["seed"]
+        )
+        blog_text = text_future.result()
+        
+        # Section prompts come from the generated headings, so they queue behind the featured image
+        if section_images:
+            section_future = self.image_executor.submit(
+                self.run_stage, report, "section_images", self.generate_section_images, plan, blog_text
+            )
+        else:
+            report("section_images", "skipped")
+        
+        # The PNG is encoded in the background while section images are drawn
+        image_write = self.artifacts.save_image(image_future.result(), plan["image_path"])
+        sections = None
+        if section_images:
+            # Section images are extras, so the blog is saved without them rather than failed
+            try:
+                sections = section_future.result()
+            except Exception as e:
+                report("section_images", "failed")
+                logger.warning("Section image generation failed", extra={"drug": drug_name, "error": str(e)})
+        
+        report("save", "started")
+        blog_data = self.save(plan, blog_text, image_write, sections)
+        
+        report("save", "completed")
+        STAGE_SECONDS.labels("blog_total").observe(time.perf_counter() - started)
+        logger.info("Blog generated", extra={"drug": drug_name, "seconds": round(time.perf_counter() - started, 1)})
+        return blog_data
+    
+    def generate_stream(self, drug_name, custom_title=None, force_refresh=False, image_profile=DEFAULT_IMAGE_PROFILE,
+                        stop_event=None, section_images=False, seed=None):
+        """Generate one blog, yielding (event, data) pairs as results become available
+        
+        Events are "meta" once the FDA data is in, "token" for each piece of
+        text as TinyLlama writes it, "image" when the image file is saved,
+        "section_images" once the per-section images are ready (if requested), and
+        finally "done" with the blog data or "error". "ping" is yielded while
+        waiting on a long stage so callers can keep their connection alive.
+        """
+        plan, error = self.fda_executor.submit(
+            self.try_prepare, drug_name, custom_title, image_profile, section_images,
+            self.pick_seed(seed, force_refresh)
+        ).result()
+        
+        if not plan:
+            yield "error", error
+            return
+        
+        drug_info = plan["drug_info"]
+        yield "meta", {
+            "drug_name": drug_info['name'],
+            "brand_names": drug_info['brand_names'],
+            "manufacturer": drug_info['manufacturer'],
+            "title": plan["title"],
+            "image_profile": image_profile
+        }
+        
+        cached = None if force_refresh else self.result_cache.get(plan["cache_key"])
+        
+        if cached:
+            blog_data = self.restore_cached(plan, cached)
+            yield "token", {"text": blog_data["blog_content"]}
+            yield "image", {"image_filename": blog_data["image_filename"], "image_asset": blog_data.get("image_asset")}
+            if blog_data.get("section_images"):
+                yield "section_images", {"section_images": blog_data["section_images"]}
+            yield "done", blog_data
+            return
+        
+        image_future = self.image_executor.submit(
+            self.model_manager.generate_image, plan["image_prompt"], image_profile, plan["seed"]
+        )
+        streamer = self.model_manager.text_streamer(timeout=STREAM_POLL_SECONDS)
+        text_future = self.text_executor.submit(
+            self.model_manager.generate_text_streaming, plan["text_prompt"], streamer, stop_event, plan["text_prefixes"],
+            plan["seed"]
+        )
+        
+        image_write = None
+        image_sent = False
+        while True:
+            try:
+                yield "token", {"text": next(streamer)}
+            except StopIteration:
+                break
+            except queue.Empty:
+                # A failed generate() never signals the end of the stream
+                if text_future.done() and text_future.exception():
+                    break
+            
+            # Tokens keep flowing while the PNG is encoded; the image event follows once it is on disk
+            if image_write is None and image_future.done() and not image_future.exception():
+                image_write = self.artifacts.save_image(image_future.result(), plan["image_path"])
+            if not image_sent and image_write is not None and image_write.done() and not image_write.exception():
+                image_sent = True
+                image_asset = self.assets.submit(plan["image_path"])
+                yield "image", {"image_filename": plan["image_filename"], "image_asset": image_asset}
+        
+        while wait([text_future, image_future], timeout=KEEP_ALIVE_SECONDS).not_done:
+            yield "ping", None
+        
+        try:
+            blog_text = text_future.result()
+            image = image_future.result()
+        except Exception as e:
+            yield "error", {"status": "error", "message": f"Generation failed: {e}"}
+            return
+        
+        if not image_sent:
+            try:
+                (image_write or self.artifacts.save_image(image, plan["image_path"])).result()
+            except Exception as e:
+                yield "error", {"status": "error", "message": f"Saving the image failed: {e}"}
+                return
+            image_asset = self.assets.submit(plan["image_path"])
+            yield "image", {"image_filename": plan["image_filename"], "image_asset": image_asset}
+        
+        sections = None
+        if section_images:
+            section_future = self.image_executor.submit(self.generate_section_images, plan, blog_text)
+            while wait([section_future], timeout=KEEP_ALIVE_SECONDS).not_done:
+                yield "ping", None
+            try:
+                sections = section_future.result()
+                yield "section_images", {"section_images": sections}
+            except Exception as e:
+                logger.warning("Section image generation failed", extra={"drug": drug_name, "error": str(e)})
+        
+        yield "done", self.save(plan, blog_text, section_images=sections)
+    
+    def generate_batch(self, items, batch_size=TEXT_BATCH_SIZE):
+        """Generate blogs for (drug_name, custom_title, force_refresh, image_profile, seed) items, yielding (index, result) as each finishes
+        
+        Cache hits and unknown drugs are yielded right away; the rest are
+        generated batch_size at a time so prompts share model forward passes,
+        with each batch holding a single profile and seed. Items refreshed
+        without a seed share one fresh seed, so they still batch together.
+        All batches are queued up front, so the text stage works on the next
+        batch while the image stage is still busy with the previous one.
+        Section images are not generated for batches.
+        """
+        refresh_seed = self.pick_seed(force_refresh=True)
+        seeds = [refresh_seed if force_refresh and seed is None else self.pick_seed(seed)
+                 for _, _, force_refresh, _, seed in items]
+        plans = self.fda_executor.map(
+            lambda item, seed: self.try_prepare(item[0], item[1], item[3], seed=seed), items, seeds
+        )
+        pending = []
+        
+        for index, ((_, _, force_refresh, _, _), (plan, error)) in enumerate(zip(items, plans)):
+            if not plan:
+                yield index, error
+                continue
+            
+            cached = None if force_refresh else self.result_cache.get(plan["cache_key"])
+            if cached:
+                yield index, self.restore_cached(plan, cached)
+            else:
+                pending.append((index, plan))
+        
+        groups = {}
+        for index, plan in pending:
+            groups.setdefault((plan["image_profile"], plan["seed"]), []).append((index, plan))
+        
+        batches = []
+        for (image_profile, seed), group in groups.items():
+            for start in range(0, len(group), batch_size):
+                chunk = group[start:start + batch_size]
+                text_future = self.text_executor.submit(
+                    self.model_manager.generate_text_batch, [plan["text_prompt"] for _, plan in chunk], batch_size, seed
+                )
+                image_future = self.image_executor.submit(
+                    self.model_manager.generate_images_batch, [plan["image_prompt"] for _, plan in chunk],
+                    IMAGE_BATCH_SIZE, image_profile, seed
+                )
+                batches.append((chunk, text_future, image_future))
+        
+        for chunk, text_future, image_future in batches:
+            try:
+                texts = text_future.result()
+                images = image_future.result()
+            except Exception as e:
+                for index, _ in chunk:
+                    yield index, {"status": "error", "message": f"Generation failed: {e}"}
+                continue
+            
+            logger.info("Generated blog batch", extra={"blogs": len(chunk)})
+            writes = [self.artifacts.save_image(image, plan["image_path"]) for (_, plan), image in zip(chunk, images)]
+            for (index, plan), blog_text, image_write in zip(chunk, texts, writes):
+                yield index, self.save(plan, blog_text, image_write)
 
 
 def display_result(result):
@@ -214,13 +918,36 @@ def display_result(result):
     print("="*80 + "\n")
 
 
+def run_batch(generator, drug_names, batch_size, force_refresh, image_profile, seed=None):
+    """Generate a blog per drug with batched model calls, printing results as they finish"""
+    items = [(drug_name, None, force_refresh, image_profile, seed) for drug_name in drug_names]
+    
+    for index, result in generator.generate_batch(items, batch_size=batch_size):
+        print(f"[{index + 1}/{len(items)}] {drug_names[index]}")
+        display_result(result)
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pharmaceutical blog generator with FDA data")
+    parser.add_argument("--batch", nargs="+", metavar="DRUG", help="generate blogs for several drugs with batched model calls")
+    parser.add_argument("--batch-size", type=int, default=TEXT_BATCH_SIZE)
+    parser.add_argument("--force-refresh", action="store_true", help="ignore cached results")
+    parser.add_argument("--seed", type=int, help="sampling seed; by default fixed, or fresh with --force-refresh")
+    parser.add_argument("--image-profile", choices=IMAGE_PROFILES, default=DEFAULT_IMAGE_PROFILE,
+                        help="draft/standard trade image detail for much faster generation")
+    args = parser.parse_args()
+    configure_logging()
+    
     print("\n" + "="*80)
     print(" "*15 + "PHARMACEUTICAL BLOG GENERATOR WITH FDA DATA")
     print("="*80 + "\n")
     
     generator = BlogGenerator()
     
+    if args.batch:
+        run_batch(generator, args.batch, args.batch_size, args.force_refresh, args.image_profile, args.seed)
+        raise SystemExit(0)
+    
     drug_name = input("Enter drug name: ").strip()
     custom_title = input("Enter blog title (or press Enter for default): ").strip()
     
@@ -229,5 +956,7 @@ if __name__ == "__main__":
     
     print("\nProcessing... This may take 3-4 minutes\n")
     
-    result = generator.generate(drug_name, custom_title)
+    result = generator.generate(
+        drug_name, custom_title, force_refresh=args.force_refresh, image_profile=args.image_profile, seed=args.seed
+    )
     display_result(result)
\ No newline at end of file
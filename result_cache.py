@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from artifact_writer import copy_file, write_json
+from config import HOME_DIR
+
+
+CACHE_DIR = os.path.join(HOME_DIR, "cache", "results")
+MAX_ENTRIES = 500
+MAX_BYTES = 2 * 1024**3
+TTL_SECONDS = 7 * 24 * 3600
+
+
+class ResultCache:
+    """Persistent content-addressed cache of generated blogs (JSON + PNG)
+
+    Entries are keyed on a hash of everything that influences the output, so a
+    change in FDA data, prompt template or model settings produces a new key.
+    Eviction is least-recently-used once MAX_ENTRIES or MAX_BYTES is exceeded,
+    and entries older than the TTL are treated as misses.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, ttl=TTL_SECONDS):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self._db = sqlite3.connect(str(self.cache_dir / "index.sqlite"), check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._db.commit()
+
+    @staticmethod
+    def make_key(**parts):
+        """Hash the generation inputs into a stable cache key"""
+        payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _paths(self, key):
+        return self.cache_dir / f"{key}.json", self.cache_dir / f"{key}.png"
+
+    def get(self, key):
+        """Return (blog_data, cached_image_path) or None on a miss"""
+        json_path, image_path = self._paths(key)
+
+        with self._lock:
+            row = self._db.execute("SELECT created_at FROM entries WHERE key = ?", (key,)).fetchone()
+
+            if row is None or not json_path.exists() or not image_path.exists():
+                self.misses += 1
+                return None
+
+            if time.time() - row[0] > self.ttl:
+                self._remove(key)
+                self._db.commit()
+                self.misses += 1
+                return None
+
+            self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self.hits += 1
+
+        with open(json_path, encoding="utf-8") as f:
+            return json.load(f), image_path
+
+    def blogs(self):
+        """Blog data of every cached entry"""
+        with self._lock:
+            keys = [key for (key,) in self._db.execute("SELECT key FROM entries").fetchall()]
+
+        for key in keys:
+            try:
+                with open(self._paths(key)[0], encoding="utf-8") as f:
+                    yield json.load(f)
+            except (OSError, ValueError):
+                continue
+
+    def put(self, key, blog_data, image_path):
+        """Store a generated blog and its image under `key`"""
+        json_path, cached_image = self._paths(key)
+
+        copy_file(image_path, cached_image)
+        write_json(json_path, blog_data)
+
+        size = json_path.stat().st_size + cached_image.stat().st_size
+        now = time.time()
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, size, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, size, now, now)
+            )
+            self._evict()
+            self._db.commit()
+
+    def _remove(self, key):
+        for path in self._paths(key):
+            path.unlink(missing_ok=True)
+        self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def _evict(self):
+        """Drop expired entries, then least recently used ones until within limits"""
+        expired = self._db.execute("SELECT key FROM entries WHERE created_at < ?", (time.time() - self.ttl,)).fetchall()
+        for (key,) in expired:
+            self._remove(key)
+
+        count, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+
+        for key, size in self._db.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            self._remove(key)
+            count -= 1
+            total -= size
+
+    def stats(self):
+        with self._lock:
+            count, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": count,
+            "bytes": total,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
\ No newline at end of file
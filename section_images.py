@@ -0,0 +1,155 @@
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+
+from artifact_writer import atomic_write
+from blog_renderer import parse_heading
+from metrics import stage_timer
+from config import HOME_DIR
+from result_cache import ResultCache
+
+
+logger = logging.getLogger(__name__)
+
+
+SECTION_IMAGE_DIR = os.path.join(HOME_DIR, "output", "sections")
+MAX_SECTION_IMAGES = 4
+# Prompts sharing at least this fraction of their words get one image
+DEDUPE_JACCARD = 0.8
+# The featured image already covers the blog as a whole
+SKIP_SECTIONS = ("introduction", "conclusion")
+
+# Section names asked for by the text prompt; plain "Name:" lines only count as headings for these
+KNOWN_SECTIONS = ("introduction", "what is it", "benefits and uses", "dosage", "side effects", "warnings", "conclusion")
+
+# (title keywords, use the drug class instead of the drug name, visual theme)
+SECTION_THEMES = [
+    (("side effect", "adverse", "reaction"), True, "patient consulting doctor about side effects clinical consultation"),
+    (("warning", "safety", "precaution", "risk"), True, "medication safety warning label caution clinical"),
+    (("dosage", "dose", "administration", "how to take"), True, "tablets capsules pill organizer dosing schedule"),
+    (("benefit", "use", "treat"), False, "therapeutic treatment healthy patient healthcare"),
+    (("what is", "mechanism", "how it works"), False, "molecular scientific illustration clinical"),
+]
+DEFAULT_THEME = (False, "medication pharmaceutical clinical professional medical")
+
+
+def section_heading(line):
+    heading = parse_heading(line.strip(), KNOWN_SECTIONS)
+    return heading[1] if heading else None
+
+
+def split_sections(text):
+    """(heading, body) pairs for the markdown or "Name:" style headings in generated text"""
+    sections = []
+    for line in text.splitlines():
+        heading = section_heading(line)
+        if heading:
+            sections.append([heading, []])
+        elif sections and line.strip():
+            sections[-1][1].append(line.strip())
+    return [(heading, " ".join(body)) for heading, body in sections]
+
+
+def drug_class(drug_info):
+    """Readable established pharmacologic class, e.g. "Angiotensin Converting Enzyme Inhibitor" """
+    value = drug_info.get("drug_class") or "N/A"
+    return None if value == "N/A" else re.sub(r"\s*\[\w+\]$", "", value)
+
+
+def section_image_prompt(heading, drug_info):
+    """Image prompt for a section
+
+    Generic sections like side effects and dosage are drawn for the drug
+    class rather than the drug, so drugs of the same class share the image.
+    """
+    heading_lower = heading.lower()
+    use_class, theme = DEFAULT_THEME
+    for keywords, theme_use_class, theme_text in SECTION_THEMES:
+        if any(keyword in heading_lower for keyword in keywords):
+            use_class, theme = theme_use_class, theme_text
+            break
+
+    subject = (use_class and drug_class(drug_info)) or drug_info["name"]
+    return f"professional pharmaceutical medical illustration {subject.lower()} {theme}"
+
+
+def jaccard(a, b):
+    a, b = set(a.split()), set(b.split())
+    return len(a & b) / len(a | b) if a | b else 1.0
+
+
+def dedupe(prompts, threshold=DEDUPE_JACCARD):
+    """Map each prompt to the first earlier prompt that is nearly identical (or itself)"""
+    kept = []
+    mapping = []
+    for prompt in prompts:
+        match = next((k for k in kept if jaccard(prompt, k) >= threshold), None)
+        if match is None:
+            kept.append(prompt)
+            match = prompt
+        mapping.append(match)
+    return kept, mapping
+
+
+class SectionImageScheduler:
+    """Generates one image per blog section, sharing images across sections and blogs
+
+    Images are stored under a hash of their prompt and the image model
+    settings, so a section prompt that was drawn before (for this blog or
+    another drug of the same class) is reused. All missing images of a
+    blog are generated in a single batched diffusion call.
+    """
+
+    def __init__(self, model_manager, image_dir=SECTION_IMAGE_DIR, max_images=MAX_SECTION_IMAGES):
+        self.model_manager = model_manager
+        self.image_dir = Path(image_dir)
+        self.image_dir.mkdir(parents=True, exist_ok=True)
+        self.max_images = max_images
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def plan(self, blog_text, drug_info):
+        """[(heading, prompt)] for the sections that get an image"""
+        sections = [
+            heading for heading, body in split_sections(blog_text)
+            if body and heading.lower() not in SKIP_SECTIONS
+        ]
+        return [(heading, section_image_prompt(heading, drug_info)) for heading in sections[:self.max_images]]
+
+    def image_key(self, prompt, image_profile, seed=None):
+        settings = self.model_manager.settings(image_profile, seed)
+        image_settings = {k: v for k, v in settings.items() if k.startswith("image") or k == "seed"}
+        return ResultCache.make_key(prompt=prompt, image=image_settings)
+
+    def generate(self, blog_text, drug_info, image_profile, seed=None):
+        """Generate (or reuse) the section images of a blog; returns [{heading, prompt, image_filename}]"""
+        sections = self.plan(blog_text, drug_info)
+        if not sections:
+            return []
+
+        unique, mapping = dedupe([prompt for _, prompt in sections])
+        paths = {prompt: self.image_dir / f"{self.image_key(prompt, image_profile, seed)}.png" for prompt in unique}
+
+        with self._lock:
+            missing = [prompt for prompt in unique if not paths[prompt].exists()]
+            self.hits += len(unique) - len(missing)
+            self.misses += len(missing)
+
+            if missing:
+                images = self.model_manager.generate_images_batch(
+                    missing, batch_size=len(missing), image_profile=image_profile, seed=seed
+                )
+                for prompt, image in zip(missing, images):
+                    with stage_timer("png_save"):
+                        atomic_write(paths[prompt], lambda f: image.save(f, format="PNG"))
+
+        logger.info("Section images ready", extra={
+            "sections": len(sections), "unique": len(unique), "generated": len(missing)
+        })
+        return [
+            {"heading": heading, "prompt": prompt, "image_filename": f"{self.image_dir.name}/{paths[prompt].name}"}
+            for (heading, _), prompt in zip(sections, mapping)
+        ]
\ No newline at end of file
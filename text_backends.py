@@ -0,0 +1,148 @@
+import logging
+import os
+import time
+from functools import lru_cache
+from pathlib import Path
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
+
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("fp32", "int8", "bf16", "onnx")
+TEXT_BACKEND = os.getenv("PHARMAPEDIA_TEXT_BACKEND", "fp32")
+
+# Artifact directories next to the fp32 model, produced by models_downloading.py
+ARTIFACT_SUFFIXES = {"int8": "-int8", "bf16": "-bf16", "onnx": "-onnx"}
+INT8_FILENAME = "model_int8.pt"
+# bf16 counts as native when a matmul in it is at most this much slower than in fp32
+BF16_PROBE_MAX_SLOWDOWN = 1.5
+BF16_PROBE_SIZE = 512
+
+
+def artifact_dir(model_dir, backend):
+    model_dir = Path(model_dir)
+    return model_dir.with_name(model_dir.name + ARTIFACT_SUFFIXES[backend])
+
+
+def time_matmul(dtype, size=BF16_PROBE_SIZE, repeats=3):
+    a = torch.randn(size, size).to(dtype)
+    b = torch.randn(size, size).to(dtype)
+    torch.matmul(a, b)
+    started = time.perf_counter()
+    for _ in range(repeats):
+        torch.matmul(a, b)
+    return time.perf_counter() - started
+
+
+@lru_cache(maxsize=None)
+def cpu_supports_bf16():
+    """Native bf16 matmuls need AVX512-BF16 or AMX; without them bf16 is slower than fp32
+
+    Uses the CPU feature flags torch reads through cpuinfo, which works on
+    Windows as well as Linux. Torch builds without them get a short timing
+    probe: bf16 emulated in software is several times slower than fp32.
+    Checked once per process.
+    """
+    get_features = getattr(getattr(torch._C, "_cpu", None), "_get_cpu_capability", None)
+    if get_features is not None:
+        features = get_features()
+        if isinstance(features, dict) and "avx512_bf16" in features:
+            return bool(features["avx512_bf16"] or features.get("amx_bf16"))
+
+    try:
+        slowdown = time_matmul(torch.bfloat16) / time_matmul(torch.float32)
+    except RuntimeError:
+        return False
+    logger.info("Probed bf16 matmul speed", extra={"slowdown_vs_fp32": round(slowdown, 2)})
+    return slowdown <= BF16_PROBE_MAX_SLOWDOWN
+
+
+def load_fp32(model_dir):
+    return AutoModelForCausalLM.from_pretrained(model_dir, torch_dtype=torch.float32, low_cpu_mem_usage=True)
+
+
+def quantize_int8(model):
+    """Dynamic int8 quantization of the Linear layers (weights int8, activations quantized per batch)"""
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_int8(model_dir):
+    artifact = artifact_dir(model_dir, "int8") / INT8_FILENAME
+    if artifact.exists():
+        return torch.load(artifact, weights_only=False)
+
+    logger.info("No int8 artifact found, quantizing the fp32 model on the fly")
+    return quantize_int8(load_fp32(model_dir))
+
+
+def resolve_backend(backend):
+    """The backend that is actually loaded: bf16 falls back to fp32 on CPUs without native bf16"""
+    if backend == "bf16" and not cpu_supports_bf16():
+        logger.warning("CPU has no native bf16 support (AVX512-BF16 or AMX), falling back to the fp32 backend")
+        return "fp32"
+    return backend
+
+
+def load_bf16(model_dir):
+    prebuilt = artifact_dir(model_dir, "bf16")
+    source = prebuilt if prebuilt.exists() else model_dir
+    return AutoModelForCausalLM.from_pretrained(source, torch_dtype=torch.bfloat16, low_cpu_mem_usage=True)
+
+
+def load_onnx(model_dir):
+    from optimum.onnxruntime import ORTModelForCausalLM
+
+    prebuilt = artifact_dir(model_dir, "onnx")
+    if prebuilt.exists():
+        return ORTModelForCausalLM.from_pretrained(prebuilt)
+
+    logger.info("No ONNX artifact found, exporting the model (this takes a few minutes)")
+    return ORTModelForCausalLM.from_pretrained(model_dir, export=True)
+
+
+LOADERS = {
+    "fp32": load_fp32,
+    "int8": load_int8,
+    "bf16": load_bf16,
+    "onnx": load_onnx,
+}
+
+
+def load_text_model(backend, model_dir):
+    """Return (model, tokenizer) for the selected backend"""
+    if backend not in LOADERS:
+        raise ValueError(f"Unknown text backend '{backend}', expected one of {', '.join(BACKENDS)}")
+
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    model = LOADERS[resolve_backend(backend)](model_dir)
+    return model, tokenizer
+
+
+def load_text_pipeline(backend, model_dir):
+    """Text-generation pipeline backed by the selected model variant"""
+    model, tokenizer = load_text_model(backend, model_dir)
+    return pipeline("text-generation", model=model, tokenizer=tokenizer, device=-1)
+
+
+def export_artifacts(model_dir, backends):
+    """Write prebuilt int8 / bf16 / ONNX variants of the fp32 model next to it"""
+    for backend in backends:
+        target = artifact_dir(model_dir, backend)
+        target.mkdir(parents=True, exist_ok=True)
+        print(f"Exporting {backend} backend to {target}...")
+
+        if backend == "int8":
+            torch.save(quantize_int8(load_fp32(model_dir)), target / INT8_FILENAME)
+        elif backend == "bf16":
+            model = AutoModelForCausalLM.from_pretrained(model_dir, torch_dtype=torch.bfloat16, low_cpu_mem_usage=True)
+            model.save_pretrained(target)
+        elif backend == "onnx":
+            from optimum.onnxruntime import ORTModelForCausalLM
+            ORTModelForCausalLM.from_pretrained(model_dir, export=True).save_pretrained(target)
+        else:
+            raise ValueError(f"Nothing to export for backend '{backend}'")
+
+        AutoTokenizer.from_pretrained(model_dir).save_pretrained(target)
+        print(f"Saved: {target}\n")
\ No newline at end of file